@@ -2,6 +2,7 @@
 # 一键启动前后端服务
 
 from backend.app import create_app
+from backend.utils.server import prepare_engine, run_server
 import argparse
 import socket
 import subprocess
@@ -78,7 +79,8 @@ def start_backend(host='0.0.0.0', port=5000, debug=False):
     try:
         print(f"正在启动后端服务 (端口 {port})...")
 
-        # 创建应用实例
+        # 创建应用实例(先选定服务引擎,gevent / eventlet 需在创建 SocketIO 前 monkey-patch)
+        prepare_engine()
         app = create_app()
 
         # 获取本机IP地址
@@ -98,14 +100,9 @@ def start_backend(host='0.0.0.0', port=5000, debug=False):
         print(f"  - Markdown工具: http://{local_ip}:{port}/api/markdown-tools")
         print("=" * 50)
 
-        # 启动服务器
-        # 用 SocketIO 启动,确保 IM/WebRTC/文件快传等实时功能可用
-        # (直接 app.run 无法挂载 /socket.io/ 路由)
-        socketio = app.config.get('SOCKETIO')
-        if socketio:
-            socketio.run(app, host=host, port=port, debug=debug, allow_unsafe_werkzeug=True)
-        else:
-            app.run(host=host, port=port, debug=debug)
+        # 启动服务器:引擎由 config['network']['server'] 选择(默认 werkzeug)
+        # SocketIO 中间件已挂在 app.wsgi_app 上,IM/WebRTC/文件快传等实时功能在任一引擎下可用
+        run_server(app, host, port, debug=debug)
 
     except Exception as e:
         print(f"启动后端服务时出错: {e}")
@@ -1,6 +1,5 @@
 from flask import Flask, Blueprint, send_from_directory, request, jsonify, g
 from flask_cors import CORS
-import hmac
 import os
 import logging
 from pathlib import Path
@@ -72,6 +71,23 @@ except ImportError:
     except ImportError:
         from backend.utils.lock_page import get_lock_page_html
 
+# Token 校验快照(按配置版本重建,热路径不复制 config)
+try:
+    from .utils.auth import is_exempt_path, get_token_snapshot, verify_token
+except ImportError:
+    try:
+        from utils.auth import is_exempt_path, get_token_snapshot, verify_token
+    except ImportError:
+        from backend.utils.auth import is_exempt_path, get_token_snapshot, verify_token
+
+try:
+    from .utils.server import prepare_engine, run_server, socketio_async_mode, effective_processes
+except ImportError:
+    try:
+        from utils.server import prepare_engine, run_server, socketio_async_mode, effective_processes
+    except ImportError:
+        from backend.utils.server import prepare_engine, run_server, socketio_async_mode, effective_processes
+
 try:
     from flask_socketio import SocketIO
 except ImportError:
@@ -110,12 +126,14 @@ def create_app(access_token=None):
 
     # 上传大小上限:统一从 config 读取(默认 50MB),与 im/file_upload 校验保持一致
     try:
-        from utils.config_manager import get_max_upload_bytes as _gmb
+        from utils.config_manager import get_max_upload_bytes as _gmb, start_config_watcher, load_config
     except ImportError:
         try:
-            from backend.utils.config_manager import get_max_upload_bytes as _gmb
+            from backend.utils.config_manager import get_max_upload_bytes as _gmb, start_config_watcher, load_config
         except ImportError:
-            from .utils.config_manager import get_max_upload_bytes as _gmb
+            from .utils.config_manager import get_max_upload_bytes as _gmb, start_config_watcher, load_config
+    # 配置文件监视线程:外部改动使缓存失效,每个请求的 load_config() 只做整数比较
+    start_config_watcher()
     app.config['MAX_CONTENT_LENGTH'] = _gmb()
     app.config['ACCESS_TOKEN'] = access_token
 
@@ -154,11 +172,23 @@ def create_app(access_token=None):
     # SocketIO initialization
     socketio = None
     if SocketIO is not None:
+        # IM 在线状态 / 跨进程消息队列:network.processes > 1 时走共享 SQLite
+        try:
+            from .modules.im_presence import create_im_backend
+        except ImportError:
+            try:
+                from modules.im_presence import create_im_backend
+            except ImportError:
+                from backend.modules.im_presence import create_im_backend
+        processes = effective_processes()
+        im_presence, client_manager = create_im_backend(load_config(), processes)
         socketio = SocketIO(
             app,
             cors_allowed_origins=allowed_origins,
-            async_mode='threading',
+            # 与 config['network']['server'] 选定的服务引擎一致(gevent / eventlet / threading)
+            async_mode=socketio_async_mode(),
             manage_session=False,
+            client_manager=client_manager,
         )
         logging.info('Socket.IO: server instance created')
 
@@ -172,36 +202,22 @@ def create_app(access_token=None):
                 logging.info('Socket.IO: client CONNECTED sid=%s (no token required)', _r.sid)
                 return
             # Check if token auth is enabled
-            try:
-                from utils.config_manager import load_config as _lc
-            except ImportError:
-                try:
-                    from backend.utils.config_manager import load_config as _lc
-                except ImportError:
-                    _lc = None
-            if _lc:
-                cfg = _lc()
-                if not cfg.get('security', {}).get('token_enabled', True):
-                    logging.info('Socket.IO: client CONNECTED sid=%s (token disabled)', _r.sid)
-                    return
-            # Validate token from query or cookie
-            from datetime import datetime as _dt
+            snap = get_token_snapshot()
+            if not snap.token_enabled:
+                logging.info('Socket.IO: client CONNECTED sid=%s (token disabled)', _r.sid)
+                return
+            # Validate token from query or cookie (or unexpired temp token)
             provided = (
                 (_r.args.get('token') or '')
                 or _r.cookies.get('devtoolbox_token', '')
             )
-            if hmac.compare_digest(provided, token):
+            kind = verify_token(provided, token, snap)
+            if kind == 'access':
                 logging.info('Socket.IO: client CONNECTED sid=%s (authenticated)', _r.sid)
                 return
-            # Check temp tokens
-            import time as _time
-            temp_tokens = cfg.get('security', {}).get('temp_tokens', []) if _lc else []
-            now_ts = _time.time()
-            for t in temp_tokens:
-                exp = t.get('expires_at', 0)
-                if hmac.compare_digest(t.get('token', ''), provided) and isinstance(exp, (int, float)) and exp > now_ts:
-                    logging.info('Socket.IO: client CONNECTED sid=%s (temp token)', _r.sid)
-                    return
+            if kind == 'temp':
+                logging.info('Socket.IO: client CONNECTED sid=%s (temp token)', _r.sid)
+                return
             # Reject
             logging.warning('Socket.IO: REJECTED sid=%s (invalid token)', _r.sid)
             return False
@@ -220,7 +236,7 @@ def create_app(access_token=None):
             except ImportError:
                 from backend.modules.im import register_im_events
         try:
-            register_im_events(socketio)
+            register_im_events(socketio, im_presence, multi_process=processes > 1)
             logging.info('Socket.IO: ✅ IM events registered successfully')
         except Exception as e:
             logging.error('Socket.IO: ❌ register_im_events FAILED: %s', e, exc_info=True)
@@ -238,22 +254,14 @@ def create_app(access_token=None):
         if not token:
             return None
 
-        # Check if token is disabled via config
-        try:
-            from utils.config_manager import load_config
-        except ImportError:
-            try:
-                from backend.utils.config_manager import load_config
-            except ImportError:
-                from .utils.config_manager import load_config
-        config = load_config()
-        if not config.get('security', {}).get('token_enabled', True):
+        # Exempt paths — static assets, Socket.IO (auth handled at Socket.IO layer).
+        # 先于任何配置访问判断,静态资源请求不触碰 config
+        if is_exempt_path(request.path):
             return None
 
-        # Exempt paths — static assets, Socket.IO (auth handled at Socket.IO layer)
-        if (request.path in ('/favicon.ico', '/robots.txt', '/api/frontend-log')
-                or request.path.startswith('/socket.io/')
-                or request.path.startswith('/assets/')):
+        # Check if token is disabled via config
+        snap = get_token_snapshot()
+        if not snap.token_enabled:
             return None
 
         provided = (
@@ -262,20 +270,11 @@ def create_app(access_token=None):
             request.headers.get('X-Access-Token')
         )
 
-        if hmac.compare_digest(provided or '', token):
+        # Access token or unexpired temp token (hash-keyed lookup, no linear scan)
+        if verify_token(provided, token, snap):
             g.token_valid = True
             return None
 
-        # Check temp tokens (expires_at is a Unix timestamp float)
-        temp_tokens = config.get('security', {}).get('temp_tokens', [])
-        import time as _time
-        now_ts = _time.time()
-        for t in temp_tokens:
-            exp = t.get('expires_at', 0)
-            if hmac.compare_digest(t.get('token', ''), provided or '') and isinstance(exp, (int, float)) and exp > now_ts:
-                g.token_valid = True
-                return None
-
         # Log rejection without leaking token value — fingerprint only
         import hashlib as _hashlib
         token_fp = _hashlib.sha256(token.encode()).hexdigest()[:8] if token else None
@@ -290,8 +289,7 @@ def create_app(access_token=None):
         if request.path.startswith('/api/'):
             return jsonify({'error': 'Unauthorized', 'success': False}), 401
 
-        lang = config.get('ui', {}).get('language', 'zh')
-        return get_lock_page_html(lang), 403
+        return get_lock_page_html(snap.language), 403
 
     # Cookie 设置
     @app.after_request
@@ -359,6 +357,11 @@ def create_app(access_token=None):
     return app
 
 if __name__ == '__main__':
+    import multiprocessing
+    # 打包版本中 PDF 渲染 / 转换进程池的子进程会以本程序为入口启动,
+    # 必须最先交给 multiprocessing 处理,否则子进程会再跑一遍整个应用
+    multiprocessing.freeze_support()
+
     import uuid
 
     logging.basicConfig(level=logging.INFO)
@@ -374,15 +377,15 @@ if __name__ == '__main__':
     else:
         access_token = uuid.uuid4().hex
         try:
-            from utils.config_manager import load_config as _lc, save_config as _sc
+            from utils.config_manager import edit_config as _ec, save_config as _sc
         except ImportError:
             try:
-                from backend.utils.config_manager import load_config as _lc, save_config as _sc
+                from backend.utils.config_manager import edit_config as _ec, save_config as _sc
             except ImportError:
-                _lc = _sc = None
-        if _lc:
+                _ec = _sc = None
+        if _ec:
             try:
-                _cfg = _lc()
+                _cfg = _ec()
                 _existing = _cfg.get('security', {}).get('access_token')
                 if _existing:
                     access_token = _existing
@@ -393,6 +396,8 @@ if __name__ == '__main__':
             except Exception:
                 pass
 
+    # 选定服务引擎(gevent / eventlet 需在创建 SocketIO 之前 monkey-patch)
+    prepare_engine()
     app = create_app(access_token=access_token)
 
     no_gui = os.environ.get('DEVTOOLBOX_NO_GUI', '').lower() == '1'
@@ -427,8 +432,4 @@ if __name__ == '__main__':
     if not access_token:
         # Dev mode: no token, no gui, no tray
         debug = os.environ.get('FLASK_DEBUG', 'false').lower() == 'true'
-        socketio = app.config.get('SOCKETIO')
-        if socketio:
-            socketio.run(app, host=host, port=port, debug=debug, allow_unsafe_werkzeug=True)
-        else:
-            app.run(host=host, port=port, debug=debug)
+        run_server(app, host, port, debug=debug)
@@ -0,0 +1,43 @@
+"""Shared helpers for the standalone benchmark scripts in this directory.
+
+Run a benchmark from the repository root, e.g.::
+
+    python backend/benchmarks/bench_auth.py
+"""
+import os
+import sys
+import tempfile
+import pathlib
+import time
+
+# 与 tests/conftest.py 相同:让 `from utils.xxx` / `from modules.xxx` 可用
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+# 部分模块(如 hash_tools)只支持 `backend.utils` 形式的回退导入
+REPO_ROOT = os.path.dirname(BACKEND_DIR)
+if REPO_ROOT not in sys.path:
+    sys.path.append(REPO_ROOT)
+
+
+def isolate_config():
+    """Point config_manager at a throwaway config file; returns the temp dir."""
+    import utils.config_manager as cm
+    tmp = tempfile.mkdtemp(prefix='devtoolbox-bench-')
+    cm.get_config_path = lambda: pathlib.Path(tmp) / 'bench_config.json'
+    cm._config_cache = None
+    cm._config_mtime = None
+    return tmp
+
+
+def bench(label, fn, number=20000, repeat=5):
+    """Run *fn* ``number`` times, ``repeat`` rounds; print and return best µs/op."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    per_op = best / number * 1e6
+    print(f'{label:<48} {per_op:10.2f} µs/op')
+    return per_op
@@ -0,0 +1,78 @@
+"""Per-request auth overhead: legacy check_access_token vs utils.auth snapshot.
+
+The legacy function below reproduces the pre-snapshot hook body (config
+file stat + deepcopy of the cached dict + linear temp_tokens scan) for
+comparison.
+"""
+import copy
+import hmac
+import time
+
+from _common import bench, isolate_config
+
+isolate_config()
+
+import utils.config_manager as cm  # noqa: E402
+from utils.auth import is_exempt_path, get_token_snapshot, verify_token  # noqa: E402
+
+ACCESS_TOKEN = 'a' * 32
+
+
+_legacy_cache = {}
+
+
+def _seed_config(n_temp):
+    cfg = cm.edit_config()
+    cfg['security']['temp_tokens'] = [
+        {'token': f'{i:016x}', 'label': f't{i}', 'expires_at': time.time() + 3600}
+        for i in range(n_temp)
+    ]
+    cm.save_config(cfg)
+    _legacy_cache.clear()
+    _legacy_cache.update(cfg)
+
+
+def legacy_check(path, provided):
+    cm.get_config_path().stat()
+    config = copy.deepcopy(_legacy_cache)
+    if not config.get('security', {}).get('token_enabled', True):
+        return True
+    if (path in ('/favicon.ico', '/robots.txt', '/api/frontend-log')
+            or path.startswith('/socket.io/') or path.startswith('/assets/')):
+        return True
+    if hmac.compare_digest(provided or '', ACCESS_TOKEN):
+        return True
+    now_ts = time.time()
+    for t in config.get('security', {}).get('temp_tokens', []):
+        exp = t.get('expires_at', 0)
+        if hmac.compare_digest(t.get('token', ''), provided or '') and isinstance(exp, (int, float)) and exp > now_ts:
+            return True
+    return False
+
+
+def snapshot_check(path, provided):
+    if is_exempt_path(path):
+        return True
+    snap = get_token_snapshot()
+    if not snap.token_enabled:
+        return True
+    return verify_token(provided, ACCESS_TOKEN, snap) is not None
+
+
+def main():
+    for n_temp in (0, 50):
+        _seed_config(n_temp)
+        last_temp = f'{max(n_temp - 1, 0):016x}'
+        print(f'--- {n_temp} temp tokens ---')
+        for label, path, provided in (
+            ('/assets/index.js', '/assets/index.js', None),
+            ('/api/json-tools/format (access token)', '/api/json-tools/format', ACCESS_TOKEN),
+            ('/api/json-tools/format (last temp token)', '/api/json-tools/format', last_temp),
+        ):
+            before = bench(f'legacy   {label}', lambda: legacy_check(path, provided))
+            after = bench(f'snapshot {label}', lambda: snapshot_check(path, provided))
+            print(f'{"speedup":<48} {before / after:10.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Benchmark: large-file download throughput, FileWrapper vs socket.sendfile.
+
+Serves /api/file-upload/files/<name> from the built-in werkzeug server
+(the same server socketio.run() uses) and downloads it over loopback.
+
+    python backend/benchmarks/bench_download.py [size_mb]
+"""
+import logging
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import _common  # noqa: F401  (sys.path)
+
+from flask import Flask
+from werkzeug.serving import make_server
+
+import modules.file_serving as file_serving
+from modules.file_upload import file_upload_bp
+
+
+def _download(port, name):
+    # 原始 socket 读取,避免客户端侧 Python 解析成为瓶颈
+    with socket.create_connection(('127.0.0.1', port)) as s:
+        s.sendall(f'GET /api/file-upload/files/{name} HTTP/1.1\r\nHost: x\r\n\r\n'.encode())
+        total = 0
+        buf = bytearray(1 << 20)
+        while True:
+            n = s.recv_into(buf)
+            if not n:
+                return total
+            total += n
+
+
+def _measure(label, port, name, size, rounds=5):
+    best = float('inf')
+    for _ in range(rounds):
+        cpu0 = time.process_time()
+        start = time.perf_counter()
+        received = _download(port, name)
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu0
+        assert received >= size, received
+        best = min(best, elapsed)
+    print(f'{label:<36} {size / best / 1e6:10.1f} MB/s   (process cpu {cpu * 1000:.0f} ms)')
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 512
+    folder = tempfile.mkdtemp(prefix='devtoolbox-bench-dl-')
+    size = size_mb * 1024 * 1024
+    with open(os.path.join(folder, 'big.bin'), 'wb') as f:
+        chunk = os.urandom(1024 * 1024)
+        for _ in range(size_mb):
+            f.write(chunk)
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = folder
+    app.register_blueprint(file_upload_bp, url_prefix='/api/file-upload')
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+
+    print(f'{size_mb} MB over loopback, werkzeug threaded server')
+    try:
+        file_serving.USE_SENDFILE = False
+        _measure('werkzeug FileWrapper (before)', port, 'big.bin', size)
+        file_serving.USE_SENDFILE = True
+        _measure('socket.sendfile', port, 'big.bin', size)
+    finally:
+        server.shutdown()
+        os.remove(os.path.join(folder, 'big.bin'))
+
+
+if __name__ == '__main__':
+    main()
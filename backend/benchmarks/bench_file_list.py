@@ -0,0 +1,69 @@
+"""Benchmark: /api/file-upload/files listing, legacy listdir+stat vs the index.
+
+    python backend/benchmarks/bench_file_list.py
+"""
+import io
+import os
+import tempfile
+import zipfile
+
+from _common import bench
+
+from flask import Flask
+from modules.file_upload import file_upload_bp, get_ebook_metadata
+
+N_FILES = 3000
+N_EPUBS = 100
+
+_OPF = ('<?xml version="1.0"?><package xmlns="http://www.idpf.org/2007/opf">'
+        '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/"><dc:title>Book {i}</dc:title>'
+        '</metadata><manifest/></package>')
+_CONTAINER = ('<?xml version="1.0"?><container xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+              '<rootfiles><rootfile full-path="content.opf"/></rootfiles></container>')
+
+
+def _populate(folder):
+    for i in range(N_FILES):
+        with open(os.path.join(folder, f'file_{i:05d}.txt'), 'wb') as f:
+            f.write(b'x' * (i % 512))
+    for i in range(N_EPUBS):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, 'w') as z:
+            z.writestr('META-INF/container.xml', _CONTAINER)
+            z.writestr('content.opf', _OPF.format(i=i))
+        with open(os.path.join(folder, f'book_{i:03d}.epub'), 'wb') as f:
+            f.write(buf.getvalue())
+
+
+def legacy_list(folder):
+    # 旧实现:每次 listdir + stat,并对每本电子书重新解析
+    file_list = []
+    for filename in os.listdir(folder):
+        path = os.path.join(folder, filename)
+        if os.path.isfile(path):
+            st = os.stat(path)
+            entry = {'name': filename, 'size': st.st_size, 'modified': st.st_mtime}
+            if filename.endswith(('.epub', '.pdf')):
+                entry.update(get_ebook_metadata(folder, filename))
+            file_list.append(entry)
+    file_list.sort(key=lambda x: x['modified'], reverse=True)
+    return file_list
+
+
+def main():
+    folder = tempfile.mkdtemp(prefix='devtoolbox-bench-files-')
+    _populate(folder)
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = folder
+    app.register_blueprint(file_upload_bp, url_prefix='/api/file-upload')
+    client = app.test_client()
+    client.get('/api/file-upload/files')  # 首次建索引 + 提取电子书元数据
+
+    print(f'{N_FILES} files + {N_EPUBS} epubs')
+    bench('legacy listdir + stat + epub parse', lambda: legacy_list(folder), number=3, repeat=3)
+    bench('index, full list', lambda: client.get('/api/file-upload/files'), number=10, repeat=3)
+    bench('index, ?limit=50', lambda: client.get('/api/file-upload/files?limit=50'), number=200, repeat=3)
+
+
+if __name__ == '__main__':
+    main()
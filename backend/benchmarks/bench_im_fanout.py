@@ -0,0 +1,59 @@
+"""IM group-message fan-out: per-sid emit loop vs one room emit.
+
+Simulates N joined sessions on a python-socketio server (no network: the
+engine.io send is replaced by a counter) and times relaying one group
+message the old way (registry walk + ``emit(room=sid)`` per recipient, the
+packet re-encoded each time) and the new way (``emit(room='broadcast',
+skip_sid=sender)``, encoded once).
+
+    python backend/benchmarks/bench_im_fanout.py [sessions]
+"""
+import sys
+
+from _common import bench
+
+import socketio
+
+from modules.im import BROADCAST_ROOM
+from modules.im_presence import InProcessPresence
+
+
+def main():
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    server = socketio.Server(async_mode='threading')
+    sent = [0]
+
+    def _send_eio_packet(eio_sid, pkt):
+        sent[0] += 1
+    server._send_eio_packet = _send_eio_packet
+
+    presence = InProcessPresence()
+    sids = []
+    for i in range(sessions):
+        sid = server.manager.connect(f'eio-{i}', '/')
+        server.manager.enter_room(sid, '/', BROADCAST_ROOM)
+        presence.join(sid, f'node-{i // 2}', f'Device {i // 2}', '10.0.0.1')  # 每设备两个标签页
+        sids.append(sid)
+    sender = sids[0]
+    message = {'id': 'm' * 32, 'senderId': 'node-0', 'senderName': 'Device 0', 'targetId': None,
+               'content': 'hello ' * 40, 'msgType': 'text', 'attachment': None,
+               'timestamp': 1700000000}
+
+    def per_sid_loop():
+        for s in [s for s in presence.all_sids() if s != sender]:
+            server.emit('recv-msg', message, room=s, namespace='/')
+
+    def room_emit():
+        server.emit('recv-msg', message, room=BROADCAST_ROOM, skip_sid=sender, namespace='/')
+
+    print(f'{sessions} sessions, one group message')
+    for label, fn in (('per-sid emit loop (before)', per_sid_loop),
+                      ("room='broadcast' + skip_sid", room_emit)):
+        sent[0] = 0
+        fn()
+        assert sent[0] == sessions - 1, sent[0]
+        bench(f'{label}', fn, number=200, repeat=5)
+
+
+if __name__ == '__main__':
+    main()
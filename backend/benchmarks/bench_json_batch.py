@@ -0,0 +1,86 @@
+"""Benchmark: JSON formatting throughput, one /format request per document vs /batch.
+
+    python backend/benchmarks/bench_json_batch.py
+
+Reports input MB/s for 500 documents of ~2 KiB each: the legacy per-document
+endpoint, ``/batch`` with a JSON envelope and with an NDJSON body, each with
+the stdlib codec and — when installed — orjson.
+"""
+import json
+import random
+import time
+
+from _common import bench  # noqa: F401  (sets up sys.path)
+
+from flask import Flask
+
+import modules.json_codec as json_codec
+from modules.json_tools import json_tools_bp
+
+N_DOCS = 500
+
+
+def _documents():
+    rng = random.Random(1)
+    docs = []
+    for i in range(N_DOCS):
+        doc = {
+            'id': i,
+            'name': f'item-{i}',
+            'tags': [f'tag{rng.randint(0, 99)}' for _ in range(8)],
+            'price': round(rng.random() * 1000, 2),
+            'active': rng.random() > 0.5,
+            'owner': {'id': rng.randint(1, 10 ** 6), 'name': '张三', 'email': f'user{i}@example.com'},
+            'history': [{'ts': 1700000000 + j, 'value': rng.random()} for j in range(40)],
+        }
+        docs.append(json.dumps(doc, ensure_ascii=False))
+    return docs
+
+
+def _throughput(label, fn, size, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    print(f'{label:<48} {size / best / 1e6:8.2f} MB/s  ({best * 1000:8.1f} ms)')
+
+
+def main():
+    docs = _documents()
+    size = sum(len(d.encode('utf-8')) for d in docs)
+    print(f'{N_DOCS} documents, {size / 1e6:.2f} MB')
+
+    app = Flask(__name__)
+    app.register_blueprint(json_tools_bp, url_prefix='/api/json-tools')
+    client = app.test_client()
+    envelope = json.dumps({'documents': docs, 'operations': ['format']}, ensure_ascii=False).encode('utf-8')
+    ndjson = '\n'.join(docs).encode('utf-8')
+
+    def legacy():
+        for doc in docs:
+            assert client.post('/api/json-tools/format', json={'json_text': doc}).status_code == 200
+
+    def batch():
+        r = client.post('/api/json-tools/batch', data=envelope, content_type='application/json')
+        assert r.status_code == 200
+
+    def batch_ndjson():
+        r = client.post('/api/json-tools/batch?ops=format', data=ndjson, content_type='application/x-ndjson')
+        assert r.status_code == 200
+
+    orjson = json_codec.orjson
+    json_codec.orjson = None
+    _throughput('POST /format per document', legacy, size)
+    _throughput('POST /batch envelope (json)', batch, size)
+    _throughput('POST /batch NDJSON (json)', batch_ndjson, size)
+    json_codec.orjson = orjson
+    if orjson is None:
+        print('orjson not installed; skipping accelerated runs')
+        return
+    _throughput('POST /batch envelope (orjson)', batch, size)
+    _throughput('POST /batch NDJSON (orjson)', batch_ndjson, size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Benchmark: Markdown preview on a ~50 KB document, per-request MarkdownIt vs shared renderer.
+
+    python backend/benchmarks/bench_markdown_preview.py
+
+The endpoint figures go through ``/api/markdown-tools/to-html`` (not cached)
+and ``/api/data-conversion/preview-md`` with the conversion cache disabled,
+so every request really parses and renders the document; the incremental
+row edits one line of the same document through a preview session.
+"""
+import json
+import tempfile
+
+from _common import bench
+
+from flask import Flask
+from markdown_it import MarkdownIt
+
+import modules.conversion_cache as conversion_cache
+from modules.conversion_cache import ConversionCache
+from modules.data_conversion import data_conversion_bp
+from modules.markdown_preview import PreviewSession
+from modules.markdown_render import get_renderer
+from modules.markdown_tools import markdown_tools_bp
+
+_SECTION = """## Section {i}
+
+Some *emphasis*, **strong text**, ~~struck~~ words and `inline code`, plus a
+[link](https://example.com/{i}) in a paragraph that wraps
+over a few lines.
+
+- item one
+- item two with `code`
+  - nested item
+
+| name | value |
+|------|-------|
+| a{i} | {i}   |
+
+```python
+def f{i}(x):
+    return x * {i}
+```
+
+"""
+
+
+def _document(target=50 * 1024):
+    parts, size, i = ['# Benchmark document\n\n'], 0, 0
+    while size < target:
+        parts.append(_SECTION.format(i=i))
+        size += len(parts[-1])
+        i += 1
+    return ''.join(parts)
+
+
+def legacy_render(text):
+    # 旧实现:每个请求重新构造并配置 MarkdownIt
+    md = MarkdownIt("commonmark", {"breaks": True, "html": False, "linkify": True, "typographer": True}
+                    ).enable(['table', 'strikethrough', 'code', 'fence', 'emphasis', 'list'])
+    return md.render(text)
+
+
+def _rps(label, fn, number):
+    per_op = bench(label, fn, number=number, repeat=3)
+    print(f'{"":<48} {1e6 / per_op:10.1f} req/s')
+
+
+def main():
+    text = _document()
+    print(f'document: {len(text.encode("utf-8")) / 1024:.1f} KiB')
+    assert legacy_render(text) == get_renderer('preview').render(text)
+
+    bench('construct MarkdownIt only', lambda: legacy_render(''), number=500)
+    # 短文档(实时预览的常见情形)里构造开销占比更高
+    small = _document(1024)
+    _rps('1 KiB: new MarkdownIt per request', lambda: legacy_render(small), number=500)
+    _rps('1 KiB: shared preview renderer', lambda: get_renderer('preview').render(small), number=500)
+    _rps('50 KiB: new MarkdownIt per request', lambda: legacy_render(text), number=50)
+    _rps('50 KiB: shared preview renderer', lambda: get_renderer('preview').render(text), number=50)
+
+    # 增量预览:同一文档中间改动一行,只重新解析相邻的几个顶层块
+    session = PreviewSession('bench')
+    lines = text.split('\n')
+    session.update(lines)
+    middle = len(lines) // 2
+    edits = iter(range(10 ** 9))
+
+    def edit():
+        lines[middle] = f'edited paragraph {next(edits)}'
+        session.update(lines)
+
+    _rps('50 KiB: incremental one-line edit', edit, number=200)
+
+    conversion_cache._cache = ConversionCache(tempfile.mkdtemp(), memory_bytes=0, disk_bytes=0)
+    app = Flask(__name__)
+    app.register_blueprint(markdown_tools_bp, url_prefix='/api/markdown-tools')
+    app.register_blueprint(data_conversion_bp, url_prefix='/api/data-conversion')
+    client = app.test_client()
+    body = json.dumps({'markdown_text': text})
+    for url in ('/api/markdown-tools/to-html', '/api/data-conversion/preview-md'):
+        _rps(f'POST {url}', lambda: client.post(url, data=body, content_type='application/json'),
+             number=30)
+
+
+if __name__ == '__main__':
+    main()
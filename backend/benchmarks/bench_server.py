@@ -0,0 +1,128 @@
+"""Load test: requests/sec and latency percentiles per serving engine.
+
+Each engine runs the full app (create_app, Socket.IO included) in its own
+subprocess so gevent/eventlet monkey-patching does not leak between runs.
+Clients reuse their connection when the server allows keep-alive.
+
+    python backend/benchmarks/bench_server.py [concurrency] [requests]
+"""
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from _common import BACKEND_DIR, REPO_ROOT
+
+PATH = '/api/im/status'
+
+_RUNNER = r'''
+import pathlib, sys, tempfile
+sys.path[:0] = [{backend!r}, {root!r}]
+from utils import server
+server.prepare_engine({engine!r})            # 先 monkey-patch,再导入应用
+import utils.config_manager as cm
+tmp = tempfile.mkdtemp(prefix='devtoolbox-bench-srv-')
+cm.get_config_path = lambda: pathlib.Path(tmp) / 'bench_config.json'
+cfg = cm.edit_config()
+cfg['network'].update(server={engine!r}, workers={workers})
+cm.save_config(cfg)
+import logging; logging.disable(logging.WARNING)
+from app import create_app
+app = create_app()
+for limiter in app.extensions.get('limiter', ()):
+    limiter.enabled = False                  # 300/min 的 per-IP 限流会让压测全变成 429
+server.run_server(app, '127.0.0.1', {port})
+'''
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_port(port, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def _client(port, count, latencies, errors):
+    conn = None
+    for _ in range(count):
+        start = time.perf_counter()
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            conn.request('GET', PATH)
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status != 200:
+                errors.append(resp.status)
+            if resp.will_close:
+                conn.close()
+                conn = None
+            latencies.append(time.perf_counter() - start)
+        except (OSError, http.client.HTTPException):
+            errors.append(1)
+            if conn is not None:
+                conn.close()
+            conn = None
+    if conn is not None:
+        conn.close()
+
+
+def run(engine, concurrency, total, workers=16):
+    port = _free_port()
+    code = _RUNNER.format(backend=BACKEND_DIR, root=REPO_ROOT, engine=engine,
+                          workers=workers, port=port)
+    proc = subprocess.Popen([sys.executable, '-c', code], cwd=REPO_ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not _wait_port(port):
+            print(f'{engine:<10} failed to start')
+            return
+        _client(port, 50, [], [])  # warm-up
+        latencies, errors = [], []
+        per_client = total // concurrency
+        threads = [threading.Thread(target=_client, args=(port, per_client, latencies, errors))
+                   for _ in range(concurrency)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+        print(f'{engine:<10} {len(latencies) / elapsed:9.0f} req/s   p50 {pct(0.50):6.2f} ms'
+              f'   p99 {pct(0.99):7.2f} ms   errors {len(errors)}')
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 6400
+    print(f'GET {PATH}, {concurrency} concurrent clients, {total} requests')
+    sys.path.insert(0, BACKEND_DIR)
+    from utils.server import SERVER_ENGINES, engine_available
+    for engine in SERVER_ENGINES:
+        if engine_available(engine):
+            run(engine, concurrency, total)
+        else:
+            print(f'{engine:<10} not installed, skipped')
+
+
+if __name__ == '__main__':
+    os.environ.setdefault('DEVTOOLBOX_CONFIG_POLL_INTERVAL', '60')
+    main()
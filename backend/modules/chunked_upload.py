@@ -0,0 +1,330 @@
+"""
+Resumable chunked uploads (IM attachments).
+
+A single multipart POST has to start over after any network drop and is
+capped by ``MAX_CONTENT_LENGTH``. A chunked upload instead:
+
+1. ``init`` — reserves ``_incoming/<id>.part`` preallocated to the final
+   size (``posix_fallocate`` where supported, otherwise a sparse file) and
+   records the session in ``_incoming/<id>.json``;
+2. ``append`` — writes one chunk at its offset with a positional write,
+   after checking the optional per-chunk digest. Chunks may arrive out of
+   order or in parallel; the session keeps the merged byte ranges and
+   acknowledges the contiguous prefix, which is where a client resumes;
+3. ``complete`` — once every byte is present, produces the whole-file
+   digest (hashed incrementally while chunks arrive in order, otherwise
+   one read pass) and hands the part to the blob store like a normal upload.
+
+Session state is on disk, so an upload survives a server restart. Appends
+to one session are serialized per process; concurrent appends to the same
+session on different worker processes may drop a range update, which the
+client sees as a lower offset and simply resends.
+"""
+
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+try:
+    from .hash_tools import SUPPORTED_ALGORITHMS
+    from .upload_store import incoming_dir
+except ImportError:
+    from hash_tools import SUPPORTED_ALGORITHMS
+    from upload_store import incoming_dir
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+SESSION_TTL = 24 * 3600  # 超过一天未活动的上传会话在下次 init 时清理
+
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class ChunkedUploadError(Exception):
+    """Client-visible error; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class CompletedPart:
+    """A fully received part, shaped like HashingFileWriter for store_blob()."""
+
+    def __init__(self, path, algorithm, digest, size):
+        self.path = path
+        self.algorithm = algorithm
+        self.size = size
+        self._digest = digest
+
+    def close(self):
+        pass
+
+    def hexdigest(self):
+        return self._digest
+
+
+def _parse_digest(value):
+    """``'<algorithm>:<hex>'`` -> (algorithm, hex); raises for unknown algorithms."""
+    algorithm, _, expected = (value or '').partition(':')
+    algorithm = algorithm.strip().lower()
+    if algorithm not in SUPPORTED_ALGORITHMS or not expected.strip():
+        raise ChunkedUploadError('Unsupported digest')
+    return algorithm, expected.strip().lower()
+
+
+def _file_digest(path, algorithm):
+    h = SUPPORTED_ALGORITHMS[algorithm]()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _merge(ranges, start, end):
+    """Insert [start, end) into sorted, disjoint *ranges* and merge neighbours."""
+    merged = []
+    for lo, hi in sorted(ranges + [[start, end]]):
+        if merged and lo <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], hi)
+        else:
+            merged.append([lo, hi])
+    return merged
+
+
+def _contiguous(ranges):
+    return ranges[0][1] if ranges and ranges[0][0] == 0 else 0
+
+
+def _preallocate(fd, size):
+    if size <= 0:
+        return
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError:
+            pass  # 文件系统不支持(如部分 FUSE / tmpfs 旧内核):退回稀疏文件
+    os.ftruncate(fd, size)
+
+
+def _pwrite(fd, data, offset):
+    if hasattr(os, 'pwrite'):
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+        return
+    os.lseek(fd, offset, os.SEEK_SET)  # Windows 无 pwrite
+    os.write(fd, data)
+
+
+class ChunkedUploads:
+    """Chunked upload sessions stored under ``<upload_root>/_incoming``."""
+
+    def __init__(self, upload_root):
+        self.upload_root = upload_root
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._hashers = {}  # {upload_id: (hasher, hashed_up_to)} 顺序到达时的增量摘要
+
+    # --- session files ---
+
+    def _paths(self, upload_id):
+        if not _UPLOAD_ID.match(upload_id or ''):
+            raise ChunkedUploadError('Unknown upload', 404)
+        base = os.path.join(incoming_dir(self.upload_root), upload_id)
+        return base + '.part', base + '.json'
+
+    def _lock(self, upload_id):
+        with self._locks_guard:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def _load(self, upload_id):
+        part, meta = self._paths(upload_id)
+        try:
+            with open(meta, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            raise ChunkedUploadError('Unknown upload', 404)
+        if not os.path.exists(part):
+            raise ChunkedUploadError('Unknown upload', 404)
+        return state
+
+    def _save(self, upload_id, state):
+        _, meta = self._paths(upload_id)
+        state['updated_at'] = time.time()
+        tmp = meta + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp, meta)
+
+    @staticmethod
+    def status(state):
+        return {
+            'uploadId': state['id'],
+            'size': state['size'],
+            'chunkSize': state['chunk_size'],
+            'algorithm': state['algorithm'],
+            'offset': _contiguous(state['ranges']),
+            'ranges': state['ranges'],
+        }
+
+    # --- protocol ---
+
+    def init(self, filename, size, max_size, algorithm, mime=None, digest=None,
+             chunk_size=None, max_chunk=MAX_CHUNK_SIZE):
+        """Create a session and preallocate its part file; returns status().
+
+        *chunk_size* is the client's preference, clamped to *max_chunk* (each
+        chunk is one request body, so it must stay under MAX_CONTENT_LENGTH).
+        """
+        if not filename:
+            raise ChunkedUploadError('Empty filename')
+        if isinstance(size, bool) or not isinstance(size, int) or size < 0:
+            raise ChunkedUploadError('Invalid size')
+        if size > max_size:
+            raise ChunkedUploadError(f'File too large (max {max_size // 1024 // 1024} MB)', 413)
+        if chunk_size is None:
+            chunk_size = DEFAULT_CHUNK_SIZE
+        if isinstance(chunk_size, bool) or not isinstance(chunk_size, int) or chunk_size <= 0:
+            raise ChunkedUploadError('Invalid chunk size')
+        chunk_size = min(chunk_size, max_chunk, MAX_CHUNK_SIZE)
+        expected = _parse_digest(digest) if digest else None
+        self.purge_stale()
+        if shutil.disk_usage(incoming_dir(self.upload_root)).free < size:
+            raise ChunkedUploadError('Not enough disk space', 507)
+
+        upload_id = uuid.uuid4().hex
+        part, _ = self._paths(upload_id)
+        fd = os.open(part, os.O_RDWR | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o644)
+        try:
+            _preallocate(fd, size)
+        except OSError:
+            os.close(fd)
+            os.remove(part)
+            raise ChunkedUploadError('Not enough disk space', 507)
+        os.close(fd)
+        state = {
+            'id': upload_id, 'filename': filename, 'size': size, 'mime': mime,
+            'chunk_size': chunk_size, 'algorithm': algorithm,
+            'digest': list(expected) if expected else None,
+            'ranges': [], 'created_at': time.time(),
+        }
+        self._save(upload_id, state)
+        if size == 0:
+            self._hashers[upload_id] = (SUPPORTED_ALGORITHMS[algorithm](), 0)
+        return self.status(state)
+
+    def get(self, upload_id):
+        return self.status(self._load(upload_id))
+
+    def append(self, upload_id, offset, data, chunk_digest=None):
+        """Write *data* at *offset*; returns status() after acknowledging it."""
+        if chunk_digest:
+            # 先校验再落盘:传输中损坏的分片不会被确认,客户端重发即可
+            algorithm, expected = _parse_digest(chunk_digest)
+            h = SUPPORTED_ALGORITHMS[algorithm]()
+            h.update(data)
+            if h.hexdigest() != expected:
+                raise ChunkedUploadError('Chunk digest mismatch', 422)
+
+        part, _ = self._paths(upload_id)
+        with self._lock(upload_id):
+            state = self._load(upload_id)
+            if len(data) > state['chunk_size']:
+                raise ChunkedUploadError('Chunk too large', 413)
+            end = offset + len(data)
+            if offset < 0 or end > state['size']:
+                raise ChunkedUploadError('Chunk outside file', 416)
+            if data:
+                fd = os.open(part, os.O_WRONLY | getattr(os, 'O_BINARY', 0))
+                try:
+                    _pwrite(fd, data, offset)
+                finally:
+                    os.close(fd)
+                state['ranges'] = _merge(state['ranges'], offset, end)
+                self._save(upload_id, state)
+                self._hash_in_order(upload_id, state['algorithm'], offset, data)
+            return self.status(state)
+
+    def _hash_in_order(self, upload_id, algorithm, offset, data):
+        hasher, hashed = self._hashers.get(upload_id) or (None, 0)
+        if hasher is None and offset == 0:
+            hasher = SUPPORTED_ALGORITHMS[algorithm]()
+        if offset < hashed:
+            # 覆盖了已计入摘要的字节(重传内容可能不同):丢弃增量摘要,complete 时整文件重算
+            self._hashers.pop(upload_id, None)
+            return
+        if hasher is None or offset != hashed:
+            return  # 乱序 / 另一进程写入:complete 时整文件重算
+        hasher.update(data)
+        self._hashers[upload_id] = (hasher, hashed + len(data))
+
+    def complete(self, upload_id):
+        """Return a CompletedPart once every byte arrived; the session is consumed."""
+        part, meta = self._paths(upload_id)
+        with self._lock(upload_id):
+            state = self._load(upload_id)
+            if _contiguous(state['ranges']) < state['size']:
+                raise ChunkedUploadError('Upload incomplete', 409)
+            hasher, hashed = self._hashers.pop(upload_id, (None, 0))
+            if hasher is not None and hashed == state['size']:
+                digest = hasher.hexdigest()
+            else:
+                digest = _file_digest(part, state['algorithm'])
+            if state['digest']:
+                algorithm, expected = state['digest']
+                actual = digest if algorithm == state['algorithm'] else _file_digest(part, algorithm)
+                if actual != expected:
+                    self._discard(upload_id)
+                    raise ChunkedUploadError('File digest mismatch', 422)
+            os.remove(meta)
+        with self._locks_guard:
+            self._locks.pop(upload_id, None)
+        return CompletedPart(part, state['algorithm'], digest, state['size']), state
+
+    def abort(self, upload_id):
+        self._load(upload_id)
+        with self._lock(upload_id):
+            self._discard(upload_id)
+
+    def _discard(self, upload_id):
+        self._hashers.pop(upload_id, None)
+        for path in self._paths(upload_id):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def purge_stale(self, ttl=SESSION_TTL):
+        """Remove sessions idle for longer than *ttl* seconds."""
+        folder = incoming_dir(self.upload_root)
+        cutoff = time.time() - ttl
+        for name in os.listdir(folder):
+            if not name.endswith('.json'):
+                continue
+            upload_id = name[:-5]
+            try:
+                if os.stat(os.path.join(folder, name)).st_mtime < cutoff:
+                    self._discard(upload_id)
+            except (OSError, ChunkedUploadError):
+                pass
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_chunked_uploads(upload_root):
+    """Return the shared ChunkedUploads for *upload_root* (one per folder per process)."""
+    key = os.path.realpath(upload_root)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = ChunkedUploads(upload_root)
+        return store
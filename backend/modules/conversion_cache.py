@@ -0,0 +1,276 @@
+"""
+Result cache for Markdown / HTML / PDF conversions.
+
+The live-preview UI and repeated exports send the same document over and
+over, and every request re-rendered it (WeasyPrint takes seconds). Results
+are now cached under a key hashing renderer name, options and input text:
+
+- an in-memory LRU bounded by total bytes (``conversion.cache_memory_mb``);
+- a disk tier in ``_meta/conversion-cache`` under the upload folder (the
+  app's data directory) bounded the same way (``conversion.cache_disk_mb``,
+  0 disables it), evicting least recently used files; it survives restarts
+  and is shared by worker processes. The directory is created mode 0700
+  and must belong to the server's user — otherwise (someone else created
+  it, it is a symlink) the disk tier is disabled rather than trusted;
+- concurrent misses for the same key render once, the others wait;
+- hits / misses / stores / evictions are counted for ``/cache/stats``.
+
+``CACHE_VERSION`` is part of every key; bump it when rendering output
+changes (renderer options, templates) so stale entries are never served.
+Stylesheet changes need no bump: callers put the bundle hash in *options*.
+"""
+
+import collections
+import hashlib
+import json
+import os
+import stat
+import threading
+import logging
+
+try:
+    from ..utils import config_manager
+except ImportError:
+    try:
+        from backend.utils import config_manager
+    except ImportError:
+        from utils import config_manager
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+DEFAULT_MEMORY_MB = 32
+DEFAULT_DISK_MB = 256
+CACHE_RELPATH = os.path.join('_meta', 'conversion-cache')
+
+
+def cache_key(renderer, text, options=None):
+    h = hashlib.sha256()
+    h.update(f'{CACHE_VERSION}\0{renderer}\0'.encode('utf-8'))
+    h.update(json.dumps(options or {}, sort_keys=True).encode('utf-8'))
+    h.update(b'\0')
+    h.update(text.encode('utf-8', 'surrogatepass'))
+    return h.hexdigest()
+
+
+def _private_dir(path):
+    """Create *path* for this user only; False if it exists but cannot be trusted."""
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        st = os.lstat(path)
+    except OSError:
+        return False
+    if not stat.S_ISDIR(st.st_mode):
+        return False  # 符号链接等:可能指向他人控制的位置
+    if hasattr(os, 'getuid'):
+        if st.st_uid != os.getuid():
+            return False
+        if st.st_mode & 0o077:
+            try:
+                os.chmod(path, 0o700)
+            except OSError:
+                return False
+    return True
+
+
+class ConversionCache:
+    """Two-tier (memory + disk) LRU of rendered bytes keyed by cache_key()."""
+
+    def __init__(self, directory, memory_bytes, disk_bytes):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        if disk_bytes and not _private_dir(directory):
+            logger.warning('Conversion cache directory %s is not private to this user; '
+                           'disk cache disabled', directory)
+            disk_bytes = 0
+        self.disk_bytes = disk_bytes
+        self._memory = collections.OrderedDict()  # {key: bytes},最近使用的在末尾
+        self._memory_size = 0
+        self._disk = None  # {key: size},首次使用时扫描目录;按 mtime 排序近似 LRU
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        self._inflight = {}  # {key: Event}
+        self._stats = collections.Counter()
+
+    # --- memory tier ---
+
+    def _remember(self, key, data):
+        if len(data) > self.memory_bytes // 4:
+            return  # 单个结果过大:只进磁盘,避免一次挤掉全部内存条目
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= len(old)
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+            self._stats['memory_evictions'] += 1
+
+    # --- disk tier ---
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _load_disk_index(self):
+        if self._disk is not None:
+            return
+        self._disk = {}
+        entries = []
+        if os.path.isdir(self.directory):
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if len(name) != 64:  # 跳过写入中途残留的 .tmp
+                        continue
+                    try:
+                        st = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, name, st.st_size))
+        for _, name, size in sorted(entries):
+            self._disk[name] = size
+            self._disk_size += size
+
+    def _read_disk(self, key):
+        if not self.disk_bytes:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # 命中即刷新 mtime,重启后按 mtime 恢复 LRU 顺序
+        except OSError:
+            return None
+        with self._lock:
+            self._load_disk_index()
+            if key in self._disk:
+                self._disk[key] = self._disk.pop(key)
+        return data
+
+    def _write_disk(self, key, data):
+        if not self.disk_bytes or len(data) > self.disk_bytes:
+            return
+        path = self._path(key)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            logger.warning('Conversion cache write failed', exc_info=True)
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+        evict = []
+        with self._lock:
+            self._load_disk_index()
+            self._disk_size -= self._disk.pop(key, 0)
+            self._disk[key] = len(data)
+            self._disk_size += len(data)
+            while self._disk_size > self.disk_bytes and len(self._disk) > 1:
+                old_key = next(iter(self._disk))
+                self._disk_size -= self._disk.pop(old_key)
+                evict.append(old_key)
+                self._stats['disk_evictions'] += 1
+        for old_key in evict:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    # --- public API ---
+
+    def get(self, key):
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return data
+        data = self._read_disk(key)
+        with self._lock:
+            if data is not None:
+                self._stats['disk_hits'] += 1
+                self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        with self._lock:
+            self._remember(key, data)
+            self._stats['stores'] += 1
+        self._write_disk(key, data)
+
+    def get_or_render(self, key, render):
+        """Return ``(data, hit)``; *render()* runs once per key even under concurrent misses."""
+        while True:
+            data = self.get(key)
+            if data is not None:
+                return data, True
+            with self._lock:
+                event = self._inflight.get(key)
+                if event is None:
+                    event = self._inflight[key] = threading.Event()
+                    break
+            event.wait()  # 同一文档正在渲染:等待其结果,失败时自己重试
+        try:
+            with self._lock:
+                self._stats['misses'] += 1
+            data = render()
+            self.put(key, data)
+            return data, False
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_size,
+                'disk_entries': len(self._disk) if self._disk is not None else None,
+                'disk_bytes': self._disk_size if self._disk is not None else None,
+            })
+        for field in ('memory_hits', 'disk_hits', 'misses', 'stores',
+                      'memory_evictions', 'disk_evictions'):
+            stats.setdefault(field, 0)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else None
+        return stats
+
+
+def _mb(value, default):
+    try:
+        return max(0, int(value)) * 1024 * 1024
+    except (TypeError, ValueError):
+        return default * 1024 * 1024
+
+
+_cache = None
+_cache_lock = threading.Lock()
+_params = None  # 最近一次应用的 (directory, memory, disk)
+
+
+@config_manager.subscribe
+def _on_config_change(config):
+    # 目录或容量变化时重建(已缓存的磁盘文件保留,由新实例接管并按新上限淘汰)
+    global _cache, _params
+    conversion = config.get('conversion', {})
+    params = (os.path.join(config_manager.get_upload_dir(config), CACHE_RELPATH),
+              _mb(conversion.get('cache_memory_mb'), DEFAULT_MEMORY_MB),
+              _mb(conversion.get('cache_disk_mb'), DEFAULT_DISK_MB))
+    with _cache_lock:
+        if _cache is None or (_params is not None and params != _params):
+            _cache = ConversionCache(*params)
+        _params = params
+
+
+def get_conversion_cache():
+    """Return the process-wide ConversionCache (created from config on first use)."""
+    if _cache is None:
+        _on_config_change(config_manager.load_config())
+    return _cache
@@ -1,8 +1,8 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, Response, request, jsonify, send_file
 import html2text
+import json
 import os
 import tempfile
-import fitz  # PyMuPDF for PDF processing
 from bs4 import BeautifulSoup
 import re
 import logging
@@ -19,15 +19,22 @@ except ImportError:
         from utils.error_handler import safe_error
 
 try:
-    from .data_conversion_styles import build_full_html, build_preview_html
+    from .data_conversion_styles import build_full_html, build_preview_html, get_bundle, find_bundle
+    from .pdf_markdown import open_pdf, iter_pages, convert_pdf
+    from .conversion_cache import get_conversion_cache, cache_key
+    from .markdown_render import get_renderer
+    from .markdown_preview import get_preview_sessions, split_lines, PreviewError
+    from .pdf_render import get_pdf_pool, get_pdf_stats, PdfQueueFull, PdfRenderTimeout
 except ImportError:
-    from data_conversion_styles import build_full_html, build_preview_html
+    from data_conversion_styles import build_full_html, build_preview_html, get_bundle, find_bundle
+    from pdf_markdown import open_pdf, iter_pages, convert_pdf
+    from conversion_cache import get_conversion_cache, cache_key
+    from markdown_render import get_renderer
+    from markdown_preview import get_preview_sessions, split_lines, PreviewError
+    from pdf_render import get_pdf_pool, get_pdf_stats, PdfQueueFull, PdfRenderTimeout
 
 logger = logging.getLogger(__name__)
 
-# 添加 markdown-it-py 导入
-import markdown_it
-
 data_conversion_bp = Blueprint('data_conversion', __name__)
 
 ALLOWED_EXTENSIONS = {'pdf'}
@@ -56,6 +63,31 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+
+def _cached(renderer, text, render, styles='full'):
+    """Return ``(bytes, hit)`` for *text*; *render()* returns bytes and only runs on a miss.
+
+    The hash of the *styles* bundle is part of the key, so CSS changes never serve stale output.
+    """
+    key = cache_key(renderer, text, {'styles': get_bundle(styles).hash})
+    return get_conversion_cache().get_or_render(key, render)
+
+
+def _pdf_response(pdf_data, hit):
+    response = Response(pdf_data, mimetype='application/pdf')
+    response.headers.set('Content-Disposition', 'attachment', filename='converted.pdf')
+    response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+
+def _pdf_pool_error(e):
+    """渲染进程池满(429,附 Retry-After)或任务超时(504)"""
+    if isinstance(e, PdfQueueFull):
+        response = jsonify({'error': str(e), 'error_type': 'pdf_queue_full'})
+        response.headers['Retry-After'] = '5'
+        return response, 429
+    return jsonify({'error': str(e), 'error_type': 'pdf_timeout'}), 504
+
 @data_conversion_bp.route('/md-to-html', methods=['POST'])
 def markdown_to_html():
     """Markdown转HTML"""
@@ -68,28 +100,25 @@ def markdown_to_html():
         if not markdown_text.strip():
             return jsonify({'error': 'Markdown文本不能为空'}), 400
 
-        # 使用 markdown-it-py 转换Markdown为HTML
-        md = markdown_it.MarkdownIt(
-            "commonmark",
-            {
-                "breaks": True,        # 转换 \n 为 <br>
-                "html": False,         # 禁用HTML标签（防止XSS）
-                "linkify": True,       # 自动转换URL为链接
-                "typographer": True,   # 启用智能引号等排版替换
-            }
-        ).enable(['table', 'strikethrough', 'code', 'fence', 'emphasis', 'list'])
+        def render():
+            # 使用 markdown-it-py 转换Markdown为HTML
+            html_content = get_renderer('preview').render(markdown_text)
 
-        html_content = md.render(markdown_text)
+            # 创建完整的HTML文档，包含美化样式
+            full_html = build_full_html(html_content, title="Markdown转换结果", use_vars=True)
+            return full_html.encode('utf-8')
 
-        # 创建完整的HTML文档，包含美化样式
-        full_html = build_full_html(html_content, title="Markdown转换结果", use_vars=True)
+        full_html, hit = _cached('md-to-html', markdown_text, render, styles='full-vars')
+        full_html = full_html.decode('utf-8')
 
-        return jsonify({
+        response = jsonify({
             'success': True,
             'html': full_html,  # 返回完整的HTML文档
             'original_length': len(markdown_text),
             'html_length': len(full_html)
-        }), 200
+        })
+        response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+        return response, 200
 
     except Exception as e:
         return safe_error(e)
@@ -99,6 +128,8 @@ def preview_markdown():
     """Markdown预览"""
     try:
         data = request.get_json()
+        if data and 'doc_id' in data:
+            return _incremental_preview(data)
         if not data or 'markdown_text' not in data:
             return jsonify({'error': '请提供markdown_text字段'}), 400
 
@@ -106,30 +137,71 @@ def preview_markdown():
         if not markdown_text.strip():
             return jsonify({'html': '<p class="empty-preview">暂无内容，请输入 Markdown 内容</p>'}), 200
 
-        # 使用 markdown-it-py 转换Markdown为HTML用于预览
-        md = markdown_it.MarkdownIt(
-            "commonmark",
-            {
-                "breaks": True,        # 转换 \n 为 <br>
-                "html": False,         # 禁用HTML标签（防止XSS）
-                "linkify": True,       # 自动转换URL为链接
-                "typographer": True,   # 启用智能引号等排版替换
-            }
-        ).enable(['table', 'strikethrough', 'code', 'fence', 'emphasis', 'list'])
+        # 默认链接可长期缓存的样式表,inline_css=true 时仍内联 <style>
+        inline_css = bool(data.get('inline_css'))
 
-        html_content = md.render(markdown_text)
+        def render():
+            # 使用 markdown-it-py 转换Markdown为HTML用于预览
+            html_content = get_renderer('preview').render(markdown_text)
 
-        # 创建带样式的预览HTML
-        styled_html = build_preview_html(html_content)
+            # 创建带样式的预览HTML
+            return build_preview_html(html_content, inline_css=inline_css).encode('utf-8')
 
-        return jsonify({
+        renderer = 'preview-md-inline' if inline_css else 'preview-md'
+        styled_html, hit = _cached(renderer, markdown_text, render, styles='preview')
+
+        response = jsonify({
             'success': True,
-            'html': styled_html
-        }), 200
+            'html': styled_html.decode('utf-8'),
+            'stylesheet': get_bundle('preview').url
+        })
+        response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+        return response, 200
 
     except Exception as e:
         return safe_error(e)
 
+def _incremental_preview(data):
+    """增量预览:按 doc_id 保留已解析的块,只重新渲染变化的顶层块,返回块级补丁
+
+    请求: {doc_id, markdown_text} 同步全文(服务端自行比对),
+          或 {doc_id, base_version, changes: [{start, end, lines}]} 按行替换。
+    响应: {doc_id, version, patch: {start, deleteCount, blocks: [{id, html}]}};
+          base_version 缺失或与服务端不符(首次同步 / 页面重载)时另附完整的 html 与 blocks。
+    """
+    sessions = get_preview_sessions()
+    full_text = 'markdown_text' in data
+    if not full_text and not isinstance(data.get('changes'), list):
+        return jsonify({'error': '请提供markdown_text或changes字段'}), 400
+    try:
+        session = sessions.get(data['doc_id'], create=full_text)
+        with session.lock:
+            # 客户端持有的块列表与服务端版本不一致时,补丁无从应用,改为附带全量块
+            stale = session.lines is None or data.get('base_version') != session.version
+            if full_text:
+                patch = session.update(split_lines(str(data['markdown_text'])))
+            else:
+                patch = session.apply_changes(data.get('base_version'), data['changes'])
+            result = {'success': True, 'doc_id': session.doc_id, 'version': session.version,
+                      'patch': patch, 'stylesheet': get_bundle('preview').url}
+            if stale:
+                result['blocks'] = session.snapshot()
+                result['html'] = build_preview_html(''.join(block['html'] for block in result['blocks']))
+    except PreviewError as e:
+        return jsonify({'error': str(e), 'resync': e.status == 409}), e.status
+    return jsonify(result), 200
+
+@data_conversion_bp.route('/styles/<bundle_hash>.css', methods=['GET'])
+def stylesheet(bundle_hash):
+    """预览样式表:按内容哈希寻址,内容不变则 URL 不变,可被浏览器长期缓存"""
+    bundle = find_bundle(bundle_hash)
+    if bundle is None:
+        return jsonify({'error': '样式表不存在'}), 404
+    response = Response(bundle.css, mimetype='text/css')
+    response.set_etag(bundle.hash)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response.make_conditional(request)
+
 @data_conversion_bp.route('/preview-html', methods=['POST'])
 def preview_html():
     """HTML预览"""
@@ -190,162 +262,80 @@ def html_to_markdown():
 @data_conversion_bp.route('/md-to-pdf', methods=['POST'])
 def markdown_to_pdf():
     """Markdown转PDF - 智能选择转换器"""
-    # 首先尝试使用WeasyPrint
+    data = request.get_json(silent=True)
+    if not data or 'markdown_text' not in data:
+        return jsonify({'error': '请提供markdown_text字段'}), 400
+
+    markdown_text = data['markdown_text']
+    if not markdown_text.strip():
+        return jsonify({'error': 'Markdown文本不能为空'}), 400
+
+    def render():
+        # 首先尝试使用WeasyPrint
+        try:
+            return markdown_to_pdf_weasyprint(markdown_text)
+        except (PdfQueueFull, PdfRenderTimeout):
+            raise  # 繁忙 / 超时不再换引擎重试,直接告知客户端
+        except Exception as e:
+            # 如果WeasyPrint失败，尝试使用wkhtmltopdf;两者都失败时保留第一个错误用于诊断
+            try:
+                return markdown_to_pdf_wkhtmltopdf(markdown_text)
+            except (PdfQueueFull, PdfRenderTimeout):
+                raise
+            except Exception:
+                raise e
+
     try:
-        return markdown_to_pdf_weasyprint()
+        # 相同文档重复导出直接命中缓存,不再重新排版
+        pdf_data, hit = _cached('md-to-pdf', markdown_text, render)
+        return _pdf_response(pdf_data, hit)
+    except (PdfQueueFull, PdfRenderTimeout) as e:
+        return _pdf_pool_error(e)
     except Exception as e:
         error_str = str(e).lower()
-        # 如果WeasyPrint失败，尝试使用wkhtmltopdf
-        try:
-            return markdown_to_pdf_wkhtmltopdf()
-        except Exception as e2:
-            # 如果两种方法都失败，返回错误信息
-            error_message = "PDF生成失败："
-
-            # 检测具体的错误类型并提供针对性解决方案
-            if "weasyprint" in error_str or "cairo" in error_str or "pango" in error_str:
-                error_message += "检测到WeasyPrint相关错误，请检查WeasyPrint是否正确安装。"
-            elif "wkhtmltopdf" in error_str or "filenotfounderror" in error_str:
-                error_message += "检测到系统未安装wkhtmltopdf，请先安装wkhtmltopdf工具。"
-            elif "markdown" in error_str or "html" in error_str:
-                error_message += "Markdown数据处理错误，请检查输入内容格式。"
-            elif "permission" in error_str or "access" in error_str:
-                error_message += "文件权限错误，请检查程序是否有写入临时文件的权限。"
-            elif "memory" in error_str or "out of memory" in error_str:
-                error_message += "内存不足，请尝试减小输入内容的大小。"
-            else:
-                error_message += f"未知错误：{str(e)}"
-
-            return jsonify({
-                'error': error_message,
-                'error_type': 'pdf_generation_failed'
-            }), 500
+        # 如果两种方法都失败，返回错误信息
+        error_message = "PDF生成失败："
 
-def markdown_to_pdf_weasyprint():
-    """Markdown转PDF - 使用WeasyPrint"""
-    pdf_filename = None
-    try:
-        data = request.get_json()
-        if not data or 'markdown_text' not in data:
-            return jsonify({'error': '请提供markdown_text字段'}), 400
+        # 检测具体的错误类型并提供针对性解决方案
+        if "weasyprint" in error_str or "cairo" in error_str or "pango" in error_str:
+            error_message += "检测到WeasyPrint相关错误，请检查WeasyPrint是否正确安装。"
+        elif "wkhtmltopdf" in error_str or "filenotfounderror" in error_str:
+            error_message += "检测到系统未安装wkhtmltopdf，请先安装wkhtmltopdf工具。"
+        elif "markdown" in error_str or "html" in error_str:
+            error_message += "Markdown数据处理错误，请检查输入内容格式。"
+        elif "permission" in error_str or "access" in error_str:
+            error_message += "文件权限错误，请检查程序是否有写入临时文件的权限。"
+        elif "memory" in error_str or "out of memory" in error_str:
+            error_message += "内存不足，请尝试减小输入内容的大小。"
+        else:
+            error_message += f"未知错误：{str(e)}"
 
-        markdown_text = data['markdown_text']
-        if not markdown_text.strip():
-            return jsonify({'error': 'Markdown文本不能为空'}), 400
+        return jsonify({
+            'error': error_message,
+            'error_type': 'pdf_generation_failed'
+        }), 500
 
-        # 使用 markdown-it-py 将Markdown转换为HTML
-        md = markdown_it.MarkdownIt(
-            "commonmark",
-            {
-                "breaks": True,        # 转换 \n 为 <br>
-                "html": False,         # 禁用HTML标签（防止XSS）
-                "linkify": True,       # 自动转换URL为链接
-                "typographer": True,   # 启用智能引号等排版替换
-            }
-        ).enable(['table', 'strikethrough', 'code', 'fence', 'emphasis', 'list'])
-
-        html_content = md.render(markdown_text)
-
-        # 创建完整的HTML文档，包含CSS样式
-        full_html = build_full_html(html_content)
-
-        # 创建临时PDF文件
-        tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        pdf_filename = tmp_file.name
-        tmp_file.close()  # 关闭文件句柄，让其他进程可以访问
-
-        # 使用WeasyPrint将HTML转换为PDF
-        from weasyprint import HTML, CSS
-        import io
-        
-        # 将HTML字符串转换为PDF
-        html = HTML(string=full_html)
-        html.write_pdf(pdf_filename)
-
-        # 读取PDF文件内容
-        with open(pdf_filename, 'rb') as f:
-            pdf_data = f.read()
-
-        # 立即删除临时文件
-        os.unlink(pdf_filename)
-        pdf_filename = None
-
-        # 返回PDF数据
-        from flask import Response
-        response = Response(pdf_data, mimetype='application/pdf')
-        response.headers.set('Content-Disposition', 'attachment', filename='converted.pdf')
-        return response
+def markdown_to_pdf_weasyprint(markdown_text):
+    """Markdown转PDF - 使用WeasyPrint(预热的渲染进程),返回PDF字节"""
+    # 使用 markdown-it-py 将Markdown转换为HTML
+    html_content = get_renderer('export').render(markdown_text)
 
-    except Exception as e:
-        # 清理临时文件
-        if pdf_filename and os.path.exists(pdf_filename):
-            try:
-                os.unlink(pdf_filename)
-            except:
-                pass  # 忽略删除失败的错误
-        raise e  # 重新抛出异常，让调用者处理
+    # 样式由渲染进程以预解析的 'full' 样式包提供,文档本身不再内联
+    full_html = build_full_html(html_content, inline_css=False)
+    return get_pdf_pool().render('weasyprint', full_html, stylesheet='full')
 
-def markdown_to_pdf_wkhtmltopdf():
-    """Markdown转PDF - 使用wkhtmltopdf"""
-    try:
-        data = request.get_json()
-        if not data or 'markdown_text' not in data:
-            raise ValueError('请提供markdown_text字段')
+def markdown_to_pdf_wkhtmltopdf(markdown_text):
+    """Markdown转PDF - 使用wkhtmltopdf,返回PDF字节"""
+    # 使用 markdown-it-py 将Markdown转换为HTML
+    html_content = get_renderer('export').render(markdown_text)
 
-        markdown_text = data['markdown_text']
-        if not markdown_text.strip():
-            raise ValueError('Markdown文本不能为空')
-
-        # 使用 markdown-it-py 将Markdown转换为HTML
-        md = markdown_it.MarkdownIt(
-            "commonmark",
-            {
-                "breaks": True,        # 转换 \n 为 <br>
-                "html": False,         # 禁用HTML标签（防止XSS）
-                "linkify": True,       # 自动转换URL为链接
-                "typographer": True,   # 启用智能引号等排版替换
-            }
-        ).enable(['table', 'strikethrough', 'code', 'fence', 'emphasis', 'list'])
-
-        html_content = md.render(markdown_text)
-
-        # 创建完整的HTML文档，包含CSS样式
-        full_html = build_full_html(html_content)
-
-        # 使用pdfkit将HTML转换为PDF
-        import pdfkit
-        import tempfile
-        
-        # 配置pdfkit选项
-        options = {
-            'encoding': 'UTF-8',
-            'page-size': 'A4',
-            'margin-top': '20mm',
-            'margin-bottom': '20mm',
-            'margin-left': '20mm',
-            'margin-right': '20mm',
-            'enable-local-file-access': None
-        }
-        
-        # 生成PDF
-        pdf_data = pdfkit.from_string(full_html, False, options=options)
-
-        # 返回PDF数据
-        from flask import Response
-        response = Response(pdf_data, mimetype='application/pdf')
-        response.headers.set('Content-Disposition', 'attachment', filename='converted.pdf')
-        return response
-
-    except FileNotFoundError as e:
-        # wkhtmltopdf未安装
-        raise Exception('系统中未找到wkhtmltopdf，请先安装wkhtmltopdf。请参考"wkhtmltopdf安装指南.md"进行安装。')
-    except Exception as e:
-        raise e  # 重新抛出异常，让调用者处理
+    # 创建完整的HTML文档，包含CSS样式
+    full_html = build_full_html(html_content)
+    return get_pdf_pool().render('wkhtmltopdf', full_html)
 
 @data_conversion_bp.route('/html-to-pdf', methods=['POST'])
 def html_to_pdf():
     """HTML转PDF"""
-    pdf_filename = None
     try:
         data = request.get_json()
         if not data or 'html_text' not in data:
@@ -355,49 +345,21 @@ def html_to_pdf():
         if not html_text.strip():
             return jsonify({'error': 'HTML文本不能为空'}), 400
 
-        # 创建临时PDF文件
-        tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        pdf_filename = tmp_file.name
-        tmp_file.close()  # 关闭文件句柄，让其他进程可以访问
+        def render():
+            # 为HTML添加样式以确保PDF输出的一致性
+            # 如果HTML已经包含完整的HTML结构，则直接使用
+            if '<!DOCTYPE html>' in html_text and '<head>' in html_text and '<body>' in html_text:
+                return get_pdf_pool().render('weasyprint', html_text)
+            # 如果是片段HTML，则包装成完整的HTML文档(样式包由渲染进程预解析)
+            full_html = build_full_html(html_text, title="HTML转换结果", inline_css=False)
+            return get_pdf_pool().render('weasyprint', full_html, stylesheet='full')
 
-        # 为HTML添加样式以确保PDF输出的一致性
-        # 如果HTML已经包含完整的HTML结构，则直接使用
-        if '<!DOCTYPE html>' in html_text and '<head>' in html_text and '<body>' in html_text:
-            full_html = html_text
-        else:
-            # 如果是片段HTML，则包装成完整的HTML文档
-            full_html = build_full_html(html_text, title="HTML转换结果")
-
-        # 使用WeasyPrint将HTML转换为PDF
-        from weasyprint import HTML
-        import io
-        
-        # 将HTML字符串转换为PDF
-        html = HTML(string=full_html)
-        html.write_pdf(pdf_filename)
-
-        # 读取PDF文件内容
-        with open(pdf_filename, 'rb') as f:
-            pdf_data = f.read()
-
-        # 立即删除临时文件
-        os.unlink(pdf_filename)
-        pdf_filename = None
-
-        # 返回PDF数据
-        from flask import Response
-        response = Response(pdf_data, mimetype='application/pdf')
-        response.headers.set('Content-Disposition', 'attachment', filename='converted.pdf')
-        return response
+        pdf_data, hit = _cached('html-to-pdf', html_text, render)
+        return _pdf_response(pdf_data, hit)
 
+    except (PdfQueueFull, PdfRenderTimeout) as e:
+        return _pdf_pool_error(e)
     except Exception as e:
-        # 清理临时文件
-        if pdf_filename and os.path.exists(pdf_filename):
-            try:
-                os.unlink(pdf_filename)
-            except:
-                pass  # 忽略删除失败的错误
-
         # 提供更具体的错误信息
         error_str = str(e).lower()
         error_message = "PDF生成失败："
@@ -419,6 +381,16 @@ def html_to_pdf():
             'error_type': 'pdf_generation_failed'
         }), 500
 
+@data_conversion_bp.route('/pdf/stats', methods=['GET'])
+def pdf_render_stats():
+    """PDF 渲染进程池的排队 / 完成 / 超时 / 拒绝计数(进程池尚未启动时为 null)"""
+    return jsonify({'success': True, 'stats': get_pdf_stats()})
+
+@data_conversion_bp.route('/cache/stats', methods=['GET'])
+def conversion_cache_stats():
+    """转换结果缓存的命中率 / 容量统计"""
+    return jsonify({'success': True, 'stats': get_conversion_cache().stats()})
+
 @data_conversion_bp.route('/upload-pdf', methods=['POST'])
 def upload_pdf():
     """上传PDF文件"""
@@ -465,34 +437,8 @@ def pdf_to_markdown():
             return jsonify({'error': '文件不存在'}), 404
 
         try:
-            # 打开PDF文件
-            doc = fitz.Document(file_path)  # 使用Document而不是open
-            markdown_content = []
-            total_pages = len(doc)
-
-            for page_num in range(total_pages):
-                page = doc.load_page(page_num)
-                text = page.get_text()
-
-                # 添加页标题
-                if total_pages > 1:
-                    markdown_content.append(f'# 第{page_num + 1}页\n')
-
-                # 处理文本，按段落分割
-                paragraphs = text.split('\n\n')
-                for paragraph in paragraphs:
-                    paragraph = paragraph.strip()
-                    if paragraph:
-                        # 简单的标题检测（基于字体大小或位置，这里简化处理）
-                        if len(paragraph) < 100 and not paragraph.endswith('.'):
-                            markdown_content.append(f'## {paragraph}\n')
-                        else:
-                            markdown_content.append(f'{paragraph}\n\n')
-
-            doc.close()
-
-            # 合并所有内容
-            final_markdown = ''.join(markdown_content)
+            # 标题按字号识别,长文档按页段在进程池中并行转换
+            final_markdown, total_pages = convert_pdf(file_path)
 
             # 清理文件
             os.unlink(file_path)
@@ -512,3 +458,59 @@ def pdf_to_markdown():
 
     except Exception as e:
         return safe_error(e)
+
+
+@data_conversion_bp.route('/pdf-to-md/stream', methods=['POST'])
+def pdf_to_markdown_stream():
+    """PDF转Markdown(流式):逐页输出 NDJSON,或 SSE(?format=sse / Accept: text/event-stream)
+
+    PDF 可直接以 multipart 字段 file 上传(省去 /upload-pdf 往返),
+    也可传 JSON {filename} 引用已上传的文件。转换结束后文件被删除。
+    """
+    upload = request.files.get('file') if request.mimetype == 'multipart/form-data' else None
+    if upload is not None:
+        if not upload.filename or not allowed_file(upload.filename):
+            return jsonify({'error': '不支持的文件类型'}), 400
+        fd, file_path = tempfile.mkstemp(suffix='.pdf')
+        os.close(fd)
+        upload.save(file_path)
+    else:
+        data = request.get_json(silent=True)
+        if not data or 'filename' not in data:
+            return jsonify({'error': '请提供filename字段'}), 400
+        file_path = safe_join(_get_upload_folder(), str(data['filename']))
+        if file_path is None:
+            return jsonify({'error': '无效的文件名'}), 403
+        if not os.path.exists(file_path):
+            return jsonify({'error': '文件不存在'}), 404
+
+    try:
+        page_count, profile = open_pdf(file_path)
+    except Exception as e:
+        os.unlink(file_path)
+        return jsonify({'error': f'PDF处理错误: {str(e)}'}), 400
+
+    sse = request.args.get('format') == 'sse' or \
+        request.accept_mimetypes.best == 'text/event-stream'
+
+    def record(payload):
+        line = json.dumps(payload, ensure_ascii=False)
+        return f"event: {payload['type']}\ndata: {line}\n\n" if sse else line + '\n'
+
+    def generate():
+        characters = 0
+        try:
+            yield record({'type': 'meta', 'pages': page_count})
+            for page, markdown in iter_pages(file_path, page_count, profile):
+                characters += len(markdown)
+                yield record({'type': 'page', 'page': page, 'markdown': markdown})
+            yield record({'type': 'done', 'pages': page_count, 'characters': characters})
+        except Exception as e:
+            logger.warning('PDF stream conversion failed', exc_info=True)
+            yield record({'type': 'error', 'error': f'PDF处理错误: {str(e)}'})
+        finally:
+            if os.path.exists(file_path):
+                os.unlink(file_path)
+
+    return Response(generate(), mimetype='text/event-stream' if sse else 'application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
@@ -5,8 +5,19 @@ This module centralizes the duplicated CSS that was previously inlined
 across multiple functions in data_conversion.py (markdown_to_html,
 markdown_to_pdf_weasyprint, markdown_to_pdf_wkhtmltopdf, html_to_pdf,
 and preview_markdown).
+
+The CSS is assembled once per bundle (see get_bundle()) and content-hashed,
+so previews can link ``/api/data-conversion/styles/<hash>.css`` — served
+with an immutable Cache-Control — instead of inlining it into every JSON
+response, and conversion caches can key on the hash.
 """
 
+import hashlib
+import threading
+from typing import NamedTuple
+
+STYLES_URL_PREFIX = '/api/data-conversion/styles/'
+
 
 def get_base_css():
     """Return the base CSS string used for PDF generation and standalone HTML.
@@ -764,7 +775,7 @@ def get_preview_css():
     """
 
 
-def build_full_html(body_html, title="Markdown转换结果", use_vars=False):
+def build_full_html(body_html, title="Markdown转换结果", use_vars=False, inline_css=True):
     """Build a complete HTML document with CSS styling.
 
     Args:
@@ -773,14 +784,18 @@ def build_full_html(body_html, title="Markdown转换结果", use_vars=False):
         use_vars: If True, use CSS variables for theming support
                   (used by markdown_to_html). If False, use hardcoded
                   colors (used by PDF generation functions).
+        inline_css: If False, leave the <style> element out; the caller
+                    supplies the bundle separately (the PDF workers keep
+                    it pre-parsed).
 
     Returns:
         A complete HTML document string.
     """
-    if use_vars:
-        css = get_enhanced_base_css() + get_responsive_css() + get_print_css()
+    if inline_css:
+        styles = f"""<style>{get_bundle('full-vars' if use_vars else 'full').css}
+    </style>"""
     else:
-        css = get_base_css()
+        styles = ''
 
     return f"""<!DOCTYPE html>
 <html>
@@ -788,8 +803,7 @@ def build_full_html(body_html, title="Markdown转换结果", use_vars=False):
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>{title}</title>
-    <style>{css}
-    </style>
+    {styles}
 </head>
 <body>
     <article>
@@ -799,7 +813,7 @@ def build_full_html(body_html, title="Markdown转换结果", use_vars=False):
 </html>"""
 
 
-def build_preview_html(body_html):
+def build_preview_html(body_html, inline_css=False):
     """Build an inline preview HTML fragment with scoped CSS.
 
     This wraps the content in a .markdown-preview div with scoped styles,
@@ -807,12 +821,73 @@ def build_preview_html(body_html):
 
     Args:
         body_html: The rendered HTML content to preview.
+        inline_css: If True, inline the stylesheet in a <style> element;
+                    otherwise link the cacheable preview bundle.
 
     Returns:
-        An HTML fragment string with inline styles.
+        An HTML fragment string.
     """
+    bundle = get_bundle('preview')
+    if inline_css:
+        styles = f"""<style>{bundle.css}
+    </style>"""
+    else:
+        styles = f'<link rel="stylesheet" href="{bundle.url}">'
     return f"""<div class="markdown-preview">
-    <style>{get_preview_css()}
-    </style>
+    {styles}
     {body_html}
 </div>"""
+
+
+class StyleBundle(NamedTuple):
+    """A named, fully assembled stylesheet and its content hash."""
+    name: str
+    css: str
+    hash: str
+
+    @property
+    def url(self):
+        return f'{STYLES_URL_PREFIX}{self.hash}.css'
+
+
+_bundle_builders = {
+    'full': get_base_css,
+    'full-vars': lambda: get_enhanced_base_css() + get_responsive_css() + get_print_css(),
+    'preview': get_preview_css,
+}
+_bundles = {}            # name -> StyleBundle
+_bundles_by_hash = {}    # hash -> StyleBundle
+_bundles_lock = threading.Lock()
+
+
+def register_bundle(name, build):
+    """Register *build()* (returning CSS) as bundle *name*; assembled on first use."""
+    with _bundles_lock:
+        _bundle_builders[name] = build
+        stale = _bundles.pop(name, None)
+        if stale is not None:
+            _bundles_by_hash.pop(stale.hash, None)
+
+
+def get_bundle(name):
+    """Return the StyleBundle *name*, assembling and hashing it once."""
+    bundle = _bundles.get(name)
+    if bundle is None:
+        with _bundles_lock:
+            bundle = _bundles.get(name)
+            if bundle is None:
+                css = _bundle_builders[name]()
+                digest = hashlib.sha256(css.encode('utf-8')).hexdigest()[:16]
+                bundle = _bundles[name] = StyleBundle(name, css, digest)
+                _bundles_by_hash[digest] = bundle
+    return bundle
+
+
+def find_bundle(digest):
+    """Return the StyleBundle whose hash is *digest*, or None."""
+    bundle = _bundles_by_hash.get(digest)
+    if bundle is None:
+        for name in list(_bundle_builders):
+            get_bundle(name)
+        bundle = _bundles_by_hash.get(digest)
+    return bundle
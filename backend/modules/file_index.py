@@ -0,0 +1,225 @@
+"""
+Persistent metadata index for the file-upload folder.
+
+``/api/file-upload/files`` used to listdir + stat every file and reparse
+every EPUB/PDF on each request. The index keeps one SQLite row per file
+(size, mtime, title, cover status, digest) in ``_meta/index.sqlite3``:
+
+- upload / delete update it directly;
+- listing reconciles it against the folder only when the folder's own
+  mtime changed (files added/removed behind our back), comparing each
+  file's size + mtime;
+- ebook title/cover extraction runs lazily, only for rows on the page
+  being returned whose cover status is still unknown;
+- the malware-scan verdict (``scan_status``) lives here too; quarantined
+  files have left the folder but keep their row so the listing can say so.
+"""
+
+import os
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+INDEX_RELPATH = os.path.join('_meta', 'index.sqlite3')
+
+# cover 列:NULL = 尚未提取, 0 = 无封面, 1 = 已缓存封面
+COVER_UNKNOWN, COVER_NONE, COVER_READY = None, 0, 1
+
+# 去重后同内容的文件名共享 inode(mtime 相同),"修改时间"优先取上传时间
+SORT_COLUMNS = {'modified': 'COALESCE(uploaded_at, mtime)', 'name': 'name', 'size': 'size'}
+DEFAULT_SORT = '-modified'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    name TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    title TEXT,
+    cover INTEGER,
+    digest TEXT,
+    digest_algorithm TEXT,
+    original_name TEXT,
+    uploaded_at REAL,
+    scan_status TEXT,
+    scan_detail TEXT
+);
+CREATE INDEX IF NOT EXISTS files_mtime ON files (mtime);
+CREATE INDEX IF NOT EXISTS files_size ON files (size);
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value);
+"""
+
+_FIELDS = ('name', 'size', 'mtime', 'title', 'cover', 'digest',
+           'digest_algorithm', 'original_name', 'uploaded_at', 'scan_status', 'scan_detail')
+
+# 旧版本创建的索引缺少的列:打开时补齐
+_ADDED_COLUMNS = {'scan_status': 'TEXT', 'scan_detail': 'TEXT'}
+
+QUARANTINED = 'quarantined'  # malware_scan 隔离的文件已移出目录,但保留索引行
+
+
+def needs_cover(filename):
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return ext in ('epub', 'pdf')
+
+
+class FileIndex:
+    """SQLite-backed index of one upload folder (thread-safe, one connection)."""
+
+    def __init__(self, upload_folder):
+        self.upload_folder = upload_folder
+        path = os.path.join(upload_folder, INDEX_RELPATH)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        try:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+        except sqlite3.DatabaseError:
+            pass
+        self._conn.executescript(_SCHEMA)
+        existing = {row[1] for row in self._conn.execute('PRAGMA table_info(files)')}
+        with self._conn:
+            for column, decl in _ADDED_COLUMNS.items():
+                if column not in existing:
+                    self._conn.execute(f'ALTER TABLE files ADD COLUMN {column} {decl}')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --- Single-row operations ---
+
+    def upsert(self, name, **fields):
+        """Insert or update *name* (size and mtime are required for new rows)."""
+        fields = {k: v for k, v in fields.items() if k in _FIELDS and k != 'name'}
+        with self._lock, self._conn:
+            cols = ', '.join(['name'] + list(fields))
+            marks = ', '.join('?' * (len(fields) + 1))
+            updates = ', '.join(f'{k} = excluded.{k}' for k in fields) or 'name = name'
+            self._conn.execute(
+                f'INSERT INTO files ({cols}) VALUES ({marks}) '
+                f'ON CONFLICT(name) DO UPDATE SET {updates}',
+                [name] + list(fields.values()),
+            )
+
+    def update(self, name, **fields):
+        """Update columns of an existing row (no-op if *name* is not indexed)."""
+        fields = {k: v for k, v in fields.items() if k in _FIELDS and k != 'name'}
+        if not fields:
+            return
+        with self._lock, self._conn:
+            sets = ', '.join(f'{k} = ?' for k in fields)
+            self._conn.execute(f'UPDATE files SET {sets} WHERE name = ?',
+                               list(fields.values()) + [name])
+
+    def get(self, name):
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM files WHERE name = ?', (name,)).fetchone()
+        return dict(row) if row else None
+
+    def delete(self, name):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM files WHERE name = ?', (name,))
+
+    # --- Reconciliation ---
+
+    def _get_state(self, key):
+        row = self._conn.execute('SELECT value FROM state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key, value):
+        self._conn.execute(
+            'INSERT INTO state (key, value) VALUES (?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value', (key, value))
+
+    def reconcile(self, force=False):
+        """Sync the index with the folder if the folder's mtime changed.
+
+        Returns the rows dropped for files that vanished from the folder, so
+        the caller can release their blob references.
+        """
+        try:
+            dir_mtime = os.stat(self.upload_folder).st_mtime
+        except OSError:
+            return []
+        with self._lock:
+            if not force and self._get_state('dir_mtime') == dir_mtime:
+                return []
+            on_disk = {}
+            with os.scandir(self.upload_folder) as it:
+                for entry in it:
+                    try:
+                        if entry.is_file():
+                            st = entry.stat()
+                            on_disk[entry.name] = (st.st_size, st.st_mtime)
+                    except OSError:
+                        continue
+            rows = {row['name']: dict(row) for row in self._conn.execute(
+                'SELECT name, size, mtime, digest, digest_algorithm FROM files '
+                'WHERE scan_status IS NOT ?', (QUARANTINED,))}
+            indexed = {name: (row['size'], row['mtime']) for name, row in rows.items()}
+            removed = [rows[name] for name in indexed.keys() - on_disk.keys()]
+            with self._conn:
+                for row in removed:
+                    self._conn.execute('DELETE FROM files WHERE name = ?', (row['name'],))
+                for name, (size, mtime) in on_disk.items():
+                    if indexed.get(name) == (size, mtime):
+                        continue
+                    # 新文件或内容被外部改动:大小/时间更新,摘要、封面与扫描状态作废
+                    self._conn.execute(
+                        'INSERT INTO files (name, size, mtime, cover) VALUES (?, ?, ?, ?) '
+                        'ON CONFLICT(name) DO UPDATE SET size = excluded.size, mtime = excluded.mtime, '
+                        'title = NULL, cover = excluded.cover, digest = NULL, digest_algorithm = NULL, '
+                        'scan_status = NULL, scan_detail = NULL',
+                        (name, size, mtime, COVER_UNKNOWN if needs_cover(name) else COVER_NONE),
+                    )
+                self._set_state('dir_mtime', dir_mtime)
+        return removed
+
+    # --- Queries ---
+
+    def query(self, offset=0, limit=None, sort=DEFAULT_SORT):
+        """Return (rows, total) sorted by ``[-]modified|name|size``."""
+        descending = sort.startswith('-')
+        column = SORT_COLUMNS.get(sort.lstrip('-+'), SORT_COLUMNS['modified'])
+        order = 'DESC' if descending else 'ASC'
+        sql = f'SELECT * FROM files ORDER BY {column} {order}, name ASC'
+        params = []
+        if limit is not None:
+            sql += ' LIMIT ? OFFSET ?'
+            params = [limit, offset]
+        elif offset:
+            sql += ' LIMIT -1 OFFSET ?'
+            params = [offset]
+        with self._lock:
+            rows = [dict(r) for r in self._conn.execute(sql, params)]
+            total = self._conn.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+        return rows, total
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_file_index(upload_folder):
+    """Return the shared FileIndex for *upload_folder* (one per folder per process)."""
+    key = os.path.realpath(upload_folder)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = FileIndex(upload_folder)
+            _indexes[key] = index
+        return index
+
+
+def _reset_after_fork():
+    # sqlite3 连接不能跨 fork 使用,子进程重新打开
+    global _indexes, _indexes_lock
+    _indexes = {}
+    _indexes_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
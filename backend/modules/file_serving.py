@@ -0,0 +1,105 @@
+"""
+Response helpers for serving stored uploads.
+
+Wraps Flask's ``send_file`` so every download route gets the same policy:
+
+- a strong ETag taken from the stored content digest when one is known
+  (falls back to werkzeug's mtime/size tag otherwise);
+- conditional GET (``If-None-Match`` / ``If-Modified-Since`` -> 304) and
+  byte ranges (``Range`` -> 206, ``If-Range``), so media players can seek;
+- ``Cache-Control: no-cache`` (always revalidate) for names that may be
+  reused, ``public, max-age=1y, immutable`` for URLs whose content never
+  changes (uuid-named IM files and their thumbnails).
+
+Large bodies skip werkzeug's Python-level FileWrapper: under the built-in
+server (``network.server = "werkzeug"``, see utils/server.py) the response
+headers are flushed and the bytes are handed to the kernel with
+``socket.sendfile()`` (``os.sendfile`` on Linux/macOS). Production servers
+that provide ``wsgi.file_wrapper`` already get it through send_file.
+"""
+
+import logging
+import os
+
+from flask import request, send_file
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+SENDFILE_MIN_SIZE = 64 * 1024  # 小文件走普通路径即可,省一次 open
+# DEVTOOLBOX_SENDFILE=0 关闭零拷贝路径(排查问题 / 基准对比)
+USE_SENDFILE = os.environ.get('DEVTOOLBOX_SENDFILE', '1') != '0'
+
+
+def indexed_digest(index, name, path):
+    """Return the index digest for *name* if the row still matches the file on disk."""
+    row = index.get(name)
+    if not row or not row.get('digest'):
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if row['size'] != st.st_size or row['mtime'] != st.st_mtime:
+        return None  # 文件在索引之外被改动过,摘要已不可信
+    return row['digest']
+
+
+def send_stored_file(path, digest=None, mimetype=None, immutable=False):
+    """send_file() with a digest ETag, conditional/range handling and cache policy."""
+    response = send_file(
+        path,
+        mimetype=mimetype,
+        conditional=True,
+        etag=digest or True,
+        max_age=IMMUTABLE_MAX_AGE if immutable else None,
+    )
+    # werkzeug 只在收到 Range 请求时才写 Accept-Ranges;首个 200 就声明,播放器才会按需拖动
+    response.accept_ranges = 'bytes'
+    if immutable:
+        response.cache_control.immutable = True
+    return _maybe_sendfile(response, path)
+
+
+class _SendfileBody:
+    """WSGI body that lets the kernel copy the file straight into the socket."""
+
+    def __init__(self, path, sock, offset, count):
+        self._file = open(path, 'rb')
+        self._sock = sock
+        self._offset = offset
+        self._count = count
+
+    def __iter__(self):
+        # 先交出空块:werkzeug 据此写出并 flush 响应头,之后由 sendfile 直接写正文
+        yield b''
+        self._sock.sendfile(self._file, self._offset, self._count)
+
+    def close(self):
+        self._file.close()
+
+
+def _maybe_sendfile(response, path):
+    if not USE_SENDFILE or request.method != 'GET':
+        return response
+    environ = request.environ
+    sock = environ.get('werkzeug.socket')
+    if sock is None or 'wsgi.file_wrapper' in environ:
+        return response
+    if response.status_code == 200:
+        offset, count = 0, response.content_length
+    elif response.status_code == 206 and response.content_range:
+        offset = response.content_range.start
+        count = response.content_range.stop - offset
+    else:
+        return response
+    if not count or count < SENDFILE_MIN_SIZE:
+        return response
+    try:
+        body = _SendfileBody(path, sock, offset, count)
+    except OSError:
+        logger.debug('sendfile path unavailable for %s', path, exc_info=True)
+        return response
+    response.close()
+    response.response = body
+    return response
@@ -1,10 +1,12 @@
-from flask import Blueprint, request, jsonify, send_from_directory
+from flask import Blueprint, request, jsonify, current_app
+from werkzeug.exceptions import HTTPException
 import os
+import time
 import uuid
 import logging
-import subprocess
-import sys
+import threading
 import zipfile
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 import xml.etree.ElementTree as ET
 
 try:
@@ -18,6 +20,27 @@ except ImportError:
         from utils.path_safety import safe_join, sanitize_filename
         from utils.error_handler import safe_error
 
+try:
+    from .upload_store import get_digest_algorithm, parse_streaming_upload, store_blob, release_blob
+except ImportError:
+    from upload_store import get_digest_algorithm, parse_streaming_upload, store_blob, release_blob
+
+try:
+    from .file_index import get_file_index, needs_cover, COVER_UNKNOWN, COVER_NONE, COVER_READY
+except ImportError:
+    from file_index import get_file_index, needs_cover, COVER_UNKNOWN, COVER_NONE, COVER_READY
+
+try:
+    from .media_jobs import get_media_jobs, emit_event, QueueFull
+    from .file_serving import send_stored_file, indexed_digest
+    from .malware_scan import (initial_status, schedule_scan, quarantine_path, visible_status,
+                               downloadable, SCAN_PENDING, SCAN_QUARANTINED)
+except ImportError:
+    from media_jobs import get_media_jobs, emit_event, QueueFull
+    from file_serving import send_stored_file, indexed_digest
+    from malware_scan import (initial_status, schedule_scan, quarantine_path, visible_status,
+                              downloadable, SCAN_PENDING, SCAN_QUARANTINED)
+
 logger = logging.getLogger(__name__)
 
 file_upload_bp = Blueprint('file_upload', __name__)
@@ -59,8 +82,11 @@ def get_upload_folder():
 
 
 def scan_file(filepath):
-    """Basic file safety scan.
+    """Quick synchronous check run before a file is listed.
     Returns a dict with 'safe' (bool) and 'warning' (str or None).
+
+    Antivirus scanning (Windows Defender / clamd) runs afterwards on the
+    background scan queue, see malware_scan.py.
     """
     ext = filepath.rsplit('.', 1)[-1].lower() if '.' in filepath else ''
 
@@ -68,23 +94,6 @@ def scan_file(filepath):
     if ext in EXECUTABLE_EXTENSIONS:
         return {'safe': True, 'warning': f'Executable file (.{ext}) uploaded — handle with caution'}
 
-    # On Windows, try Windows Defender quick scan for files under 500MB
-    if sys.platform == 'win32':
-        try:
-            file_size = os.path.getsize(filepath)
-            if file_size < 500 * 1024 * 1024:
-                mp_cmd = r'C:\Program Files\Windows Defender\MpCmdRun.exe'
-                if os.path.exists(mp_cmd):
-                    result = subprocess.run(
-                        [mp_cmd, '-Scan', '-ScanType', '3', '-File', filepath],
-                        capture_output=True, timeout=30,  # 30s,避免长时间阻塞请求线程
-                        creationflags=subprocess.CREATE_NO_WINDOW,
-                    )
-                    if result.returncode == 2:
-                        return {'safe': False, 'warning': 'Threat detected by Windows Defender'}
-        except Exception as e:
-            logger.warning('scan_file Windows Defender scan failed: %s', e, exc_info=False)
-
     return {'safe': True, 'warning': None}
 
 
@@ -229,25 +238,21 @@ def upload_files():
     try:
         UPLOAD_FOLDER = get_upload_folder()
 
-        if not request.files:
+        if request.mimetype != 'multipart/form-data':
             return jsonify({'message': '成功上传 0 个文件', 'files': []}), 200
 
-        files = []
-        try:
-            files_list = request.files.getlist('files')
-            if files_list:
-                files = files_list
-            else:
-                for key in request.files:
-                    file_obj = request.files[key]
-                    if hasattr(file_obj, 'filename') and file_obj.filename:
-                        files.append(file_obj)
-        except Exception as e:
-            logger.debug(f"Error getting files: {e}")
-            for key in request.files:
-                file_obj = request.files[key]
-                if hasattr(file_obj, 'filename') and file_obj.filename:
-                    files.append(file_obj)
+        # 单遍流式写入:分片直接写到上传目录下,同时计算大小与摘要,不经 werkzeug 临时文件中转
+        _, request_files = parse_streaming_upload(request, UPLOAD_FOLDER, get_digest_algorithm())
+
+        files = request_files.getlist('files')
+        if not files:
+            files = [f for key in request_files for f in request_files.getlist(key)]
+        # 未被处理的分片(空文件名 / 超出数量)需要清理
+        for key in request_files:
+            for f in request_files.getlist(key):
+                if f not in files or not f.filename:
+                    f.stream.discard()
+        files = [f for f in files if f.filename]
 
         if not files:
             return jsonify({'message': '成功上传 0 个文件', 'files': []}), 200
@@ -255,62 +260,40 @@ def upload_files():
         uploaded_files = []
         warnings = []
         if len(files) > 9:
+            for file in files[9:]:
+                file.stream.discard()
             files = files[:9]
 
+        # 命名在请求线程内串行预留,落盘/扫描/建索引交给线程池并行
+        socketio = current_app.config.get('SOCKETIO')
+        tasks = []
         for file in files:
-            try:
-                if file and hasattr(file, 'filename') and file.filename:
-                    original_filename = file.filename
-                    clean_name = sanitize_filename(original_filename)
-
-                    if not clean_name or clean_name == 'unnamed_file':
-                        clean_name = f"unnamed_file_{uuid.uuid4().hex[:8]}"
-
-                    # Handle duplicate filenames
-                    if '.' in clean_name:
-                        parts = clean_name.rsplit('.', 1)
-                        base_name, file_extension = parts[0], parts[1].lower()
-                    else:
-                        base_name = clean_name
-                        file_extension = ''
-
-                    final_filename = clean_name
-                    counter = 1
-                    while os.path.exists(os.path.join(UPLOAD_FOLDER, final_filename)):
-                        if file_extension:
-                            final_filename = f"{base_name}_{counter}.{file_extension}"
-                        else:
-                            final_filename = f"{base_name}_{counter}"
-                        counter += 1
-
-                    file_path = safe_join(UPLOAD_FOLDER, final_filename)
-                    if file_path is None:
-                        logger.warning(f"Path traversal detected: {final_filename}")
-                        continue
-
-                    file.save(file_path)
-                    file_size = os.path.getsize(file_path)
-
-                    # Safety scan
-                    scan_result = scan_file(file_path)
-                    if not scan_result['safe']:
-                        os.remove(file_path)
-                        warnings.append(f"{final_filename}: {scan_result['warning']}")
-                        logger.warning(f"Blocked unsafe file: {final_filename} - {scan_result['warning']}")
-                        continue
-                    if scan_result['warning']:
-                        warnings.append(f"{final_filename}: {scan_result['warning']}")
-
-                    uploaded_files.append({
-                        'original_name': original_filename,
-                        'unique_name': final_filename,
-                        'size': file_size,
-                        'url': f'/api/file-upload/files/{final_filename}'
-                    })
-
-            except Exception as file_error:
-                logger.error(f"Error processing file: {file_error}")
+            final_filename = _reserve_filename(UPLOAD_FOLDER, file.filename)
+            file_path = safe_join(UPLOAD_FOLDER, final_filename)
+            if file_path is None:
+                logger.warning(f"Path traversal detected: {final_filename}")
+                _release_filename(UPLOAD_FOLDER, final_filename)
+                file.stream.discard()
                 continue
+            task = _UploadTask(UPLOAD_FOLDER, file.stream, file.filename, final_filename, file_path)
+            task.future = _get_upload_pool().submit(task.run, socketio)
+            tasks.append(task)
+
+        # 所有文件共用一个截止时间:总耗时约等于最慢的那个文件
+        deadline = time.monotonic() + UPLOAD_FILE_TIMEOUT
+        for task in tasks:
+            try:
+                result = task.future.result(timeout=max(deadline - time.monotonic(), 0))
+            except FutureTimeout:
+                if task.abandon():
+                    logger.warning(f"Upload processing timed out: {task.final_filename}")
+                    warnings.append(f"{task.final_filename}: processing timed out")
+                    continue
+                result = task.future.result()
+            if result.get('warning'):
+                warnings.append(f"{task.final_filename}: {result['warning']}")
+            if result.get('file'):
+                uploaded_files.append(result['file'])
 
         response = {
             'message': f'成功上传 {len(uploaded_files)} 个文件',
@@ -324,44 +307,295 @@ def upload_files():
         return safe_error(e, '文件上传失败')
 
 
+UPLOAD_WORKERS = 4  # 主要耗时在 I/O 与扫描子进程,不按 CPU 数收缩
+UPLOAD_FILE_TIMEOUT = 60  # 秒;Windows Defender 扫描自身上限 30 秒
+
+_upload_pool = None
+_upload_pool_lock = threading.Lock()
+_reserved_names = set()  # 处理中的文件名,避免并发上传同名文件互相覆盖
+_reserved_lock = threading.Lock()
+
+
+def _get_upload_pool():
+    """Return the process-wide pool for per-file upload processing."""
+    global _upload_pool
+    if _upload_pool is None:
+        with _upload_pool_lock:
+            if _upload_pool is None:
+                _upload_pool = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS,
+                                                  thread_name_prefix='file-upload')
+    return _upload_pool
+
+
+def _reset_after_fork():
+    # 线程池的工作线程不会随 fork 进入子进程,子进程按需重建
+    global _upload_pool, _upload_pool_lock, _reserved_lock
+    _upload_pool = None
+    _upload_pool_lock = threading.Lock()
+    _reserved_lock = threading.Lock()
+    _reserved_names.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _reserve_filename(upload_folder, original_filename):
+    """Pick a free name for *original_filename* and hold it until released."""
+    clean_name = sanitize_filename(original_filename)
+    if not clean_name or clean_name == 'unnamed_file':
+        clean_name = f"unnamed_file_{uuid.uuid4().hex[:8]}"
+
+    # Handle duplicate filenames
+    if '.' in clean_name:
+        base_name, file_extension = clean_name.rsplit('.', 1)
+        file_extension = file_extension.lower()
+    else:
+        base_name = clean_name
+        file_extension = ''
+
+    final_filename = clean_name
+    counter = 1
+    with _reserved_lock:
+        while (os.path.realpath(os.path.join(upload_folder, final_filename)) in _reserved_names
+               or os.path.exists(os.path.join(upload_folder, final_filename))
+               or os.path.exists(quarantine_path(upload_folder, final_filename))):
+            if file_extension:
+                final_filename = f"{base_name}_{counter}.{file_extension}"
+            else:
+                final_filename = f"{base_name}_{counter}"
+            counter += 1
+        _reserved_names.add(os.path.realpath(os.path.join(upload_folder, final_filename)))
+    return final_filename
+
+
+def _release_filename(upload_folder, final_filename):
+    with _reserved_lock:
+        _reserved_names.discard(os.path.realpath(os.path.join(upload_folder, final_filename)))
+
+
+class _UploadTask:
+    """Store, scan and index one uploaded part on the upload pool.
+
+    The request thread stops waiting after UPLOAD_FILE_TIMEOUT and calls
+    abandon(); the worker then removes the file instead of indexing it, so a
+    file reported as timed out never shows up in the listing later.
+    """
+
+    def __init__(self, upload_folder, writer, original_filename, final_filename, file_path):
+        self.upload_folder = upload_folder
+        self.writer = writer
+        self.original_filename = original_filename
+        self.final_filename = final_filename
+        self.file_path = file_path
+        self.future = None
+        self._abandoned = False
+        self._finished = False
+        self._stored = False
+        self._lock = threading.Lock()
+
+    def abandon(self):
+        """Give up on this file; returns False if it already finished."""
+        with self._lock:
+            if self._finished:
+                return False
+            self._abandoned = True
+            return True
+
+    def run(self, socketio):
+        try:
+            return self._process(socketio)
+        except Exception as file_error:
+            logger.error(f"Error processing file: {file_error}")
+            self._cleanup()
+            return {'warning': 'processing failed'}
+        finally:
+            _release_filename(self.upload_folder, self.final_filename)
+
+    def _cleanup(self):
+        # store_blob 之后 writer.path 已是可见的硬链接并持有 blob 引用:
+        # 只 discard 会留下无人能释放的 blob
+        if not self._stored:
+            self.writer.discard()
+            return
+        try:
+            self._remove()
+            get_file_index(self.upload_folder).delete(self.final_filename)
+        except Exception:
+            logger.warning('Failed to clean up %s', self.final_filename, exc_info=True)
+
+    def _remove(self):
+        try:
+            os.remove(self.file_path)
+        except FileNotFoundError:
+            pass
+        release_blob(self.upload_folder, self.writer.algorithm, self.writer.hexdigest(),
+                     self.final_filename)
+
+    def _process(self, socketio):
+        upload_folder, writer, final_filename = self.upload_folder, self.writer, self.final_filename
+        if self._abandoned:  # 排队期间已超时
+            writer.discard()
+            return {}
+        # 内容寻址去重:相同内容只保留一份 blob,文件名是指向它的硬链接
+        deduplicated = store_blob(upload_folder, writer, self.file_path, final_filename)
+        self._stored = True
+        file_size = writer.size
+
+        # Safety scan
+        scan_result = scan_file(self.file_path)
+        with self._lock:
+            self._finished = True
+            if self._abandoned:
+                self._remove()
+                return {}
+            if not scan_result['safe']:
+                self._remove()
+                logger.warning(f"Blocked unsafe file: {final_filename} - {scan_result['warning']}")
+                return {'warning': scan_result['warning']}
+
+            digest = writer.hexdigest()
+            scan_status = initial_status()
+            get_file_index(upload_folder).upsert(
+                final_filename,
+                size=file_size,
+                mtime=os.stat(self.file_path).st_mtime,
+                title=None,
+                cover=COVER_UNKNOWN if needs_cover(final_filename) else COVER_NONE,
+                digest=digest,
+                digest_algorithm=writer.algorithm,
+                original_name=self.original_filename,
+                uploaded_at=time.time(),
+                scan_status=scan_status,
+                scan_detail=None,
+            )
+        if needs_cover(final_filename):
+            schedule_cover(upload_folder, final_filename, socketio)
+        if scan_status == SCAN_PENDING:
+            # 杀毒扫描在后台进行,响应不等待;结果经 file-scan-status 推送
+            schedule_scan(upload_folder, final_filename, socketio)
+
+        file_entry = {
+            'original_name': self.original_filename,
+            'unique_name': final_filename,
+            'size': file_size,
+            'digest': digest,
+            'digest_algorithm': writer.algorithm,
+            'deduplicated': deduplicated,
+            'scanStatus': scan_status,
+        }
+        if scan_status != SCAN_PENDING:
+            file_entry['url'] = f'/api/file-upload/files/{final_filename}'
+        return {'warning': scan_result['warning'], 'file': file_entry}
+
+
+MAX_LIST_LIMIT = 1000
+
+
+def _list_params(args):
+    """Parse ?offset=&limit=&sort= ; limit None means "all files" (old behaviour)."""
+    offset = max(args.get('offset', 0, type=int) or 0, 0)
+    limit = args.get('limit', type=int)
+    if limit is not None:
+        limit = min(max(limit, 1), MAX_LIST_LIMIT)
+    sort = args.get('sort') or '-modified'
+    return offset, limit, sort
+
+
+def _extract_cover(upload_folder, filename):
+    """Background job: extract title/cover once and record the result in the index."""
+    ebook_meta = get_ebook_metadata(upload_folder, filename)
+    cover = COVER_READY if ebook_meta.get('coverUrl') else COVER_NONE
+    get_file_index(upload_folder).update(filename, title=ebook_meta.get('title'), cover=cover)
+    return {'name': filename, 'title': ebook_meta.get('title'), 'coverUrl': ebook_meta.get('coverUrl')}
+
+
+def schedule_cover(upload_folder, filename, socketio=None):
+    """Queue cover extraction for *filename*; returns False if the queue is full."""
+    try:
+        get_media_jobs().submit(
+            f'cover:{os.path.realpath(upload_folder)}:{filename}',
+            _extract_cover, upload_folder, filename,
+            on_done=lambda result: emit_event(socketio, 'file-cover-ready', result),
+        )
+    except QueueFull:
+        logger.warning('Media job queue full, cover extraction deferred for %s', filename)
+        return False
+    return True
+
+
 @file_upload_bp.route('/files', methods=['GET'])
 def get_uploaded_files():
     try:
         UPLOAD_FOLDER = get_upload_folder()
-        files = os.listdir(UPLOAD_FOLDER)
-        file_list = []
+        offset, limit, sort = _list_params(request.args)
 
-        for filename in files:
-            if os.path.isfile(os.path.join(UPLOAD_FOLDER, filename)):
-                file_path = os.path.join(UPLOAD_FOLDER, filename)
-                file_stat = os.stat(file_path)
-                file_entry = {
-                    'name': filename,
-                    'size': file_stat.st_size,
-                    'modified': file_stat.st_mtime,
-                    'url': f'/api/file-upload/files/{filename}'
-                }
-
-                ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
-                if ext in EBOOK_EXTENSIONS or ext == 'pdf':
-                    try:
-                        ebook_meta = get_ebook_metadata(UPLOAD_FOLDER, filename)
-                        if ebook_meta.get('coverUrl'):
-                            file_entry['coverUrl'] = ebook_meta['coverUrl']
-                        if ebook_meta.get('title'):
-                            file_entry['title'] = ebook_meta['title']
-                    except Exception as e:
-                        logger.debug(f"Ebook metadata enrichment failed for {filename}: {e}")
+        # 索引只在目录 mtime 变化时与磁盘对账;封面/标题只为当前页按需在后台提取一次
+        index = get_file_index(UPLOAD_FOLDER)
+        _reconcile(UPLOAD_FOLDER, index)
+        rows, total = index.query(offset=offset, limit=limit, sort=sort)
 
+        socketio = current_app.config.get('SOCKETIO')
+        file_list = []
+        for row in rows:
+            status = visible_status(row)
+            file_entry = {
+                'name': row['name'],
+                'size': row['size'],
+                'modified': row['uploaded_at'] or row['mtime'],
+                'scanStatus': status,
+            }
+            if status == SCAN_QUARANTINED:
+                file_entry['scanDetail'] = row['scan_detail']
                 file_list.append(file_entry)
-
-        file_list.sort(key=lambda x: x['modified'], reverse=True)
-        return jsonify({'files': file_list}), 200
+                continue
+            if status == SCAN_PENDING:
+                # 目录外新增 / 重启前未扫完 / 新启用了扫描器:补排队(同名任务去重);
+                # 扫描出结果前不提供下载地址
+                schedule_scan(UPLOAD_FOLDER, row['name'], socketio)
+            else:
+                file_entry['url'] = f"/api/file-upload/files/{row['name']}"
+            if row['cover'] is COVER_UNKNOWN:
+                # 封面尚未提取:交给后台队列(同名任务去重),完成后推送 file-cover-ready
+                schedule_cover(UPLOAD_FOLDER, row['name'], socketio)
+                file_entry['coverStatus'] = 'pending'
+            elif row['cover'] == COVER_READY and status != SCAN_PENDING:
+                file_entry['coverUrl'] = f"/api/file-upload/files/{row['name']}/cover"
+            if row['title']:
+                file_entry['title'] = row['title']
+            if row['digest']:
+                file_entry['digest'] = row['digest']
+            file_list.append(file_entry)
+
+        return jsonify({'files': file_list, 'total': total, 'offset': offset, 'limit': limit}), 200
 
     except Exception as e:
         return safe_error(e, '获取文件列表失败')
 
 
+def _reconcile(upload_folder, index):
+    """Sync *index* with the folder; files removed behind our back give up their blob reference."""
+    for row in index.reconcile():
+        release_blob(upload_folder, row['digest_algorithm'], row['digest'], row['name'])
+
+
+def _scan_gate(upload_folder, name):
+    """Error response if *name* may not be served yet (423 while pending, 403 if quarantined), else None."""
+    index = get_file_index(upload_folder)
+    row = index.get(name)
+    if row is None:
+        _reconcile(upload_folder, index)  # 目录外新增的文件先入索引,才能排队扫描
+        row = index.get(name)
+    status = visible_status(row)
+    if downloadable(status):
+        return None
+    if status == SCAN_QUARANTINED:
+        return jsonify({'error': '文件已被隔离', 'scanDetail': row['scan_detail']}), 403
+    if status == SCAN_PENDING:
+        schedule_scan(upload_folder, name, current_app.config.get('SOCKETIO'))
+    return jsonify({'error': '文件正在进行安全扫描，请稍后再试', 'scanStatus': status}), 423
+
+
 @file_upload_bp.route('/files/<filename>', methods=['GET'])
 def get_file(filename):
     try:
@@ -370,7 +604,20 @@ def get_file(filename):
         if safe_path is None:
             return jsonify({'error': '无效的文件名'}), 400
         safe_name = sanitize_filename(filename)
-        return send_from_directory(UPLOAD_FOLDER, safe_name)
+        file_path = os.path.join(UPLOAD_FOLDER, safe_name)
+        if not os.path.isfile(file_path):
+            row = get_file_index(UPLOAD_FOLDER).get(safe_name)
+            if row and row['scan_status'] == SCAN_QUARANTINED:
+                return jsonify({'error': '文件已被隔离', 'scanDetail': row['scan_detail']}), 403
+            return jsonify({'error': '文件不存在'}), 404
+        blocked = _scan_gate(UPLOAD_FOLDER, safe_name)
+        if blocked is not None:
+            return blocked
+        # 强 ETag 取自索引中的内容摘要;Range / 304 由 send_file 的 conditional 处理
+        digest = indexed_digest(get_file_index(UPLOAD_FOLDER), safe_name, file_path)
+        return send_stored_file(file_path, digest=digest)
+    except HTTPException:
+        raise
     except Exception:
         return jsonify({'error': '文件不存在'}), 404
 
@@ -387,9 +634,15 @@ def get_file_cover(filename):
         if not os.path.exists(cache_png):
             return jsonify({'error': 'No cover available'}), 404
 
-        covers_dir = os.path.dirname(cache_png)
-        cover_filename = os.path.basename(cache_png)
-        return send_from_directory(covers_dir, cover_filename)
+        blocked = _scan_gate(UPLOAD_FOLDER, sanitize_filename(filename))
+        if blocked is not None:
+            return blocked
+        file_path = os.path.join(UPLOAD_FOLDER, sanitize_filename(filename))
+        digest = indexed_digest(get_file_index(UPLOAD_FOLDER), sanitize_filename(filename), file_path)
+        return send_stored_file(cache_png, digest=f'{digest}.cover' if digest else None,
+                                mimetype='image/png')
+    except HTTPException:
+        raise
     except Exception:
         return jsonify({'error': 'Cover not found'}), 404
 
@@ -398,19 +651,34 @@ def get_file_cover(filename):
 def delete_file(filename):
     try:
         UPLOAD_FOLDER = get_upload_folder()
-        safe_path = safe_join(UPLOAD_FOLDER, filename)
-        if safe_path is None:
+        if safe_join(UPLOAD_FOLDER, filename) is None:
             return jsonify({'error': '无效的文件名'}), 403
-        if os.path.exists(safe_path):
-            os.remove(safe_path)
-            cache_png = cover_cache_path(UPLOAD_FOLDER, filename)
+        # 磁盘、索引与 blob 引用都用同一个规范化后的名字
+        name = sanitize_filename(filename)
+        file_path = os.path.join(UPLOAD_FOLDER, name)
+        index = get_file_index(UPLOAD_FOLDER)
+        if os.path.lexists(file_path):
+            os.remove(file_path)
+            row = index.get(name)
+            if row:
+                release_blob(UPLOAD_FOLDER, row['digest_algorithm'], row['digest'], row['name'])
+            index.delete(name)
+            cache_png = cover_cache_path(UPLOAD_FOLDER, name)
             if os.path.exists(cache_png):
                 try:
                     os.remove(cache_png)
                 except OSError:
                     pass
             return jsonify({'message': '文件删除成功'}), 200
-        else:
-            return jsonify({'error': '文件不存在'}), 404
+        row = index.get(name)
+        if row and row['scan_status'] == SCAN_QUARANTINED:
+            # 隔离区中的副本随记录一起删除(blob 引用在隔离时已释放)
+            try:
+                os.remove(quarantine_path(UPLOAD_FOLDER, name))
+            except OSError:
+                pass
+            index.delete(name)
+            return jsonify({'message': '文件删除成功'}), 200
+        return jsonify({'error': '文件不存在'}), 404
     except Exception as e:
         return safe_error(e, '文件删除失败')
@@ -7,25 +7,50 @@ No server-side database.
 """
 
 import os
-import threading
 import time
+import functools
 import uuid
 import logging
+import mimetypes
 
-from flask import Blueprint, request, jsonify, send_file
-from flask_socketio import emit
+from flask import Blueprint, request, jsonify, current_app
+from flask_socketio import emit, join_room, leave_room
 
 try:
     from ..utils.path_safety import safe_join, sanitize_filename
+    from ..utils import config_manager
 except ImportError:
     try:
         from backend.utils.path_safety import safe_join, sanitize_filename
+        from backend.utils import config_manager
     except ImportError:
         from utils.path_safety import safe_join, sanitize_filename
+        from utils import config_manager
+
+try:
+    from .upload_store import get_digest_algorithm, parse_streaming_upload, store_blob
+except ImportError:
+    from upload_store import get_digest_algorithm, parse_streaming_upload, store_blob
+
+try:
+    from .media_jobs import get_media_jobs, emit_event, QueueFull
+    from .file_index import get_file_index, COVER_NONE
+    from .file_serving import send_stored_file, indexed_digest
+    from .im_presence import InProcessPresence
+    from .im_coalesce import EventStats, TypingThrottle, ReadBatcher
+    from .chunked_upload import get_chunked_uploads, ChunkedUploadError
+except ImportError:
+    from media_jobs import get_media_jobs, emit_event, QueueFull
+    from file_index import get_file_index, COVER_NONE
+    from file_serving import send_stored_file, indexed_digest
+    from im_presence import InProcessPresence
+    from im_coalesce import EventStats, TypingThrottle, ReadBatcher
+    from chunked_upload import get_chunked_uploads, ChunkedUploadError
 
 logger = logging.getLogger(__name__)
 
 THUMB_MAX_SIZE = (200, 200)
+THUMB_WAIT_TIMEOUT = 20  # serve_thumb 等待进行中任务的上限(ffmpeg 自身超时 15 秒)
 
 # ---------------------------------------------------------------------------
 # Upload directory helpers
@@ -38,60 +63,110 @@ def _get_project_root():
     return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
-def _get_upload_dir():
+# 派生配置(上传目录 / 大小上限):配置变更时由 config_manager 回调刷新,请求内不再重复解析
+_im_settings = {}
+
+
+@config_manager.subscribe
+def _on_config_change(config):
+    _im_settings['upload_dir'] = os.path.join(config_manager.get_upload_dir(config), 'im')
+    _im_settings['max_bytes'] = config_manager.get_max_upload_bytes(config)
+    im_config = config.get('im', {})
+    _im_settings['typing_interval'] = _millis(im_config.get('typing_interval_ms'), 1000)
+    _im_settings['read_flush_interval'] = _millis(im_config.get('read_flush_ms'), 500)
     try:
-        from utils.config_manager import load_config, get_upload_dir
-    except ImportError:
-        try:
-            from backend.utils.config_manager import load_config, get_upload_dir
-        except ImportError:
-            from ..utils.config_manager import load_config, get_upload_dir
+        chunked_mb = int(im_config.get('max_chunked_upload_mb', 4096))
+    except (TypeError, ValueError):
+        chunked_mb = 4096
+    _im_settings['max_chunked_bytes'] = max(1, chunked_mb) * 1024 * 1024
+
 
-    config = load_config()
-    upload_base = get_upload_dir(config)
-    im_dir = os.path.join(upload_base, 'im')
+def _millis(value, default):
+    """Config milliseconds -> seconds; invalid or negative values use *default*."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        value = default
+    return value / 1000.0
+
+
+def _im_setting(key):
+    config = config_manager.load_config()  # 只读视图,零拷贝;配置变化时会触发 _on_config_change
+    if key not in _im_settings:
+        _on_config_change(config)
+    return _im_settings[key]
+
+
+def _get_upload_dir():
+    im_dir = _im_setting('upload_dir')
     os.makedirs(im_dir, exist_ok=True)
     return im_dir
 
 
 def _get_max_upload_bytes():
     """上传大小上限(字节),统一从 config 读取,与全局 MAX_CONTENT_LENGTH 一致。"""
-    try:
-        from utils.config_manager import get_max_upload_bytes
-    except ImportError:
-        try:
-            from backend.utils.config_manager import get_max_upload_bytes
-        except ImportError:
-            from ..utils.config_manager import get_max_upload_bytes
-    return get_max_upload_bytes()
+    return _im_setting('max_bytes')
 
 
 # ---------------------------------------------------------------------------
-# Device registry — in-memory only, supports multiple tabs per device
+# Device registry — pluggable (in-process by default, SQLite across worker
+# processes), supports multiple tabs per device
 # ---------------------------------------------------------------------------
-connected_devices = {}  # {nodeId: {'name': str, 'sessions': {sid: ip}}}
-sid_to_node = {}        # {sid: nodeId}
-_devices_lock = threading.RLock()
+_presence = InProcessPresence()
+
+
+# 每个已 join 的会话进入 broadcast 房间与所属设备的 node 房间:群发/私发都是一次
+# emit(负载只编码一次),多进程时由消息队列转发给其它 worker 上的房间成员
+BROADCAST_ROOM = 'broadcast'
+
+
+def _node_room(node_id):
+    return f'node:{node_id}'
 
 
-def _peers_list():
-    with _devices_lock:
-        result = []
-        for nid, info in connected_devices.items():
-            ips = list(info['sessions'].values())
-            result.append({'nodeId': nid, 'name': info['name'], 'ip': ips[-1] if ips else ''})
-        return result
+# 高频事件合并:typing 按 (sid, 目标) 节流,read 回执去重后定时批量发出
+_event_stats = EventStats()
+_typing_throttle = TypingThrottle()
+_read_batcher = ReadBatcher()
 
 
-def _all_sids_except(exclude_sid):
-    with _devices_lock:
-        return [s for info in connected_devices.values() for s in info['sessions'] if s != exclude_sid]
+def _counted(event):
+    """Count every received *event* in _event_stats."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args):
+            _event_stats.incr(event, 'received')
+            return fn(*args)
+        return wrapper
+    return decorator
 
 
-def _device_sids(node_id):
-    with _devices_lock:
-        dev = connected_devices.get(node_id)
-        return list(dev['sessions'].keys()) if dev else []
+def _flush_reads(socketio):
+    """Background task: emit the queued read acks every read_flush_ms until idle."""
+    try:
+        while True:
+            socketio.sleep(_im_setting('read_flush_interval'))
+            pairs = _read_batcher.drain()
+            if pairs is None:
+                return
+            _event_stats.incr('read', 'emitted', len(pairs))
+            for reader_id, sender_id in pairs:
+                socketio.emit('read', {'from': reader_id, 'to': sender_id}, room=_node_room(sender_id))
+    except Exception:
+        # 任务异常退出时清除 scheduled 标记,否则之后的 add() 再也不会启动 flusher
+        _read_batcher.reset()
+        logger.warning('Read ack flusher failed', exc_info=True)
+
+
+def _as_seq(value):
+    return value if isinstance(value, int) and not isinstance(value, bool) and value >= 0 else None
+
+
+def _emit_delta(socketio, delta, skip_sid=None):
+    """Broadcast one presence delta (peer-added / peer-updated / peer-removed)."""
+    if delta:
+        _event_stats.incr(delta['type'], 'emitted')
+        socketio.emit(delta['type'], {'epoch': delta['epoch'], 'seq': delta['seq'],
+                                      'peer': delta['peer']},
+                      room=BROADCAST_ROOM, skip_sid=skip_sid)
 
 
 # ---------------------------------------------------------------------------
@@ -103,119 +178,287 @@ im_bp = Blueprint('im', __name__)
 @im_bp.route('/status', methods=['GET'])
 def im_status():
     """Diagnostic endpoint: check Socket.IO availability and connected devices."""
-    with _devices_lock:
-        devices = []
-        for nid, info in connected_devices.items():
-            devices.append({
-                'nodeId': nid,
-                'name': info['name'],
-                'sessions': len(info['sessions']),
-            })
+    devices = _presence.devices()
     return jsonify({
         'success': True,
         'socketio_registered': socketio_registered,
         'device_count': len(devices),
         'devices': devices,
+        # 多进程时长轮询会落到不同 worker,客户端需直接走 WebSocket
+        'transports': ['websocket'] if _multi_process else ['polling'],
+        'events': _event_stats.snapshot(),  # 本 worker 进程的计数
     })
 
 
 socketio_registered = False  # set to True by register_im_events()
+_multi_process = False
 
 
 @im_bp.route('/upload', methods=['POST'])
 def upload_file():
-    if 'file' not in request.files:
+    if request.mimetype != 'multipart/form-data':
         return jsonify({'success': False, 'error': 'No file provided'}), 400
 
-    f = request.files['file']
+    upload_dir = _get_upload_dir()
+    upload_root = os.path.dirname(upload_dir)
+    # 流式写入 + 同遍计算摘要,随后按内容去重存入 blob 仓库
+    _, files = parse_streaming_upload(request, upload_root, get_digest_algorithm())
+    f = files.get('file')
+    for key in files:
+        for part in files.getlist(key):
+            if part is not f:
+                part.stream.discard()
+
+    if f is None:
+        return jsonify({'success': False, 'error': 'No file provided'}), 400
     if not f.filename:
+        f.stream.discard()
         return jsonify({'success': False, 'error': 'Empty filename'}), 400
 
-    f.seek(0, os.SEEK_END)
-    size = f.tell()
-    f.seek(0)
+    size = f.stream.size
     max_size = _get_max_upload_bytes()
     if size > max_size:
+        f.stream.discard()
         return jsonify({'success': False, 'error': f'File too large (max {max_size // 1024 // 1024} MB)'}), 400
 
-    basename = sanitize_filename(f.filename) or 'file'
+    return jsonify(_finalize_upload(upload_dir, f.stream, f.filename, size, f.mimetype))
+
+
+def _upload_rooms():
+    """Rooms that will receive the message carrying this upload.
+
+    The client names the conversation with ``?to=<node>&from=<node>``: a
+    private attachment is announced only to both ends, never to everyone.
+    """
+    target = request.args.get('to')
+    if not target:
+        return BROADCAST_ROOM
+    sender = request.args.get('from')
+    return [_node_room(target)] + ([_node_room(sender)] if sender else [])
+
+
+def _finalize_upload(upload_dir, writer, filename, size, mime):
+    """Commit a fully received part into im/, index it and queue its thumbnail."""
+    basename = sanitize_filename(filename) or 'file'
     ext = os.path.splitext(basename)[1]
     unique_name = f"{uuid.uuid4().hex}{ext}"
 
-    upload_dir = _get_upload_dir()
     filepath = os.path.join(upload_dir, unique_name)
-    f.save(filepath)
-
-    mime = f.mimetype or 'application/octet-stream'
+    store_blob(os.path.dirname(upload_dir), writer, filepath, f'im/{unique_name}')
+
+    mime = mime or 'application/octet-stream'
+    # im/ 目录有自己的索引,仅用于按文件名查摘要(ETag);不做列表对账
+    get_file_index(upload_dir).upsert(
+        unique_name, size=size, mtime=os.stat(filepath).st_mtime, cover=COVER_NONE,
+        digest=writer.hexdigest(), digest_algorithm=writer.algorithm,
+        original_name=filename, uploaded_at=time.time(),
+    )
     file_id = uuid.uuid4().hex
     file_url = f"/api/im/files/{unique_name}"
-    thumbnail_url = None
 
+    # 缩略图 / 视频首帧交给后台队列,响应立即返回;完成后向会看到该消息的房间发 thumbnail-ready
+    thumbnail_status = None
+    kind = _thumb_kind(mime)
+    if kind:
+        thumbnail_status = _schedule_thumbnail(
+            upload_dir, unique_name, kind, current_app.config.get('SOCKETIO'), room=_upload_rooms())
+
+    return {
+        'success': True, 'id': file_id, 'url': file_url,
+        'filename': filename, 'size': size, 'mime': mime, 'thumbnail': None,
+        'thumbnailStatus': thumbnail_status,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Chunked, resumable uploads — init / status / append / complete / abort
+# ---------------------------------------------------------------------------
+
+def _chunked_uploads():
+    return get_chunked_uploads(os.path.dirname(_get_upload_dir()))
+
+
+def _chunked_error(e):
+    return jsonify({'success': False, 'error': str(e)}), e.status
+
+
+@im_bp.route('/upload/init', methods=['POST'])
+def upload_init():
+    data = request.get_json(silent=True) or {}
+    digest = data.get('digest')
+    if digest is not None and not isinstance(digest, str):
+        return jsonify({'success': False, 'error': 'Invalid digest'}), 400
+    try:
+        status = _chunked_uploads().init(
+            str(data.get('filename') or ''), data.get('size'),
+            max_size=_im_setting('max_chunked_bytes'), algorithm=get_digest_algorithm(),
+            mime=data.get('mime') if isinstance(data.get('mime'), str) else None,
+            digest=digest, chunk_size=data.get('chunkSize'),
+            max_chunk=_get_max_upload_bytes(),
+        )
+    except ChunkedUploadError as e:
+        return _chunked_error(e)
+    return jsonify({'success': True, **status})
+
+
+@im_bp.route('/upload/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Resume point: ``offset`` is the acknowledged contiguous prefix."""
+    try:
+        return jsonify({'success': True, **_chunked_uploads().get(upload_id)})
+    except ChunkedUploadError as e:
+        return _chunked_error(e)
+
+
+@im_bp.route('/upload/<upload_id>', methods=['PUT'])
+def upload_append(upload_id):
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'success': False, 'error': 'Missing offset'}), 400
+    store = _chunked_uploads()
+    try:
+        chunk_size = store.get(upload_id)['chunkSize']
+        if (request.content_length or 0) > chunk_size:
+            raise ChunkedUploadError('Chunk too large', 413)
+        status = store.append(upload_id, offset, request.get_data(cache=False),
+                              request.headers.get('X-Chunk-Digest'))
+    except ChunkedUploadError as e:
+        return _chunked_error(e)
+    return jsonify({'success': True, **status})
+
+
+@im_bp.route('/upload/<upload_id>/complete', methods=['POST'])
+def upload_complete(upload_id):
+    upload_dir = _get_upload_dir()
+    try:
+        part, state = _chunked_uploads().complete(upload_id)
+    except ChunkedUploadError as e:
+        return _chunked_error(e)
+    return jsonify(_finalize_upload(upload_dir, part, state['filename'], state['size'], state['mime']))
+
+
+@im_bp.route('/upload/<upload_id>', methods=['DELETE'])
+def upload_abort(upload_id):
+    try:
+        _chunked_uploads().abort(upload_id)
+    except ChunkedUploadError as e:
+        return _chunked_error(e)
+    return jsonify({'success': True})
+
+
+# ---------------------------------------------------------------------------
+# Thumbnails — generated by the background media job queue
+# ---------------------------------------------------------------------------
+
+def _thumb_kind(mime):
     if mime.startswith('image/'):
-        try:
+        return 'image'
+    if mime.startswith('video/'):
+        return 'video'
+    return None
+
+
+def _thumb_path(upload_dir, unique_name):
+    return os.path.join(upload_dir, f"thumb_{unique_name}.webp")
+
+
+def _generate_thumbnail(upload_dir, unique_name, kind):
+    """Write thumb_<name>.webp for an image or a video's first second; returns its URL or None."""
+    filepath = os.path.join(upload_dir, unique_name)
+    thumb_path = _thumb_path(upload_dir, unique_name)
+    # 先写临时文件再 rename,serve_thumb 不会读到写了一半的缩略图
+    tmp_path = f"{thumb_path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        if kind == 'image':
             from PIL import Image
-            thumb_name = f"thumb_{unique_name}.webp"
-            thumb_path = os.path.join(upload_dir, thumb_name)
             with Image.open(filepath) as img:
                 img.thumbnail(THUMB_MAX_SIZE)
-                img.save(thumb_path, 'WEBP', quality=80)
-            thumbnail_url = f"/api/im/thumbs/{unique_name}"
-        except Exception:
-            logger.warning('Failed to generate thumbnail for %s', unique_name, exc_info=True)
-
-    elif mime.startswith('video/'):
-        try:
+                img.save(tmp_path, 'WEBP', quality=80)
+        else:
             import subprocess
-            thumb_name = f"thumb_{unique_name}.webp"
-            thumb_path = os.path.join(upload_dir, thumb_name)
-            result = subprocess.run(
+            subprocess.run(
                 ['ffmpeg', '-i', filepath, '-ss', '00:00:01',
-                 '-frames:v', '1', '-y',
+                 '-frames:v', '1', '-y', '-f', 'webp',
                  '-vf', 'scale=200:200:force_original_aspect_ratio=decrease,pad=200:200:(ow-iw)/2:(oh-ih)/2:white',
-                 thumb_path],
+                 tmp_path],
                 capture_output=True, timeout=15,
             )
-            if os.path.isfile(thumb_path):
-                thumbnail_url = f"/api/im/thumbs/{unique_name}"
-        except Exception:
-            pass
+        if not os.path.isfile(tmp_path):
+            return None
+        os.replace(tmp_path, thumb_path)
+        return f"/api/im/thumbs/{unique_name}"
+    except Exception:
+        logger.warning('Failed to generate thumbnail for %s', unique_name, exc_info=True)
+        return None
+    finally:
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def _schedule_thumbnail(upload_dir, unique_name, kind, socketio=None, room=BROADCAST_ROOM):
+    """Queue thumbnail generation; returns 'pending', or None if the queue is full.
+
+    thumbnail-ready goes to *room* only: the URL of a private attachment must
+    not reach other devices.
+    """
+    file_url = f"/api/im/files/{unique_name}"
 
-    return jsonify({
-        'success': True, 'id': file_id, 'url': file_url,
-        'filename': f.filename, 'size': size, 'mime': mime, 'thumbnail': thumbnail_url,
-    })
+    def on_done(thumbnail_url):
+        if thumbnail_url:
+            emit_event(socketio, 'thumbnail-ready', {'url': file_url, 'thumbnail': thumbnail_url},
+                       room=room)
+
+    try:
+        get_media_jobs().submit(f'im-thumb:{unique_name}', _generate_thumbnail,
+                                upload_dir, unique_name, kind, on_done=on_done)
+    except QueueFull:
+        # 队列已满:不排队,图片仍可在首次访问 /thumbs 时按需生成
+        logger.warning('Media job queue full, skipping thumbnail for %s', unique_name)
+        return None
+    return 'pending'
 
 
 @im_bp.route('/files/<path:filename>')
 def serve_file(filename):
     upload_dir = _get_upload_dir()
+    # 上传名均为 uuid;以 _ 开头的是内部目录(_meta 索引等),不对外提供
+    if filename.startswith('_'):
+        return jsonify({'success': False, 'error': 'File not found'}), 404
     safe_path = safe_join(upload_dir, filename)
     if safe_path is None or not os.path.isfile(safe_path):
         return jsonify({'success': False, 'error': 'File not found'}), 404
-    return send_file(safe_path)
+    # uuid 文件名内容永不改变:强 ETag + immutable,支持 Range 拖动播放
+    digest = indexed_digest(get_file_index(upload_dir), filename, safe_path)
+    return send_stored_file(safe_path, digest=digest, immutable=True)
 
 
 @im_bp.route('/thumbs/<path:filename>')
 def serve_thumb(filename):
     upload_dir = _get_upload_dir()
-    thumb_name = f"thumb_{sanitize_filename(filename)}.webp"
-    safe_path = safe_join(upload_dir, thumb_name)
+    unique_name = sanitize_filename(filename)
+    safe_path = safe_join(upload_dir, f"thumb_{unique_name}.webp")
+
+    # Thumbnail being generated — wait for the queued job instead of doing it twice
+    job = get_media_jobs().get(f'im-thumb:{unique_name}')
+    if job is not None:
+        try:
+            job.result(timeout=THUMB_WAIT_TIMEOUT)
+        except Exception:
+            pass
 
     # Thumbnail exists — serve directly
     if safe_path and os.path.isfile(safe_path):
-        return send_file(safe_path, mimetype='image/webp')
+        return send_stored_file(safe_path, mimetype='image/webp', immutable=True)
 
-    # Thumbnail missing — try to regenerate from original file
-    original_path = safe_join(upload_dir, filename)
-    if original_path and os.path.isfile(original_path):
-        try:
-            from PIL import Image
-            with Image.open(original_path) as img:
-                img.thumbnail(THUMB_MAX_SIZE)
-                img.save(safe_path, 'WEBP', quality=80)
-            return send_file(safe_path, mimetype='image/webp')
-        except Exception:
-            logger.warning('Failed to regenerate thumbnail for %s', filename, exc_info=True)
+    # Thumbnail missing — try to regenerate from original image
+    original_path = safe_join(upload_dir, unique_name)
+    guessed = mimetypes.guess_type(unique_name)[0] or ''
+    if safe_path and original_path and os.path.isfile(original_path) and guessed.startswith('image/'):
+        if _generate_thumbnail(upload_dir, unique_name, 'image'):
+            return send_stored_file(safe_path, mimetype='image/webp', immutable=True)
 
     return jsonify({'success': False, 'error': 'Thumbnail not found'}), 404
 
@@ -224,12 +467,17 @@ def serve_thumb(filename):
 # SocketIO — real-time relay, no persistence
 # ---------------------------------------------------------------------------
 
-def register_im_events(socketio):
-    global socketio_registered
+def register_im_events(socketio, presence=None, multi_process=False):
+    """Register the relay handlers; *presence* defaults to the in-process registry."""
+    global socketio_registered, _presence, _multi_process
     socketio_registered = True
+    if presence is not None:
+        _presence = presence
+    _multi_process = multi_process
     logger.info('Socket.IO IM events registered — real-time messaging ENABLED')
 
     @socketio.on('join')
+    @_counted('join')
     def handle_join(data):
         from flask import request as flask_request
         sid = flask_request.sid
@@ -237,48 +485,47 @@ def register_im_events(socketio):
         name = data.get('name', '').strip() or f'Device-{node_id[:6]}'
         ip = flask_request.headers.get('X-Forwarded-For', flask_request.remote_addr or '0.0.0.0')
 
-        with _devices_lock:
-            if node_id not in connected_devices:
-                connected_devices[node_id] = {'name': name, 'sessions': {}}
-            connected_devices[node_id]['name'] = name
-            connected_devices[node_id]['sessions'][sid] = ip
-            sid_to_node[sid] = node_id
-            current_peers = _peers_list()
-
-        logger.info('IM join: %s (%s) from %s — %d devices, %d sessions',
-                     name, node_id[:8], ip, len(connected_devices),
-                     len(connected_devices[node_id]['sessions']))
-
-        logger.info('IM join → emitting "joined" to %s with %d peers: %s',
-                     sid[:8], len(current_peers),
-                     [p['nodeId'][:8] for p in current_peers])
-
-        emit('joined', {
-            'nodeId': node_id,
-            'name': name,
-            'peers': current_peers,
-        })
-        socketio.emit('peers', {'list': current_peers}, skip_sid=sid)
+        previous = _presence.node_of(sid)
+        if previous and previous != node_id:
+            # 同一连接换了身份:退出旧设备房间,避免继续收到发给旧设备的消息
+            _emit_delta(socketio, _presence.leave(sid))
+            leave_room(_node_room(previous))
+        delta = _presence.join(sid, node_id, name, ip)
+        join_room(BROADCAST_ROOM)
+        join_room(_node_room(node_id))
+        # 首次 join 给全量快照;带上次 epoch/seq 重连时只补发错过的 delta
+        state = _presence.sync(data.get('epoch'), _as_seq(data.get('seq')))
+
+        logger.info('IM join: %s (%s) from %s — seq %d, %s',
+                    name, node_id[:8], ip, state['seq'],
+                    f"{len(state['peers'])} peers" if 'peers' in state
+                    else f"{len(state['changes'])} changes")
+
+        emit('joined', {'nodeId': node_id, 'name': name, **state})
+        _emit_delta(socketio, delta, skip_sid=sid)
+
+    @socketio.on('sync-since')
+    @_counted('sync-since')
+    def handle_sync_since(data):
+        data = data if isinstance(data, dict) else {}
+        emit('peers-sync', _presence.sync(data.get('epoch'), _as_seq(data.get('seq'))))
 
     @socketio.on('disconnect')
+    @_counted('disconnect')
     def handle_disconnect():
         from flask import request as flask_request
         sid = flask_request.sid
 
-        with _devices_lock:
-            node_id = sid_to_node.pop(sid, None)
-            if node_id and node_id in connected_devices:
-                connected_devices[node_id]['sessions'].pop(sid, None)
-                if not connected_devices[node_id]['sessions']:
-                    name = connected_devices[node_id]['name']
-                    del connected_devices[node_id]
-                    logger.info('IM leave: %s (%s) — %d remaining', name, node_id[:8], len(connected_devices))
-                    socketio.emit('leave', {'nodeId': node_id})
-                    socketio.emit('peers', {'list': _peers_list()})
-                else:
-                    logger.info('IM session closed (sid=%s)', sid[:8])
+        _typing_throttle.forget(sid)
+        delta = _presence.leave(sid)
+        if delta and delta['type'] == 'peer-removed':
+            logger.info('IM leave: %s (seq %d)', delta['peer']['nodeId'][:8], delta['seq'])
+        else:
+            logger.info('IM session closed (sid=%s)', sid[:8])
+        _emit_delta(socketio, delta)
 
     @socketio.on('rename')
+    @_counted('rename')
     def handle_rename(data):
         from flask import request as flask_request
         sid = flask_request.sid
@@ -286,22 +533,19 @@ def register_im_events(socketio):
         new_name = data.get('name', '').strip()
         if not new_name:
             return
-        with _devices_lock:
-            if node_id in connected_devices and sid in connected_devices[node_id]['sessions']:
-                connected_devices[node_id]['name'] = new_name
         logger.info('IM rename: %s', new_name)
-        socketio.emit('peers', {'list': _peers_list()})
+        _emit_delta(socketio, _presence.rename(sid, node_id, new_name))
 
     @socketio.on('send-msg')
+    @_counted('send-msg')
     def handle_send_msg(data):
         from flask import request as flask_request
         sid = flask_request.sid
 
-        with _devices_lock:
-            sender_id = sid_to_node.get(sid)
-            if not sender_id or sender_id not in connected_devices:
-                sender_id = None
-            sender_name = connected_devices[sender_id]['name'] if sender_id else '?'
+        sender_id = _presence.node_of(sid)
+        sender_name = _presence.device_name(sender_id) if sender_id else None
+        if sender_name is None:
+            sender_id = None
 
         if sender_id is None:
             emit('msg-error', {'error': 'Not registered'})
@@ -325,51 +569,55 @@ def register_im_events(socketio):
         }
 
         if target_id:
-            for s in _device_sids(target_id):
-                socketio.emit('recv-msg', outgoing, room=s)
+            socketio.emit('recv-msg', outgoing, room=_node_room(target_id))
             logger.info('IM private: %s -> %s [%s]', sender_name, target_id[:8], msg_type)
         else:
-            other_sids = _all_sids_except(sid)
-            for s in other_sids:
-                socketio.emit('recv-msg', outgoing, room=s)
-            logger.info('IM group: %s [%s] to %d', sender_name, msg_type, len(other_sids))
+            socketio.emit('recv-msg', outgoing, room=BROADCAST_ROOM, skip_sid=sid)
+            logger.info('IM group: %s [%s]', sender_name, msg_type)
 
+        _event_stats.incr('send-msg', 'emitted')
         emit('msg-sent', {'id': msg_id, 'timestamp': outgoing['timestamp']})
 
     @socketio.on('typing')
+    @_counted('typing')
     def handle_typing(data):
         from flask import request as flask_request
         sid = flask_request.sid
         sender_id = data.get('from')
         target_id = data.get('to')
 
+        if not _typing_throttle.allow(sid, target_id, _im_setting('typing_interval')):
+            _event_stats.incr('typing', 'dropped')
+            return
+        _event_stats.incr('typing', 'emitted')
         if not target_id:
-            for s in _all_sids_except(sid):
-                socketio.emit('typing', {'from': sender_id}, room=s)
+            socketio.emit('typing', {'from': sender_id}, room=BROADCAST_ROOM, skip_sid=sid)
         else:
-            for s in _device_sids(target_id):
-                socketio.emit('typing', {'from': sender_id}, room=s)
+            socketio.emit('typing', {'from': sender_id}, room=_node_room(target_id))
 
     @socketio.on('read')
+    @_counted('read')
     def handle_read(data):
         reader_id = data.get('to')
         sender_id = data.get('from')
         if not reader_id or not sender_id:
             return
-        for s in _device_sids(sender_id):
-            socketio.emit('read', {'from': reader_id, 'to': sender_id}, room=s)
+        queued, start_flusher = _read_batcher.add(reader_id, sender_id)
+        if not queued:
+            _event_stats.incr('read', 'coalesced')
+        if start_flusher:
+            socketio.start_background_task(_flush_reads, socketio)
 
     # ------------------------------------------------------------------
     # WebRTC signaling relay — dumb forward, no payload inspection
     # ------------------------------------------------------------------
     @socketio.on('webrtc-signal')
+    @_counted('webrtc-signal')
     def handle_webrtc_signal(data):
         from flask import request as flask_request
         sid = flask_request.sid
 
-        with _devices_lock:
-            sender_id = sid_to_node.get(sid)
-
+        sender_id = _presence.node_of(sid)
         if not sender_id:
             return
 
@@ -379,8 +627,8 @@ def register_im_events(socketio):
             return
 
         # Relay to all sessions of the target device
-        for s in _device_sids(target_id):
-            socketio.emit('webrtc-signal', {
-                'fromId': sender_id,
-                'signal': signal,
-            }, room=s)
+        _event_stats.incr('webrtc-signal', 'emitted')
+        socketio.emit('webrtc-signal', {
+            'fromId': sender_id,
+            'signal': signal,
+        }, room=_node_room(target_id))
@@ -0,0 +1,92 @@
+"""
+Coalescing for high-frequency IM relay events.
+
+Clients emit ``typing`` on every keystroke and ``read`` whenever a
+conversation is viewed; relaying each one immediately fills the Socket.IO
+threads with tiny emits under bursty chat. The relay now:
+
+- throttles ``typing`` per (session, target): the first event is relayed
+  at once, repeats inside ``typing_interval_ms`` are dropped (the client
+  shows the indicator for 3 s, so a 1 s throttle keeps it lit);
+- queues ``read`` acks, dropping duplicates, and flushes them every
+  ``read_flush_ms`` from one background task that exits when idle;
+- counts received / emitted / dropped per event for ``/api/im/status``.
+
+All state is per process; sessions never move between worker processes.
+"""
+
+import collections
+import threading
+import time
+
+
+class EventStats:
+    """Thread-safe per-event counters (received / emitted / dropped / coalesced)."""
+
+    def __init__(self):
+        self._counts = collections.defaultdict(collections.Counter)
+        self._lock = threading.Lock()
+
+    def incr(self, event, field, n=1):
+        with self._lock:
+            self._counts[event][field] += n
+
+    def snapshot(self):
+        with self._lock:
+            return {event: dict(counter) for event, counter in self._counts.items()}
+
+
+class TypingThrottle:
+    """Leading-edge throttle keyed by (sid, target)."""
+
+    def __init__(self):
+        self._last = {}  # {sid: {target: monotonic}}
+        self._lock = threading.Lock()
+
+    def allow(self, sid, target, interval, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            targets = self._last.setdefault(sid, {})
+            last = targets.get(target)
+            if last is not None and now - last < interval:
+                return False
+            targets[target] = now
+            return True
+
+    def forget(self, sid):
+        with self._lock:
+            self._last.pop(sid, None)
+
+
+class ReadBatcher:
+    """Pending (reader, sender) read acks, deduplicated until the next flush."""
+
+    def __init__(self):
+        self._pending = {}  # {(reader, sender): None} — 保持到达顺序
+        self._scheduled = False
+        self._lock = threading.Lock()
+
+    def add(self, reader_id, sender_id):
+        """Queue one ack; returns (queued, start_flusher)."""
+        with self._lock:
+            key = (reader_id, sender_id)
+            queued = key not in self._pending
+            self._pending[key] = None
+            start = not self._scheduled
+            self._scheduled = True
+            return queued, start
+
+    def drain(self):
+        """Take the pending acks; returns None (and unschedules) when there are none."""
+        with self._lock:
+            if not self._pending:
+                self._scheduled = False
+                return None
+            pairs = list(self._pending)
+            self._pending.clear()
+            return pairs
+
+    def reset(self):
+        """Forget a flusher that died, so the next add() starts a new one."""
+        with self._lock:
+            self._scheduled = False
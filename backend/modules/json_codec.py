@@ -0,0 +1,109 @@
+"""
+JSON parsing / serialisation with an optional accelerated codec.
+
+When `orjson <https://github.com/ijl/orjson>`_ is installed it is used for
+both directions (several times faster than the stdlib, whose pretty
+printer is pure Python); otherwise everything goes through ``json``.
+orjson is stricter than the stdlib, so results stay what the stdlib gives:
+
+- documents orjson rejects (``NaN`` / ``Infinity``, lone surrogates, a
+  leading BOM) are re-parsed with ``json`` — error messages and positions
+  therefore always come from the stdlib;
+- documents with 19+ digit runs go straight to ``json``, because orjson
+  reads integers beyond 64 bits as floats;
+- values parsed by ``json`` are serialised by ``json`` (orjson would turn
+  ``NaN`` into ``null``), as is any indent other than 2.
+
+The only visible difference is float exponent spelling (``1e-7`` instead
+of ``1e-07``); the values are identical.
+
+:func:`iter_dumps` is the streaming variant used by the raw-body endpoints:
+orjson produces the whole document at once (it is fast enough that this is
+the cheaper option), the stdlib encoder yields it in UTF-8 chunks.
+"""
+
+import json
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_LONG_NUMBER = re.compile(rb'\d{19,}')
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def codec_name():
+    return 'orjson' if orjson is not None else 'json'
+
+
+def loads(data):
+    """Parse *data* (``str`` or UTF-8 ``bytes``) and return ``(value, fast)``.
+
+    *fast* tells :func:`dumps` whether the value may be serialised by orjson.
+    Raises ``json.JSONDecodeError`` (from the stdlib parser) on invalid input.
+    """
+    if orjson is not None:
+        raw = data.encode('utf-8', 'surrogatepass') if isinstance(data, str) else data
+        if not _LONG_NUMBER.search(raw):
+            try:
+                return orjson.loads(raw), True
+            except orjson.JSONDecodeError:
+                pass  # 交给标准库:兼容 NaN 等写法,并给出一致的错误信息与位置
+    return json.loads(data), False
+
+
+def dumps(value, indent=None, sort_keys=False, fast=True):
+    """Serialise *value* to ``str``: pretty-printed with *indent*, or compact when None."""
+    if fast and orjson is not None and indent in (None, 2):
+        option = (orjson.OPT_INDENT_2 if indent else 0) | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        try:
+            return orjson.dumps(value, option=option).decode('utf-8')
+        except TypeError:  # orjson.JSONEncodeError
+            pass
+    separators = None if indent is not None else (',', ':')
+    return json.dumps(value, indent=indent, separators=separators, sort_keys=sort_keys, ensure_ascii=False)
+
+
+def dumps_bytes(value):
+    """Compact UTF-8 encoding of a response payload built by the server itself."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value)
+        except TypeError:
+            pass
+    try:
+        return json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    except UnicodeEncodeError:  # 文档里的孤立代理项只能以 \uXXXX 转义输出
+        return json.dumps(value, separators=(',', ':')).encode('ascii')
+
+
+def iter_dumps(value, indent=None, sort_keys=False, fast=True, default=None):
+    """Like :func:`dumps` but yields UTF-8 ``bytes`` chunks for a streamed response.
+
+    *default* is called for values neither codec can serialise (datetimes
+    included, so both codecs spell them the same way).
+    """
+    if fast and orjson is not None and indent in (None, 2):
+        option = (orjson.OPT_INDENT_2 if indent else 0) | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        if default is not None:
+            option |= orjson.OPT_PASSTHROUGH_DATETIME
+        try:
+            yield orjson.dumps(value, default=default, option=option)
+            return
+        except TypeError:
+            pass
+    separators = None if indent is not None else (',', ':')
+    encoder = json.JSONEncoder(indent=indent, separators=separators, sort_keys=sort_keys,
+                               ensure_ascii=False, default=default)
+    buffer, size = [], 0
+    for chunk in encoder.iterencode(value):
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= STREAM_CHUNK_SIZE:
+            # 孤立代理项只会出现在字符串内,转成 \udxxx 仍是合法 JSON
+            yield ''.join(buffer).encode('utf-8', 'backslashreplace')
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8', 'backslashreplace')
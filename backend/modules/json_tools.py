@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 import json
 import logging
 
@@ -7,6 +7,11 @@ try:
 except ImportError:
     from backend.utils.error_handler import safe_error
 
+try:
+    from . import json_codec
+except ImportError:
+    import json_codec
+
 logger = logging.getLogger(__name__)
 
 json_tools_bp = Blueprint('json_tools', __name__)
@@ -155,3 +160,198 @@ def unescape_json():
         }), 400
     except Exception as e:
         return safe_error(e)
+
+
+# --- Batch ---
+
+MAX_BATCH_DOCUMENTS = 10000
+BATCH_OPERATIONS = ('validate', 'format', 'minify')
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def _batch_options(source):
+    """Parse operations / indent / sort_keys from the envelope or query string."""
+    operations = source.get('operations', source.get('ops', 'validate'))
+    if isinstance(operations, str):
+        operations = [op.strip() for op in operations.split(',') if op.strip()]
+    if not isinstance(operations, list) or not operations \
+            or any(op not in BATCH_OPERATIONS for op in operations):
+        raise ValueError(f'operations 只能包含 {", ".join(BATCH_OPERATIONS)}')
+    return (set(operations),) + _format_options(source)
+
+
+def _format_options(source):
+    """Parse indent / sort_keys from the envelope or query string."""
+    try:
+        indent = int(source.get('indent', 2))
+    except (TypeError, ValueError):
+        raise ValueError('indent 必须是整数')
+    if not 1 <= indent <= 8:
+        raise ValueError('indent 取值范围为 1-8')
+    sort_keys = source.get('sort_keys', False)
+    if isinstance(sort_keys, str):
+        sort_keys = sort_keys.lower() in ('1', 'true', 'yes')
+    return indent, bool(sort_keys)
+
+
+def _batch_item(index, document, operations, indent, sort_keys, parsed_fast=True):
+    """Result for one document: *document* is JSON text (str/bytes) or an already parsed value.
+
+    *parsed_fast* tells which codec parsed the envelope holding an already
+    parsed value, so the same codec serialises it (NaN etc. survive the stdlib).
+    """
+    result = {'index': index}
+    if isinstance(document, (str, bytes)):
+        if not document.strip():
+            result.update(valid=False, error='JSON文本不能为空', position=None)
+            return result
+        try:
+            value, fast = json_codec.loads(document)
+        except ValueError as e:  # JSONDecodeError / 非 UTF-8 字节
+            result.update(valid=False, error=f'JSON格式错误: {str(e)}', position=getattr(e, 'pos', None))
+            return result
+        # 长度统一按字符计:NDJSON 行是字节,信封中的是字符串
+        result['length'] = len(document.decode('utf-8')) if isinstance(document, bytes) else len(document)
+    else:
+        value, fast = document, parsed_fast
+    result['valid'] = True
+    if 'format' in operations:
+        result['formatted_json'] = json_codec.dumps(value, indent=indent, sort_keys=sort_keys, fast=fast)
+    if 'minify' in operations:
+        result['minified_json'] = json_codec.dumps(value, sort_keys=sort_keys, fast=fast)
+    return result
+
+
+@json_tools_bp.route('/batch', methods=['POST'])
+def batch_json():
+    """批量处理多个JSON文档
+
+    - JSON 信封: {"documents": [...], "operations": ["validate", "format", "minify"],
+      "indent": 2, "sort_keys": false};字符串元素按 JSON 文本解析,其它元素视为已解析的值
+    - NDJSON 正文(Content-Type: application/x-ndjson):每个非空行一个文档,
+      选项放在查询参数中(?ops=format,minify&indent=2&sort_keys=1)
+
+    请求体只解析一次(可用 orjson 时走 orjson),逐项返回结果;
+    Accept: application/x-ndjson 或 ?format=ndjson 时逐行流式返回。
+    """
+    try:
+        body = request.get_data()
+        envelope_fast = True
+        if request.mimetype == NDJSON_MIMETYPE:
+            documents = [line for line in body.split(b'\n') if line.strip()]
+            options = request.args
+        else:
+            try:
+                envelope, envelope_fast = json_codec.loads(body or b'null')
+            except ValueError as e:
+                return jsonify({'error': f'请求体不是有效的JSON: {str(e)}'}), 400
+            if not isinstance(envelope, dict) or not isinstance(envelope.get('documents'), list):
+                return jsonify({'error': '请提供documents数组或NDJSON正文'}), 400
+            documents, options = envelope['documents'], envelope
+        if len(documents) > MAX_BATCH_DOCUMENTS:
+            return jsonify({'error': f'单次最多处理 {MAX_BATCH_DOCUMENTS} 个文档'}), 400
+        try:
+            operations, indent, sort_keys = _batch_options(options)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        results = (_batch_item(i, doc, operations, indent, sort_keys, envelope_fast)
+                   for i, doc in enumerate(documents))
+        if request.args.get('format') == 'ndjson' or \
+                request.accept_mimetypes.best == NDJSON_MIMETYPE:
+            return Response((json_codec.dumps_bytes(item) + b'\n' for item in results),
+                            mimetype=NDJSON_MIMETYPE)
+
+        results = list(results)
+        valid = sum(1 for item in results if item['valid'])
+        payload = {
+            'success': True,
+            'codec': json_codec.codec_name(),
+            'count': len(results),
+            'valid': valid,
+            'invalid': len(results) - valid,
+            'results': results,
+        }
+        return Response(json_codec.dumps_bytes(payload), mimetype='application/json')
+
+    except Exception as e:
+        return safe_error(e)
+
+
+# --- Raw body ---
+#
+# /raw/* 直接以请求体作为文档(text/plain 或 application/json 均可),选项放在
+# 查询参数中,结果作为原始响应体流式返回:请求体只解析一次,输出也不再
+# 二次转义进 JSON 字符串。错误仍按 {'error': ...} 返回。
+
+def _raw_document():
+    """Return ``(value, fast)`` parsed from the request body; raises ValueError on bad input."""
+    body = request.get_data(cache=False)
+    if not body.strip():
+        raise ValueError('JSON文本不能为空')
+    return json_codec.loads(body)
+
+
+def _raw_response(value, fast, indent=None, sort_keys=False):
+    return Response(json_codec.iter_dumps(value, indent=indent, sort_keys=sort_keys, fast=fast),
+                    mimetype='application/json')
+
+
+def _raw_error(e):
+    if isinstance(e, json.JSONDecodeError):
+        return jsonify({'error': f'JSON格式错误: {str(e)}', 'position': e.pos}), 400
+    return jsonify({'error': str(e)}), 400
+
+
+@json_tools_bp.route('/raw/format', methods=['POST'])
+def format_json_raw():
+    """格式化JSON(原始请求体,?indent=2&sort_keys=1)"""
+    try:
+        try:
+            indent, sort_keys = _format_options(request.args)
+            value, fast = _raw_document()
+        except ValueError as e:
+            return _raw_error(e)
+        return _raw_response(value, fast, indent=indent, sort_keys=sort_keys)
+    except Exception as e:
+        return safe_error(e)
+
+
+@json_tools_bp.route('/raw/minify', methods=['POST'])
+def minify_json_raw():
+    """压缩JSON(原始请求体,?sort_keys=1)"""
+    try:
+        try:
+            _, sort_keys = _format_options(request.args)
+            value, fast = _raw_document()
+        except ValueError as e:
+            return _raw_error(e)
+        return _raw_response(value, fast, sort_keys=sort_keys)
+    except Exception as e:
+        return safe_error(e)
+
+
+@json_tools_bp.route('/raw/validate', methods=['POST'])
+def validate_json_raw():
+    """验证JSON格式(原始请求体;不回传解析结果)"""
+    try:
+        body = request.get_data(cache=False)
+        if not body.strip():
+            return jsonify({'error': 'JSON文本不能为空'}), 400
+        try:
+            json_codec.loads(body)
+        except ValueError as e:
+            return jsonify({
+                'success': True,
+                'valid': False,
+                'error': f'JSON格式错误: {str(e)}',
+                'position': getattr(e, 'pos', None)
+            }), 200
+        return jsonify({
+            'success': True,
+            'valid': True,
+            'message': 'JSON格式正确',
+            'length': len(body.decode('utf-8', 'replace'))
+        }), 200
+    except Exception as e:
+        return safe_error(e)
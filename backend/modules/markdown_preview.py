@@ -0,0 +1,241 @@
+"""
+Incremental live preview for ``/preview-md``.
+
+The editor posts the whole document on every keystroke and the server used
+to re-parse and re-render all of it, so preview latency grew with document
+length. With a ``doc_id`` the server now keeps, per document, the source
+lines and the rendered top-level blocks (line range + HTML) and:
+
+- diffs the new text against the stored one — either the client sends
+  line-range ``changes`` against ``base_version`` or the full text and the
+  server finds the common prefix / suffix lines;
+- re-parses only the changed blocks plus one neighbour on each side (a
+  changed line can merge into / split off from the block next to it);
+- accepts that partial parse only if a top-level block still starts where
+  the next untouched block starts — otherwise (an unclosed fence, a list
+  swallowing the following lines) it re-parses the whole document;
+- answers with one splice over the block list (``start`` / ``deleteCount``
+  / ``blocks``), trimmed to the blocks whose HTML actually changed.
+
+Documents using reference-style link definitions always take the full
+path, since a definition anywhere changes links everywhere. Sessions live
+in a small LRU with an idle TTL; an unknown ``doc_id`` or stale version
+asks the client to resend the full text.
+"""
+
+import collections
+import itertools
+import threading
+import time
+
+try:
+    from .markdown_render import get_renderer
+except ImportError:
+    from markdown_render import get_renderer
+
+MAX_SESSIONS = 64
+SESSION_TTL = 30 * 60        # 秒;空闲超过该时长的文档会话被丢弃
+MAX_DOC_ID_LENGTH = 128
+
+
+class PreviewError(Exception):
+    """Client-visible error; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class _Block:
+    __slots__ = ('id', 'start', 'end', 'html')
+
+    def __init__(self, block_id, start, end, html):
+        self.id = block_id
+        self.start = start   # 源文本行号,[start, end)
+        self.end = end
+        self.html = html
+
+    def shifted(self, delta):
+        return _Block(self.id, self.start + delta, self.end + delta, self.html) if delta else self
+
+
+def parse_blocks(lines, offset=0, profile='preview'):
+    """Parse *lines* and return ``([(start, end, html)], has_references)`` per top-level block.
+
+    Line numbers are shifted by *offset* so a partial parse lines up with the document.
+    """
+    md = get_renderer(profile)
+    env = {}
+    tokens = md.parse('\n'.join(lines), env)
+    blocks = []
+    open_at = None
+    for i, token in enumerate(tokens):
+        if token.level != 0:
+            continue
+        if token.nesting == 1:
+            open_at = i
+            continue
+        first = open_at if token.nesting == -1 else i
+        start, end = tokens[first].map
+        html = md.renderer.render(tokens[first:i + 1], md.options, env)
+        blocks.append((start + offset, end + offset, html))
+    return blocks, bool(env.get('references'))
+
+
+class PreviewSession:
+    """Parsed state of one editor document."""
+
+    def __init__(self, doc_id):
+        self.doc_id = doc_id
+        self.lock = threading.Lock()
+        self.lines = None       # None:尚未同步过全文
+        self.blocks = []
+        self.version = 0
+        self.references = False
+        self.touched = time.monotonic()
+        self._ids = itertools.count(1)
+
+    def apply_changes(self, base_version, changes):
+        """Apply line-range ``changes`` (``{start, end, lines}``, in order) to the stored text."""
+        if self.lines is None or base_version != self.version:
+            raise PreviewError('预览会话已过期,请重新发送全文', 409)
+        lines = list(self.lines)
+        for change in changes:
+            try:
+                start, end, new = int(change['start']), int(change['end']), change['lines']
+            except (KeyError, TypeError, ValueError):
+                raise PreviewError('changes 格式错误')
+            if not (0 <= start <= end <= len(lines)) or not isinstance(new, list) \
+                    or not all(isinstance(line, str) for line in new):
+                raise PreviewError('changes 行范围无效')
+            lines[start:end] = new
+        return self.update(lines)
+
+    def update(self, lines):
+        """Bring the session to *lines*; returns the splice over the block list."""
+        self.touched = time.monotonic()
+        lines = list(lines)
+        old, old_blocks = self.lines, self.blocks
+        if lines == old:
+            return {'start': 0, 'deleteCount': 0, 'blocks': []}
+        self.version += 1
+        if old is None or self.references or not old_blocks:
+            return self._full(lines, old_blocks)
+
+        # 变化的行:old[p:q] → lines[p:len(lines) - s]
+        limit = min(len(old), len(lines))
+        p = 0
+        while p < limit and old[p] == lines[p]:
+            p += 1
+        s = 0
+        while s < limit - p and old[-1 - s] == lines[-1 - s]:
+            s += 1
+        q = len(old) - s
+        delta = len(lines) - len(old)
+
+        # 与变化行相交或相邻的块,各向外多取一个块作为重新解析的起止锚点
+        first = next((i for i, b in enumerate(old_blocks) if b.end >= p), len(old_blocks))
+        last = next((i for i in range(len(old_blocks) - 1, -1, -1) if old_blocks[i].start <= q), -1)
+        lead, trail = max(first - 1, 0), last + 1
+        a = old_blocks[lead].start if first > 0 else 0
+        b = old_blocks[trail].end + delta if trail < len(old_blocks) else len(lines)
+
+        parsed, references = parse_blocks(lines[a:b], a)
+        if references:
+            return self._full(lines, old_blocks)
+        if trail < len(old_blocks):
+            anchor = old_blocks[trail].start + delta
+            if not any(start == anchor for start, _, _ in parsed):
+                return self._full(lines, old_blocks)  # 改动影响到了区域之后的块
+            parsed = [block for block in parsed if block[0] < anchor]
+
+        tail = [block.shifted(delta) for block in old_blocks[trail:]]
+        return self._splice(lines, lead, old_blocks[lead:trail], parsed, old_blocks[:lead], tail)
+
+    def _full(self, lines, old_blocks=()):
+        parsed, self.references = parse_blocks(lines)
+        return self._splice(lines, 0, list(old_blocks), parsed, [], [])
+
+    def _splice(self, lines, offset, replaced, parsed, head, tail):
+        # 两端 HTML 未变的块沿用旧 id,补丁只包含真正变化的块
+        k = 0
+        while k < min(len(replaced), len(parsed)) and replaced[k].html == parsed[k][2]:
+            k += 1
+        j = 0
+        while j < min(len(replaced), len(parsed)) - k and replaced[-1 - j].html == parsed[-1 - j][2]:
+            j += 1
+        middle = []
+        for i, (start, end, html) in enumerate(parsed):
+            if i < k:
+                block_id = replaced[i].id
+            elif i >= len(parsed) - j:
+                block_id = replaced[len(replaced) - len(parsed) + i].id
+            else:
+                block_id = next(self._ids)
+            middle.append(_Block(block_id, start, end, html))
+        self.lines = lines
+        self.blocks = head + middle + tail
+        changed = middle[k:len(middle) - j]
+        return {
+            'start': offset + k,
+            'deleteCount': len(replaced) - k - j,
+            'blocks': [{'id': block.id, 'html': block.html} for block in changed],
+        }
+
+    def snapshot(self):
+        return [{'id': block.id, 'html': block.html} for block in self.blocks]
+
+
+class PreviewSessions:
+    """Bounded LRU of PreviewSession keyed by client-chosen ``doc_id``."""
+
+    def __init__(self, max_sessions=MAX_SESSIONS, ttl=SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, doc_id, create=False):
+        if not isinstance(doc_id, str) or not doc_id or len(doc_id) > MAX_DOC_ID_LENGTH:
+            raise PreviewError('doc_id 无效')
+        now = time.monotonic()
+        with self._lock:
+            while self._sessions:
+                oldest = next(iter(self._sessions.values()))
+                if now - oldest.touched <= self.ttl:
+                    break
+                self._sessions.popitem(last=False)
+            session = self._sessions.get(doc_id)
+            if session is not None:
+                self._sessions.move_to_end(doc_id)
+            elif create:
+                session = self._sessions[doc_id] = PreviewSession(doc_id)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                raise PreviewError('预览会话不存在,请重新发送全文', 409)
+            session.touched = now
+        return session
+
+    def discard(self, doc_id):
+        with self._lock:
+            self._sessions.pop(doc_id, None)
+
+
+_sessions = None
+_sessions_lock = threading.Lock()
+
+
+def get_preview_sessions():
+    """Return the process-wide PreviewSessions."""
+    global _sessions
+    if _sessions is None:
+        with _sessions_lock:
+            if _sessions is None:
+                _sessions = PreviewSessions()
+    return _sessions
+
+
+def split_lines(text):
+    # 与 markdown-it 的换行规范化一致,保证行号对得上
+    return text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
@@ -0,0 +1,70 @@
+"""
+Shared, pre-built markdown-it renderers.
+
+Every Markdown endpoint (``/markdown/to-html``, ``/to-plain``,
+``/data-conversion/md-to-html``, ``/preview-md``, the PDF exports) used to
+construct ``MarkdownIt("commonmark", {...}).enable([...])`` per request,
+re-resolving the preset and recompiling every rule chain before parsing a
+single line. Renderers are now built once per option profile:
+
+- ``preview`` — HTML shown in the browser (``to-html``, ``md-to-html``,
+  ``preview-md``);
+- ``export`` — HTML fed to WeasyPrint / wkhtmltopdf;
+- ``plain`` — HTML that is immediately flattened to text (``to-plain``).
+
+A ``MarkdownIt`` instance keeps no per-document state (each ``parse`` gets
+a fresh ``StateCore``); the only lazily built state is each ruler's chain
+cache, which is compiled up front so concurrent first requests never see a
+half-built cache. The ``linkify`` *rule* is not enabled in any profile —
+``linkify-it`` matchers are stateful and must not be shared between
+threads — so the ``linkify`` option only mirrors the historical settings.
+"""
+
+import threading
+
+from markdown_it import MarkdownIt
+
+ENABLED_RULES = ['table', 'strikethrough', 'code', 'fence', 'emphasis', 'list']
+
+PROFILES = {
+    'preview': {
+        "breaks": True,        # 转换 \n 为 <br>
+        "html": False,         # 禁用HTML标签（防止XSS）
+        "linkify": True,       # 自动转换URL为链接
+        "typographer": True,   # 启用智能引号等排版替换
+    },
+    'export': {
+        "breaks": True,
+        "html": False,
+        "linkify": True,
+        "typographer": True,
+    },
+    'plain': {
+        "breaks": True,
+        "html": False,
+        "linkify": True,
+    },
+}
+
+_renderers = {}
+_renderers_lock = threading.Lock()
+
+
+def build_renderer(options, rules=ENABLED_RULES):
+    """Build a MarkdownIt with *options* / *rules* and its rule caches compiled."""
+    md = MarkdownIt("commonmark", dict(options)).enable(list(rules))
+    for ruler in (md.core.ruler, md.block.ruler, md.inline.ruler, md.inline.ruler2):
+        ruler.getRules('')
+    return md
+
+
+def get_renderer(profile='preview'):
+    """Return the shared renderer for *profile* (``preview`` / ``export`` / ``plain``)."""
+    md = _renderers.get(profile)
+    if md is None:
+        with _renderers_lock:
+            md = _renderers.get(profile)
+            if md is None:
+                md = _renderers[profile] = build_renderer(PROFILES[profile])
+    return md
+
@@ -1,5 +1,4 @@
 from flask import Blueprint, request, jsonify
-from markdown_it import MarkdownIt
 import html
 from bs4 import BeautifulSoup
 import re
@@ -10,6 +9,13 @@ try:
 except ImportError:
     from backend.utils.error_handler import safe_error
 
+try:
+    from .markdown_render import get_renderer
+    from .data_conversion_styles import register_bundle, get_bundle
+except ImportError:
+    from markdown_render import get_renderer
+    from data_conversion_styles import register_bundle, get_bundle
+
 logger = logging.getLogger(__name__)
 
 markdown_tools_bp = Blueprint('markdown_tools', __name__)
@@ -25,8 +31,7 @@ def markdown_to_html():
         if not markdown_text.strip():
             return jsonify({'error': 'Markdown文本不能为空'}), 400
 
-        md = MarkdownIt("commonmark", {"breaks": True, "html": False, "linkify": True}).enable(['table', 'strikethrough', 'code', 'fence', 'emphasis', 'list'])
-        html_content = md.render(markdown_text)
+        html_content = get_renderer('preview').render(markdown_text)
 
         title = "Markdown 文档"
         lines = markdown_text.split('\n')
@@ -35,7 +40,7 @@ def markdown_to_html():
                 title = line.strip()[2:].strip()
                 break
 
-        css_styles = _get_preview_css()
+        css_styles = get_bundle('markdown-tools').css
         html_template = f"""<!DOCTYPE html>
 <html lang="zh-CN">
 <head>
@@ -545,6 +550,10 @@ def _get_preview_css():
     """
 
 
+# 样式只拼装一次;也可经 /api/data-conversion/styles/<hash>.css 访问
+register_bundle('markdown-tools', _get_preview_css)
+
+
 @markdown_tools_bp.route('/to-plain', methods=['POST'])
 def markdown_to_plain():
     # Markdown转纯文本
@@ -558,8 +567,7 @@ def markdown_to_plain():
             return jsonify({'error': 'Markdown文本不能为空'}), 400
 
         # 转换Markdown为HTML(markdown_it 引擎,与 to-html 一致),再提取纯文本
-        md = MarkdownIt("commonmark", {"breaks": True, "html": False, "linkify": True}).enable(['table', 'strikethrough', 'code', 'fence', 'emphasis', 'list'])
-        html_content = md.render(markdown_text)
+        html_content = get_renderer('plain').render(markdown_text)
         soup = BeautifulSoup(html_content, 'html.parser')
 
         # 提取纯文本
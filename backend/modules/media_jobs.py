@@ -0,0 +1,123 @@
+"""
+Background queue for cover / thumbnail / video-frame extraction.
+
+EPUB cover extraction, PDF page rendering, PIL thumbnailing and ffmpeg used
+to run inside the HTTP request. Callers now ``submit()`` a job under a key
+(e.g. ``'im-thumb:<name>'``) and answer with a ``pending`` status; the job
+runs on a small bounded thread pool (PIL/PyMuPDF release the GIL, ffmpeg is
+a subprocess). Submitting a key that is already queued or running returns
+the existing future instead of doing the work twice.
+"""
+
+import os
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_MAX_PENDING = 256
+
+
+class QueueFull(Exception):
+    """Raised by submit() when max_pending jobs are already queued."""
+
+
+class MediaJobQueue:
+    """Bounded, de-duplicating job pool keyed by an arbitrary string."""
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='media-job')
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+    def submit(self, key, fn, *args, on_done=None):
+        """Run ``fn(*args)`` in the background unless *key* is already in flight.
+
+        ``on_done(result)`` is called on the worker thread after a successful
+        run. Returns the job's Future; raises QueueFull when the queue is full.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            if len(self._inflight) >= self.max_pending:
+                raise QueueFull(key)
+            future = self._executor.submit(self._run, key, fn, args, on_done)
+            self._inflight[key] = future
+            return future
+
+    def _run(self, key, fn, args, on_done):
+        try:
+            result = fn(*args)
+            if on_done is not None:
+                try:
+                    on_done(result)
+                except Exception:
+                    logger.warning('Media job %s: completion callback failed', key, exc_info=True)
+            return result
+        except Exception:
+            logger.warning('Media job %s failed', key, exc_info=True)
+            return None
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                self._idle.notify_all()
+
+    def get(self, key):
+        """Return the Future of an in-flight job, or None."""
+        with self._lock:
+            return self._inflight.get(key)
+
+    def is_pending(self, key):
+        return self.get(key) is not None
+
+    def wait_idle(self, timeout=None):
+        """Block until no job is in flight; returns False on timeout."""
+        with self._lock:
+            return self._idle.wait_for(lambda: not self._inflight, timeout)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_media_jobs():
+    """Return the process-wide MediaJobQueue (created on first use)."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = MediaJobQueue()
+    return _queue
+
+
+def _reset_after_fork():
+    # 线程池的工作线程不会随 fork 进入子进程,子进程按需重建
+    global _queue, _queue_lock
+    _queue = None
+    _queue_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def emit_event(socketio, event, payload, room=None):
+    """Emit *payload* to *room* (a room or list of rooms) from a worker thread.
+
+    No-op when Socket.IO is disabled.
+    """
+    if socketio is None:
+        return
+    try:
+        if room is None:
+            socketio.emit(event, payload)
+        else:
+            socketio.emit(event, payload, room=room)
+    except Exception:
+        logger.debug('Failed to emit %s', event, exc_info=True)
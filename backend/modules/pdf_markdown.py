@@ -0,0 +1,219 @@
+"""
+PDF → Markdown, page by page.
+
+``/pdf-to-md`` used to walk every page with ``page.get_text()``, call any
+paragraph under 100 characters a heading and return one JSON blob at the
+end. Conversion now:
+
+- reads ``page.get_text('dict')`` and maps font sizes to heading levels:
+  the body size is the most common span size (by characters) over a sample
+  of pages, and the largest sizes above it become ``#`` / ``##`` / ``###``;
+- splits the document into page ranges converted on a process pool
+  (PyMuPDF holds the GIL); a worker opens the file for its range and closes
+  it before returning, so no handle outlives the conversion (on Windows an
+  open handle would make deleting the temp upload fail);
+- yields pages in order as soon as they are ready, so the HTTP layer can
+  stream them (NDJSON / SSE) instead of buffering the whole document.
+
+Short documents are converted inline; the pool only pays off past a few
+pages. Workers are started with ``forkserver`` (``spawn`` where that is
+unavailable) rather than forking the threaded server; frozen builds rely on
+``multiprocessing.freeze_support()`` in the entry point. If the pool breaks
+or cannot start processes, the remaining pages are converted inline.
+"""
+
+import collections
+import multiprocessing
+import os
+import threading
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz
+
+logger = logging.getLogger(__name__)
+
+PAGES_PER_TASK = 8
+PDF_WORKERS = min(4, os.cpu_count() or 1)
+SAMPLE_PAGES = 12          # 估计正文字号时抽样的页数
+HEADING_RATIO = 1.15       # 字号至少为正文的 1.15 倍才视为标题
+MAX_HEADING_CHARS = 200
+# 不 fork 多线程的服务器进程(可能正持有锁 / 套接字)
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+# --- Font profile / heading detection ---
+
+def _size_key(size):
+    return round(size * 2) / 2  # 0.5pt 粒度,抹平同一字号的浮点误差
+
+
+def _text_blocks(page):
+    return [b for b in page.get_text('dict')['blocks'] if b.get('type') == 0]
+
+
+def font_profile(doc, sample=SAMPLE_PAGES):
+    """Estimate body font size and heading sizes from up to *sample* pages.
+
+    Returns a picklable ``{'body': size, 'levels': {size: level}}``.
+    """
+    total = len(doc)
+    if not total:
+        return {'body': 0, 'levels': {}}
+    step = max(total / sample, 1)
+    indices = sorted({int(i * step) for i in range(min(sample, total))})
+    chars = collections.Counter()
+    for i in indices:
+        for block in _text_blocks(doc.load_page(i)):
+            for line in block['lines']:
+                for span in line['spans']:
+                    n = len(span['text'].strip())
+                    if n:
+                        chars[_size_key(span['size'])] += n
+    if not chars:
+        return {'body': 0, 'levels': {}}
+    body = chars.most_common(1)[0][0]
+    larger = sorted((s for s in chars if s >= body * HEADING_RATIO), reverse=True)
+    return {'body': body, 'levels': {s: level for level, s in enumerate(larger[:3], 1)}}
+
+
+def _heading_level(size, profile):
+    size = _size_key(size)
+    level = profile['levels'].get(size)
+    if level is not None:
+        return level
+    body = profile['body']
+    if not body or size < body * HEADING_RATIO:
+        return None
+    # 抽样页里没出现过的字号:按相对正文的比例归级
+    ratio = size / body
+    return 1 if ratio >= 1.6 else 2 if ratio >= 1.3 else 3
+
+
+def _join_lines(lines):
+    text = ''
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if text.endswith('-') and line[:1].islower():
+            text = text[:-1] + line  # 行尾连字符断词
+        elif text:
+            text += ' ' + line
+        else:
+            text = line
+    return text
+
+
+def page_markdown(page, profile):
+    """Markdown for one page: headings by font size, other blocks as paragraphs."""
+    parts = []
+    for block in _text_blocks(page):
+        lines, sizes = [], collections.Counter()
+        for line in block['lines']:
+            lines.append(''.join(span['text'] for span in line['spans']))
+            for span in line['spans']:
+                sizes[span['size']] += len(span['text'].strip())
+        text = _join_lines(lines)
+        if not text:
+            continue
+        level = _heading_level(sizes.most_common(1)[0][0], profile)
+        if level and len(text) <= MAX_HEADING_CHARS:
+            parts.append(f"{'#' * level} {text}")
+        else:
+            parts.append(text)
+    return '\n\n'.join(parts) + '\n\n' if parts else ''
+
+
+# --- Worker side ---
+
+def _convert_range(path, start, stop, profile):
+    with fitz.open(path) as doc:
+        return [page_markdown(doc.load_page(i), profile) for i in range(start, stop)]
+
+
+# --- Pool ---
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS,
+                                            mp_context=multiprocessing.get_context(START_METHOD))
+    return _pool
+
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _reset_after_fork():
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# --- Driver ---
+
+def open_pdf(path):
+    """Validate *path* and return ``(page_count, font_profile)``."""
+    with fitz.open(path) as doc:
+        if not doc.is_pdf:
+            raise ValueError('not a PDF document')
+        return len(doc), font_profile(doc)
+
+
+def iter_pages(path, page_count, profile, pages_per_task=PAGES_PER_TASK):
+    """Yield ``(page_number, markdown)`` in page order (page numbers start at 1)."""
+    ranges = collections.deque((s, min(s + pages_per_task, page_count))
+                               for s in range(0, page_count, pages_per_task))
+    if len(ranges) > 1 and PDF_WORKERS > 1:
+        pool = _get_pool()
+        pending = collections.deque()  # (start, stop, future),按页序排列
+        try:
+            while ranges or pending:
+                try:
+                    # 在途窗口有界(2×workers 段):内存不随页数增长,结果按序取出
+                    while ranges and len(pending) < PDF_WORKERS * 2:
+                        start, stop = ranges[0]
+                        future = pool.submit(_convert_range, path, start, stop, profile)
+                        pending.append((start, stop, future))
+                        ranges.popleft()
+                    pages = pending[0][2].result()
+                except (BrokenProcessPool, RuntimeError, OSError) as e:
+                    logger.warning('PDF worker pool unavailable, converting inline: %s', e)
+                    _discard_pool(pool)
+                    ranges.extendleft((start, stop) for start, stop, _ in reversed(pending))
+                    pending.clear()
+                    break
+                start = pending.popleft()[0]
+                for offset, markdown in enumerate(pages):
+                    yield start + offset + 1, markdown
+        finally:
+            for _, _, future in pending:
+                future.cancel()
+    if ranges:
+        with fitz.open(path) as doc:
+            for start, stop in ranges:
+                for i in range(start, stop):
+                    yield i + 1, page_markdown(doc.load_page(i), profile)
+
+
+def convert_pdf(path):
+    """Whole-document conversion (non-streaming callers); returns (markdown, pages)."""
+    page_count, profile = open_pdf(path)
+    return ''.join(md for _, md in iter_pages(path, page_count, profile)), page_count
@@ -0,0 +1,365 @@
+"""
+Pre-warmed PDF render workers.
+
+``md-to-pdf`` / ``html-to-pdf`` used to import and run WeasyPrint in the
+request thread (writing through a temp file), and the wkhtmltopdf fallback
+went through ``pdfkit``, which looks the binary up again on every call. The
+first WeasyPrint render in a process pays for Pango / fontconfig start-up
+and font loading, which dominates a typical document. Rendering now goes to
+a small set of long-lived worker processes:
+
+- each worker imports WeasyPrint once, keeps one ``FontConfiguration`` and
+  the pre-parsed stylesheet bundles, and renders a warm-up page at start;
+- jobs are ``(engine, html, stylesheet)``; PDF bytes come back over the
+  worker pipe (``write_pdf()`` / wkhtmltopdf ``- -`` stdin → stdout), so
+  no temp files are involved;
+- admission is bounded (workers + ``pdf_queue_size``): when full, callers
+  get :class:`PdfQueueFull` and the HTTP layer answers 429;
+- each job has a deadline (``pdf_timeout``); a worker that misses it is
+  killed and replaced, and the caller gets :class:`PdfRenderTimeout`;
+- counters (submitted / completed / failed / rejected / timeouts /
+  restarts, render times, queue depth) are exposed through ``stats()``.
+
+wkhtmltopdf has no resident mode, so that engine still starts one process
+per job; the worker only resolves the binary once and enforces the timeout
+on the child itself.
+
+Workers are started with ``forkserver`` (``spawn`` on Windows / macOS
+builds without it), never by forking the threaded server process; frozen
+builds need ``multiprocessing.freeze_support()`` in the entry point.
+"""
+
+import collections
+import multiprocessing
+import os
+import queue
+import subprocess
+import threading
+import time
+import logging
+
+try:
+    from ..utils import config_manager
+except ImportError:
+    try:
+        from backend.utils import config_manager
+    except ImportError:
+        from utils import config_manager
+
+try:
+    from .data_conversion_styles import get_bundle
+except ImportError:
+    from data_conversion_styles import get_bundle
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_SIZE = 8
+DEFAULT_TIMEOUT = 60          # 秒;单个渲染任务的上限
+WARM_STYLESHEETS = ('full',)  # 工作进程启动时预解析的样式包
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+WKHTMLTOPDF_ARGS = [
+    '--quiet', '--encoding', 'UTF-8', '--page-size', 'A4',
+    '--margin-top', '20mm', '--margin-bottom', '20mm',
+    '--margin-left', '20mm', '--margin-right', '20mm',
+    '--enable-local-file-access',
+]
+
+
+class PdfRenderError(Exception):
+    """Rendering failed; the message carries the engine's error."""
+
+
+class PdfQueueFull(PdfRenderError):
+    """Every worker is busy and the wait queue is full."""
+
+
+class PdfRenderTimeout(PdfRenderError):
+    """The job did not finish within the per-job timeout."""
+
+
+# --- Worker side ---
+
+_weasy = {}      # 工作进程内:HTML / CSS 类、FontConfiguration、{样式包名: CSS}
+_wkhtmltopdf = None
+
+
+def _weasy_stylesheet(name):
+    sheets = _weasy['sheets']
+    if name not in sheets:
+        sheets[name] = _weasy['CSS'](string=get_bundle(name).css, font_config=_weasy['font_config'])
+    return sheets[name]
+
+
+def _warm():
+    try:
+        from weasyprint import HTML, CSS
+        from weasyprint.text.fonts import FontConfiguration
+    except Exception as e:  # 缺少 Pango 等系统库时 import 即失败
+        _weasy['error'] = f'WeasyPrint unavailable: {type(e).__name__}: {e}'
+        return
+    _weasy.update(HTML=HTML, CSS=CSS, font_config=FontConfiguration(), sheets={})
+    try:
+        for name in WARM_STYLESHEETS:
+            _weasy_stylesheet(name)
+        # 预热:首次排版才会真正加载字体
+        HTML(string='<h1>DevToolBox</h1><p>预热 warm-up <code>0</code></p>').write_pdf(
+            stylesheets=[_weasy_stylesheet(name) for name in WARM_STYLESHEETS],
+            font_config=_weasy['font_config'])
+    except Exception:
+        logger.warning('WeasyPrint warm-up failed', exc_info=True)
+
+
+def _render_weasyprint(html, stylesheet, timeout):
+    if 'error' in _weasy:
+        raise RuntimeError(_weasy['error'])
+    sheets = [_weasy_stylesheet(stylesheet)] if stylesheet else []
+    return _weasy['HTML'](string=html).write_pdf(stylesheets=sheets, font_config=_weasy['font_config'])
+
+
+def _render_wkhtmltopdf(html, stylesheet, timeout):
+    global _wkhtmltopdf
+    if stylesheet:
+        style = f'<style>{get_bundle(stylesheet).css}</style>'
+        html = html.replace('</head>', style + '</head>', 1) if '</head>' in html else style + html
+    if _wkhtmltopdf is None:
+        import pdfkit
+        try:
+            _wkhtmltopdf = pdfkit.configuration().wkhtmltopdf
+        except (IOError, OSError):
+            raise FileNotFoundError('系统中未找到wkhtmltopdf，请先安装wkhtmltopdf。请参考"wkhtmltopdf安装指南.md"进行安装。')
+        if isinstance(_wkhtmltopdf, bytes):
+            _wkhtmltopdf = _wkhtmltopdf.decode('utf-8')
+    # 比任务超时略短:由工作进程自己结束 wkhtmltopdf,避免父进程杀掉工作进程后留下孤儿
+    result = subprocess.run([_wkhtmltopdf, *WKHTMLTOPDF_ARGS, '-', '-'], input=html.encode('utf-8'),
+                            capture_output=True, timeout=max(timeout - 1, 1),
+                            creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+    if result.returncode != 0 or not result.stdout.startswith(b'%PDF'):
+        raise RuntimeError(f'wkhtmltopdf exited with {result.returncode}: '
+                           f'{result.stderr.decode("utf-8", "replace")[-500:]}')
+    return result.stdout
+
+
+_ENGINES = {
+    'weasyprint': _render_weasyprint,
+    'wkhtmltopdf': _render_wkhtmltopdf,
+}
+
+
+def _worker_main(conn, parent_end):
+    parent_end.close()
+    parent = os.getppid()
+    _warm()
+    while True:
+        try:
+            if not conn.poll(5):
+                if os.getppid() != parent:
+                    return  # 父进程已退出
+                continue
+            engine, html, stylesheet, timeout = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            conn.send(('ok', _ENGINES[engine](html, stylesheet, timeout)))
+        except Exception as e:
+            conn.send(('error', f'{type(e).__name__}: {e}'))
+
+
+# --- Pool ---
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child, self.conn),
+                                   name='pdf-render', daemon=True)
+        self.process.start()
+        child.close()
+
+    def run(self, job, timeout):
+        try:
+            self.conn.send(job)
+            if not self.conn.poll(timeout):
+                raise PdfRenderTimeout(f'PDF渲染超时({timeout}秒)')
+            status, payload = self.conn.recv()
+        except (EOFError, OSError) as e:
+            raise PdfRenderError(f'PDF render worker exited: {e}') from e
+        if status != 'ok':
+            raise PdfRenderError(payload)
+        return payload
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.join(1)
+        except (OSError, ValueError):
+            pass
+        self.conn.close()
+
+
+class PdfRenderPool:
+    """Fixed set of warm render processes with bounded admission and per-job timeouts."""
+
+    def __init__(self, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE, timeout=DEFAULT_TIMEOUT,
+                 start_method=START_METHOD):
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.timeout = timeout
+        self._ctx = multiprocessing.get_context(start_method)
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._stats = collections.Counter()
+        self._waiting = 0
+        self._render_max = 0.0
+        self._closed = False
+        for _ in range(self.workers):
+            self._idle.put(_Worker(self._ctx))
+
+    def render(self, engine, html, stylesheet=None):
+        """Render *html* with *engine* and return the PDF bytes.
+
+        *stylesheet* names a bundle the worker keeps pre-parsed (WeasyPrint) or
+        inlines (wkhtmltopdf). Raises PdfQueueFull / PdfRenderTimeout / PdfRenderError.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise PdfQueueFull('PDF渲染队列已满，请稍后重试')
+        try:
+            with self._lock:
+                self._stats['submitted'] += 1
+                self._waiting += 1
+            try:
+                worker = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                with self._lock:
+                    self._stats['timeouts'] += 1
+                raise PdfRenderTimeout(f'等待PDF渲染进程超时({self.timeout}秒)')
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+            started = time.monotonic()
+            try:
+                data = worker.run((engine, html, stylesheet, self.timeout), self.timeout)
+            except PdfRenderError as e:
+                with self._lock:
+                    self._stats['timeouts' if isinstance(e, PdfRenderTimeout) else 'failed'] += 1
+                if isinstance(e, PdfRenderTimeout) or not worker.process.is_alive():
+                    worker = self._replace(worker)
+                raise
+            finally:
+                self._release(worker)
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._stats['completed'] += 1
+                self._stats['render_ms_total'] += int(elapsed * 1000)
+                self._render_max = max(self._render_max, elapsed)
+            return data
+        finally:
+            self._slots.release()
+
+    def _replace(self, worker):
+        worker.kill()
+        with self._lock:
+            self._stats['restarts'] += 1
+        try:
+            return _Worker(self._ctx)
+        except OSError:
+            # 暂时无法创建进程:放回已失效的 worker,下一个任务会再次尝试替换
+            logger.warning('Could not start PDF render worker', exc_info=True)
+            return worker
+
+    def _release(self, worker):
+        if self._closed:
+            worker.kill()
+        else:
+            self._idle.put(worker)
+
+    def close(self):
+        """Stop idle workers now; busy ones are stopped when their job returns."""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                return
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            waiting, render_max = self._waiting, self._render_max
+        for field in ('submitted', 'completed', 'failed', 'rejected', 'timeouts', 'restarts'):
+            stats.setdefault(field, 0)
+        total = stats.pop('render_ms_total', 0)
+        idle = self._idle.qsize()
+        stats.update({
+            'workers': self.workers,
+            'idle': idle,
+            'busy': self.workers - idle,
+            'queued': waiting,
+            'capacity': self.workers + self.queue_size,
+            'timeout': self.timeout,
+            'render_ms_avg': round(total / stats['completed'], 1) if stats['completed'] else None,
+            'render_ms_max': round(render_max * 1000, 1),
+        })
+        return stats
+
+
+# --- Process-wide pool ---
+
+_settings = {}
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _number(value, default, cast=int):
+    try:
+        return max(0, cast(value))
+    except (TypeError, ValueError):
+        return default
+
+
+@config_manager.subscribe
+def _on_config_change(config):
+    # 参数变化时丢弃旧池(忙碌中的进程在任务结束后退出),下次使用时按新参数重建
+    global _pool
+    conversion = config.get('conversion', {})
+    settings = {
+        'workers': _number(conversion.get('pdf_workers'), DEFAULT_WORKERS) or DEFAULT_WORKERS,
+        'queue_size': _number(conversion.get('pdf_queue_size'), DEFAULT_QUEUE_SIZE),
+        'timeout': _number(conversion.get('pdf_timeout'), DEFAULT_TIMEOUT, float) or DEFAULT_TIMEOUT,
+    }
+    with _pool_lock:
+        if _settings and settings != _settings and _pool is not None:
+            _pool.close()
+            _pool = None
+        _settings.update(settings)
+
+
+def get_pdf_pool():
+    """Return the process-wide PdfRenderPool, starting (and warming) its workers on first use."""
+    global _pool
+    if not _settings:
+        _on_config_change(config_manager.load_config())
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PdfRenderPool(**_settings)
+    return _pool
+
+
+def get_pdf_stats():
+    """Stats of the running pool, or None when no PDF has been rendered yet."""
+    pool = _pool
+    return pool.stats() if pool is not None else None
+
+
+def _reset_after_fork():
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
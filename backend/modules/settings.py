@@ -13,12 +13,17 @@ import platform
 import logging
 
 try:
-    from ..utils.config_manager import load_config, save_config, cleanup_expired_tokens, get_upload_dir
+    from ..utils.config_manager import load_config, edit_config, save_config, thaw, cleanup_expired_tokens, get_upload_dir
 except ImportError:
     try:
-        from utils.config_manager import load_config, save_config, cleanup_expired_tokens, get_upload_dir
+        from utils.config_manager import load_config, edit_config, save_config, thaw, cleanup_expired_tokens, get_upload_dir
     except ImportError:
-        from backend.utils.config_manager import load_config, save_config, cleanup_expired_tokens, get_upload_dir
+        from backend.utils.config_manager import load_config, edit_config, save_config, thaw, cleanup_expired_tokens, get_upload_dir
+
+try:
+    from .hash_tools import SUPPORTED_ALGORITHMS
+except ImportError:
+    from hash_tools import SUPPORTED_ALGORITHMS
 
 logger = logging.getLogger(__name__)
 settings_bp = Blueprint('settings', __name__)
@@ -41,8 +46,7 @@ def _get_version():
 
 @settings_bp.route('/config', methods=['GET'])
 def get_config():
-    config = load_config()
-    config = cleanup_expired_tokens(config)
+    config = cleanup_expired_tokens(thaw(load_config()))
 
     # Mask the access token for display
     response_config = {
@@ -63,7 +67,7 @@ def update_config():
     if not data:
         return jsonify({'success': False, 'error': 'No data provided'}), 400
 
-    config = load_config()
+    config = edit_config()
 
     # Update sections
     if 'storage' in data:
@@ -75,6 +79,19 @@ def update_config():
         if 'max_file_size_mb' in storage:
             # 上限 500MB,与 get_max_upload_bytes() / Flask MAX_CONTENT_LENGTH 保持一致
             config['storage']['max_file_size_mb'] = max(1, min(500, int(storage['max_file_size_mb'])))
+        if 'upload_digest' in storage:
+            # 上传时流式计算的摘要算法,须为 hash_tools 支持的算法
+            algo = str(storage['upload_digest']).lower()
+            if algo not in SUPPORTED_ALGORITHMS:
+                return jsonify({'success': False, 'error': f'Unsupported digest algorithm: {algo}'}), 400
+            config['storage']['upload_digest'] = algo
+        if 'scanner' in storage:
+            scanner = str(storage['scanner']).lower()
+            if scanner not in ('auto', 'clamd', 'defender', 'none'):
+                return jsonify({'success': False, 'error': f'Unsupported scanner: {scanner}'}), 400
+            config['storage']['scanner'] = scanner
+        if 'clamd_address' in storage:
+            config['storage']['clamd_address'] = str(storage['clamd_address'] or '')
 
     if 'security' in data:
         security = data['security']
@@ -88,7 +105,7 @@ def update_config():
 
 @settings_bp.route('/security/token', methods=['POST'])
 def refresh_token():
-    config = load_config()
+    config = edit_config()
     new_token = uuid.uuid4().hex
     config['security']['access_token'] = new_token
     save_config(config)
@@ -122,8 +139,7 @@ def create_temp_token():
     token = uuid.uuid4().hex[:16]
     expires_at = time.time() + expires_minutes * 60
 
-    config = load_config()
-    config = cleanup_expired_tokens(config)
+    config = cleanup_expired_tokens(edit_config())
 
     temp_entry = {
         'token': token,
@@ -150,7 +166,7 @@ def create_temp_token():
 
 @settings_bp.route('/security/temp-token/<token>', methods=['DELETE'])
 def delete_temp_token(token):
-    config = load_config()
+    config = edit_config()
     tokens = config.get('security', {}).get('temp_tokens', [])
     original_len = len(tokens)
     config['security']['temp_tokens'] = [t for t in tokens if t.get('token') != token]
@@ -0,0 +1,263 @@
+"""
+Upload storage helpers shared by the file-upload and IM endpoints.
+
+Multipart bodies are parsed with a custom stream factory so each file part
+is written straight into the upload folder while its size and digest are
+computed in the same pass. The digest is kept in the file index, so
+duplicate detection and integrity checks never have to re-read the file.
+
+Content is stored once per digest under ``_blobs/<algorithm>/<xx>/<digest>``;
+every visible name (``report.pdf``, ``im/<uuid>.png``) is a hard link to its
+blob, and a ``<digest>.refs`` record lists the names referencing it. The
+blob is removed when its last reference is released. ``.refs`` updates are
+serialised with a lock file (``_blobs/.lock``) so pre-forked worker
+processes sharing the folder cannot lose each other's references.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+
+from werkzeug.formparser import FormDataParser
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+try:
+    from .hash_tools import SUPPORTED_ALGORITHMS
+except ImportError:
+    from hash_tools import SUPPORTED_ALGORITHMS
+
+try:
+    from ..utils.path_safety import sanitize_filename
+except ImportError:
+    try:
+        from backend.utils.path_safety import sanitize_filename
+    except ImportError:
+        from utils.path_safety import sanitize_filename
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIGEST_ALGORITHM = 'sha256'
+INCOMING_DIRNAME = '_incoming'  # 上传中的临时分片,与最终文件同一文件系统,完成后 rename 即可
+BLOBS_DIRNAME = '_blobs'        # 内容寻址存储:相同内容只落盘一份
+
+
+def get_digest_algorithm(config=None):
+    """Return the configured upload digest algorithm (storage.upload_digest)."""
+    if config is None:
+        try:
+            from utils.config_manager import load_config
+        except ImportError:
+            try:
+                from backend.utils.config_manager import load_config
+            except ImportError:
+                load_config = None
+        config = load_config() if load_config else {}
+    algo = str(config.get('storage', {}).get('upload_digest', DEFAULT_DIGEST_ALGORITHM)).lower()
+    if algo not in SUPPORTED_ALGORITHMS:
+        logger.warning('Unsupported upload digest %r, falling back to %s', algo, DEFAULT_DIGEST_ALGORITHM)
+        algo = DEFAULT_DIGEST_ALGORITHM
+    return algo
+
+
+class HashingFileWriter:
+    """Write-only file object that hashes and counts bytes as they are written.
+
+    Used as the werkzeug stream factory result, so the multipart parser
+    writes each chunk directly into the destination directory.
+    """
+
+    def __init__(self, path, algorithm):
+        self.path = path
+        self.algorithm = algorithm
+        self.size = 0
+        self._hasher = SUPPORTED_ALGORITHMS[algorithm]()
+        self._fp = open(path, 'wb')
+
+    def write(self, data):
+        self._hasher.update(data)
+        self.size += len(data)
+        return self._fp.write(data)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        # werkzeug 在写完后 seek(0);文件已落盘,这里只需保证可调用
+        return self._fp.seek(offset, whence) if not self._fp.closed else 0
+
+    def tell(self):
+        return self.size
+
+    def flush(self):
+        if not self._fp.closed:
+            self._fp.flush()
+
+    def close(self):
+        if not self._fp.closed:
+            self._fp.close()
+
+    @property
+    def closed(self):
+        return self._fp.closed
+
+    def hexdigest(self):
+        return self._hasher.hexdigest()
+
+    def discard(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def incoming_dir(upload_folder):
+    path = os.path.join(upload_folder, INCOMING_DIRNAME)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def parse_streaming_upload(req, upload_folder, algorithm):
+    """Parse a multipart request, streaming every file part into *upload_folder*.
+
+    Returns (form, files) like request.form / request.files; each FileStorage's
+    ``stream`` is a closed HashingFileWriter holding path, size and digest.
+    """
+    target_dir = incoming_dir(upload_folder)
+    writers = []
+
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        writer = HashingFileWriter(
+            os.path.join(target_dir, f'{uuid.uuid4().hex}.part'), algorithm)
+        writers.append(writer)
+        return writer
+
+    parser = FormDataParser(
+        stream_factory=stream_factory,
+        max_form_memory_size=req.max_form_memory_size,
+        max_content_length=req.max_content_length,
+        silent=False,
+    )
+    try:
+        _, form, files = parser.parse(
+            req.stream, req.mimetype, req.content_length, req.mimetype_params)
+    except Exception:
+        for writer in writers:
+            writer.discard()
+        raise
+    for writer in writers:
+        writer.close()
+    return form, files
+
+
+# --- Content-addressed blob store ---
+
+_refs_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _refs_locked(upload_folder):
+    """Hold the blob-store lock across threads and processes for a .refs read-modify-write."""
+    lock_dir = os.path.join(upload_folder, BLOBS_DIRNAME)
+    os.makedirs(lock_dir, exist_ok=True)
+    with _refs_lock, open(os.path.join(lock_dir, '.lock'), 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK 约 10 秒后放弃,继续等
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def blob_path(upload_folder, algorithm, digest):
+    return os.path.join(upload_folder, BLOBS_DIRNAME, algorithm, digest[:2], digest)
+
+
+def _read_refs(refs_path):
+    try:
+        with open(refs_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def _write_refs(refs_path, refs):
+    tmp_path = refs_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(refs, f, ensure_ascii=False)
+    os.replace(tmp_path, refs_path)
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        # 不支持硬链接的文件系统(FAT/exFAT 等):退化为完整拷贝,功能不受影响
+        shutil.copyfile(src, dst)
+
+
+def store_blob(upload_folder, writer, final_path, ref_name):
+    """Commit a completed part under its digest and expose it at *final_path*.
+
+    ``ref_name`` is the reference recorded for the blob (path relative to the
+    upload folder). Returns True if identical content was already stored, in
+    which case the freshly written part is dropped and no extra space is used.
+    """
+    writer.close()
+    digest = writer.hexdigest()
+    blob = blob_path(upload_folder, writer.algorithm, digest)
+    with _refs_locked(upload_folder):
+        deduplicated = os.path.exists(blob)
+        if deduplicated:
+            os.remove(writer.path)
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.replace(writer.path, blob)
+        _link_or_copy(blob, final_path)
+        refs = _read_refs(blob + '.refs')
+        if ref_name not in refs:
+            refs.append(ref_name)
+            _write_refs(blob + '.refs', refs)
+    writer.path = final_path
+    return deduplicated
+
+
+def blob_refs(upload_folder, algorithm, digest):
+    """Names (relative to *upload_folder*) currently linked to the blob."""
+    with _refs_locked(upload_folder):
+        return _read_refs(blob_path(upload_folder, algorithm, digest) + '.refs')
+
+
+def release_blob(upload_folder, algorithm, digest, ref_name):
+    """Drop *ref_name* from the blob's references; delete the blob when unused."""
+    if not algorithm or not digest:
+        return
+    blob = blob_path(upload_folder, algorithm, digest)
+    with _refs_locked(upload_folder):
+        refs = [r for r in _read_refs(blob + '.refs') if r != ref_name]
+        if refs:
+            _write_refs(blob + '.refs', refs)
+            return
+        for path in (blob, blob + '.refs'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
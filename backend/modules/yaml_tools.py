@@ -1,4 +1,6 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
+import datetime
+import json
 import yaml
 from yaml import YAMLError
 import logging
@@ -8,6 +10,11 @@ try:
 except ImportError:
     from backend.utils.error_handler import safe_error
 
+try:
+    from . import json_codec
+except ImportError:
+    import json_codec
+
 logger = logging.getLogger(__name__)
 
 yaml_tools_bp = Blueprint('yaml_tools', __name__)
@@ -164,3 +171,150 @@ def json_to_yaml():
         }), 400
     except Exception as e:
         return safe_error(e)
+
+
+# --- Raw body ---
+#
+# 与 json-tools 的 /raw/* 相同:请求体即文档,选项放在查询参数中,
+# 结果作为原始响应体返回(YAML 由 PyYAML 直接编码为 UTF-8 字节)。
+
+YAML_MIMETYPE = 'application/yaml'
+
+
+def _raw_body(label):
+    body = request.get_data(cache=False)
+    if not body.strip():
+        raise ValueError(f'{label}文本不能为空')
+    return body
+
+
+def _indent_arg(allow_compact=False):
+    try:
+        indent = int(request.args.get('indent', 2))
+    except ValueError:
+        raise ValueError('indent 必须是整数')
+    if allow_compact and indent == 0:
+        return None
+    if not 1 <= indent <= 8:
+        raise ValueError('indent 取值范围为 1-8')
+    return indent
+
+
+def _json_default(value):
+    # YAML 时间戳 / !!set / !!binary 等 JSON 没有的类型
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _json_keys(value):
+    """Convert mapping keys JSON cannot hold (YAML dates, !!binary) to strings.
+
+    Must run before streaming: iter_dumps is lazy, and a key error raised
+    during iteration would truncate a response that already answered 200.
+    """
+    if isinstance(value, dict):
+        return {key if isinstance(key, (str, int, float, bool)) or key is None else _json_default(key):
+                _json_keys(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_json_keys(item) for item in value]
+    return value
+
+
+@yaml_tools_bp.route('/raw/format', methods=['POST'])
+def format_yaml_raw():
+    """格式化YAML(原始请求体,?indent=2)"""
+    try:
+        try:
+            indent = _indent_arg()
+            parsed_yaml = yaml.safe_load(_raw_body('YAML'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        formatted = yaml.dump(parsed_yaml, default_flow_style=False, allow_unicode=True,
+                              indent=indent, encoding='utf-8')
+        return Response(formatted, mimetype=YAML_MIMETYPE)
+    except YAMLError as e:
+        return jsonify({'error': f'YAML格式错误: {str(e)}'}), 400
+    except Exception as e:
+        return safe_error(e)
+
+
+@yaml_tools_bp.route('/raw/minify', methods=['POST'])
+def minify_yaml_raw():
+    """压缩YAML(原始请求体)"""
+    try:
+        try:
+            parsed_yaml = yaml.safe_load(_raw_body('YAML'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        minified = yaml.dump(parsed_yaml, default_flow_style=True, allow_unicode=True, encoding='utf-8')
+        return Response(minified, mimetype=YAML_MIMETYPE)
+    except YAMLError as e:
+        return jsonify({'error': f'YAML格式错误: {str(e)}'}), 400
+    except Exception as e:
+        return safe_error(e)
+
+
+@yaml_tools_bp.route('/raw/validate', methods=['POST'])
+def validate_yaml_raw():
+    """验证YAML格式(原始请求体;不回传解析结果)"""
+    try:
+        try:
+            body = _raw_body('YAML')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        try:
+            yaml.safe_load(body)
+        except YAMLError as e:
+            return jsonify({
+                'success': True,
+                'valid': False,
+                'error': f'YAML格式错误: {str(e)}'
+            }), 200
+        return jsonify({
+            'success': True,
+            'valid': True,
+            'message': 'YAML格式正确',
+            'length': len(body.decode('utf-8', 'replace'))
+        }), 200
+    except Exception as e:
+        return safe_error(e)
+
+
+@yaml_tools_bp.route('/raw/to-json', methods=['POST'])
+def yaml_to_json_raw():
+    """YAML转JSON(原始请求体,?indent=2;indent=0 输出紧凑JSON)"""
+    try:
+        try:
+            indent = _indent_arg(allow_compact=True)
+            parsed_yaml = _json_keys(yaml.safe_load(_raw_body('YAML')))
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': str(e)}), 400
+        return Response(json_codec.iter_dumps(parsed_yaml, indent=indent, default=_json_default),
+                        mimetype='application/json')
+    except YAMLError as e:
+        return jsonify({'error': f'YAML格式错误: {str(e)}'}), 400
+    except Exception as e:
+        return safe_error(e)
+
+
+@yaml_tools_bp.route('/raw/from-json', methods=['POST'])
+def json_to_yaml_raw():
+    """JSON转YAML(原始请求体,?indent=2)"""
+    try:
+        try:
+            indent = _indent_arg()
+            parsed_json, _ = json_codec.loads(_raw_body('JSON'))
+        except json.JSONDecodeError as e:
+            return jsonify({'error': f'JSON格式错误: {str(e)}', 'position': e.pos}), 400
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        yaml_output = yaml.dump(parsed_json, default_flow_style=False, allow_unicode=True,
+                                indent=indent, encoding='utf-8')
+        return Response(yaml_output, mimetype=YAML_MIMETYPE)
+    except Exception as e:
+        return safe_error(e)
@@ -1,8 +1,26 @@
 import os
 import sys
 
+import pytest
+
 # 让测试可以用 `from utils.xxx` / `from modules.xxx` 导入后端模块
 # (与后端从 backend/ 目录运行时的 import 路径一致)
 BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if BACKEND_DIR not in sys.path:
     sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture
+def make_upload_client():
+    """Factory: a test client serving only the file-upload blueprint from *upload_dir*."""
+    from flask import Flask
+    from modules.file_upload import file_upload_bp
+
+    def make(upload_dir, socketio=None):
+        app = Flask(__name__)
+        app.config['UPLOAD_FOLDER'] = upload_dir
+        if socketio is not None:
+            app.config['SOCKETIO'] = socketio
+        app.register_blueprint(file_upload_bp, url_prefix='/api/file-upload')
+        return app.test_client()
+    return make
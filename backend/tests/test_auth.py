@@ -0,0 +1,48 @@
+"""Token 认证快照:免认证路径 / 临时 token 哈希索引 / 配置变更后快照重建。"""
+import pathlib
+import time
+import utils.config_manager as cm
+import utils.auth as auth
+
+
+def _isolate_config(monkeypatch, tmp_path):
+    monkeypatch.setattr(cm, 'get_config_path',
+                        lambda: pathlib.Path(str(tmp_path)) / 'test_config.json')
+    cm._config_cache = None
+    cm._config_mtime = None
+    auth._snapshot = None
+
+
+def test_exempt_paths():
+    assert auth.is_exempt_path('/assets/index-abc.js')
+    assert auth.is_exempt_path('/socket.io/')
+    assert auth.is_exempt_path('/favicon.ico')
+    assert auth.is_exempt_path('/api/data-conversion/styles/0123456789abcdef.css')
+    assert not auth.is_exempt_path('/api/json-tools/format')
+    assert not auth.is_exempt_path('/')
+
+
+def test_verify_access_and_temp_tokens(monkeypatch, tmp_path):
+    _isolate_config(monkeypatch, tmp_path)
+    cfg = cm.edit_config()
+    cfg['security']['temp_tokens'] = [
+        {'token': 'live', 'expires_at': time.time() + 600},
+        {'token': 'dead', 'expires_at': time.time() - 1},
+    ]
+    cm.save_config(cfg)
+    assert auth.verify_token('secret', 'secret') == 'access'
+    assert auth.verify_token('live', 'secret') == 'temp'
+    assert auth.verify_token('dead', 'secret') is None
+    assert auth.verify_token(None, 'secret') is None
+
+
+def test_snapshot_reused_until_config_changes(monkeypatch, tmp_path):
+    _isolate_config(monkeypatch, tmp_path)
+    snap1 = auth.get_token_snapshot()
+    assert auth.get_token_snapshot() is snap1  # 配置未变,复用同一快照
+    cfg = cm.edit_config()
+    cfg['security']['token_enabled'] = False
+    cm.save_config(cfg)
+    snap2 = auth.get_token_snapshot()
+    assert snap2 is not snap1
+    assert snap2.token_enabled is False
@@ -1,5 +1,7 @@
 """配置管理:get_max_upload_bytes 上限统一 + load_config/save_config 缓存。"""
 import pathlib
+import sys
+import pytest
 import shutil
 import tempfile
 import utils.config_manager as cm
@@ -20,7 +22,7 @@ def test_get_max_upload_bytes_default(monkeypatch, tmp_path):
 
 def test_get_max_upload_bytes_clamped(monkeypatch, tmp_path):
     _isolate_config(monkeypatch, tmp_path)
-    cfg = cm.load_config()
+    cfg = cm.edit_config()
     cfg['storage']['max_file_size_mb'] = 100
     assert cm.get_max_upload_bytes(cfg) == 100 * 1024 * 1024
     cfg['storage']['max_file_size_mb'] = 99999  # 超上限钳到 500
@@ -31,20 +33,68 @@ def test_get_max_upload_bytes_clamped(monkeypatch, tmp_path):
 
 def test_save_config_refreshes_cache(monkeypatch, tmp_path):
     _isolate_config(monkeypatch, tmp_path)
-    cfg = cm.load_config()
+    cfg = cm.edit_config()
     cfg['storage']['max_file_size_mb'] = 77
     assert cm.save_config(cfg)
     cfg2 = cm.load_config()
     assert cfg2['storage']['max_file_size_mb'] == 77
 
 
-def test_cache_returns_deepcopy_isolation(monkeypatch, tmp_path):
-    """返回的缓存副本被修改,不应污染内部缓存。"""
+def test_load_config_is_readonly_view_without_copy(monkeypatch, tmp_path):
+    """load_config 返回只读视图:命中缓存时是同一对象,且不可被篡改。"""
     _isolate_config(monkeypatch, tmp_path)
     cfg = cm.load_config()
+    assert cm.load_config() is cfg  # 命中缓存,零拷贝
+    with pytest.raises(TypeError):
+        cfg['storage']['max_file_size_mb'] = 999
+
+
+def test_edit_config_copy_isolation(monkeypatch, tmp_path):
+    """edit_config 返回的可变副本被修改但未保存,不应污染内部缓存。"""
+    _isolate_config(monkeypatch, tmp_path)
+    cfg = cm.edit_config()
     cfg['storage']['max_file_size_mb'] = 77
     cm.save_config(cfg)
-    cfg2 = cm.load_config()  # 命中缓存
+    cfg2 = cm.edit_config()
     cfg2['storage']['max_file_size_mb'] = 999  # 篡改副本
-    cfg3 = cm.load_config()
-    assert cfg3['storage']['max_file_size_mb'] == 77  # 缓存未被污染
+    assert cm.load_config()['storage']['max_file_size_mb'] == 77  # 缓存未被污染
+
+
+def test_subscribers_notified_on_save(monkeypatch, tmp_path):
+    _isolate_config(monkeypatch, tmp_path)
+    seen = []
+    monkeypatch.setattr(cm, '_subscribers', [])
+    cm.subscribe(lambda view: seen.append(view['storage']['max_file_size_mb']))
+    cfg = cm.edit_config()
+    cfg['storage']['max_file_size_mb'] = 88
+    cm.save_config(cfg)
+    assert seen[-1] == 88
+
+
+def _wait_for(predicate, timeout=3.0):
+    import time
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.mark.parametrize('use_inotify', [True, False])
+def test_watcher_picks_up_external_edit(monkeypatch, tmp_path, use_inotify):
+    """监视线程运行时热路径不 stat,但外部直接改文件仍能被感知。"""
+    import json
+    _isolate_config(monkeypatch, tmp_path)
+    cfg = cm.edit_config()
+    cfg['storage']['max_file_size_mb'] = 10
+    cm.save_config(cfg)
+    watcher = cm.start_config_watcher(poll_interval=0.05, use_inotify=use_inotify)
+    try:
+        assert cm.load_config()['storage']['max_file_size_mb'] == 10
+        cfg['storage']['max_file_size_mb'] = 42
+        (tmp_path / 'test_config.json').write_text(json.dumps(cfg), encoding='utf-8')
+        assert _wait_for(lambda: cm.load_config()['storage']['max_file_size_mb'] == 42)
+    finally:
+        cm.stop_config_watcher()
+    assert watcher.mode == ('inotify' if use_inotify and sys.platform.startswith('linux') else 'poll')
@@ -0,0 +1,94 @@
+"""转换结果缓存:内存 LRU + 磁盘层,并发未命中只渲染一次,预览接口返回 X-Cache。"""
+import os
+import stat
+import threading
+import time
+
+import pytest
+
+from flask import Flask
+
+import modules.conversion_cache as conversion_cache
+from modules.conversion_cache import ConversionCache, cache_key
+from modules.data_conversion import data_conversion_bp
+
+
+def test_memory_lru_and_disk_tier(tmp_path):
+    cache = ConversionCache(str(tmp_path), memory_bytes=40, disk_bytes=25)
+    for name in 'abc':
+        cache.put(cache_key('t', name), name.encode() * 10)
+
+    # 内存只容得下 4 条 10 字节结果;磁盘 25 字节只留最近两条
+    stats = cache.stats()
+    assert stats['memory_entries'] == 3 and stats['disk_entries'] == 2
+    assert stats['disk_evictions'] == 1
+
+    cache.get(cache_key('t', 'a'))  # a 变为最近使用
+    cache.put(cache_key('t', 'd'), b'd' * 10)
+    cache.put(cache_key('t', 'e'), b'e' * 10)
+    assert cache.stats()['memory_evictions'] == 1
+    assert cache._memory.get(cache_key('t', 'b')) is None
+    assert cache._memory.get(cache_key('t', 'a')) == b'a' * 10
+
+    # 新实例(如重启或另一个工作进程)从磁盘命中
+    other = ConversionCache(str(tmp_path), memory_bytes=40, disk_bytes=25)
+    assert other.get(cache_key('t', 'e')) == b'e' * 10
+    assert other.get(cache_key('t', 'a')) is None
+    assert other.stats()['disk_hits'] == 1
+
+
+def test_concurrent_misses_render_once(tmp_path):
+    cache = ConversionCache(str(tmp_path), memory_bytes=1 << 20, disk_bytes=0)
+    calls = []
+
+    def render():
+        calls.append(1)
+        time.sleep(0.1)
+        return b'pdf'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_render('k' * 64, render)))
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert sorted(hit for _, hit in results) == [False, True, True, True]
+    assert all(data == b'pdf' for data, _ in results)
+
+
+def test_preview_is_served_from_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(conversion_cache, '_cache', ConversionCache(str(tmp_path), 1 << 20, 1 << 20))
+    app = Flask(__name__)
+    app.register_blueprint(data_conversion_bp, url_prefix='/api/data-conversion')
+    client = app.test_client()
+
+    first = client.post('/api/data-conversion/preview-md', json={'markdown_text': '# Title\n\nbody'})
+    second = client.post('/api/data-conversion/preview-md', json={'markdown_text': '# Title\n\nbody'})
+    assert first.headers['X-Cache'] == 'MISS' and second.headers['X-Cache'] == 'HIT'
+    assert first.data == second.data and b'<h1>Title</h1>' in first.data
+
+    stats = client.get('/api/data-conversion/cache/stats').get_json()['stats']
+    assert stats['misses'] == 1 and stats['memory_hits'] == 1 and stats['hit_rate'] == 0.5
+
+
+def test_disk_tier_requires_private_directory(tmp_path, monkeypatch):
+    if not hasattr(os, 'getuid'):
+        pytest.skip('POSIX ownership checks')
+    shared = tmp_path / 'shared'
+    shared.mkdir(mode=0o777)
+    os.chmod(shared, 0o777)
+    assert ConversionCache(str(shared), 1 << 20, 1 << 20).disk_bytes
+    assert stat.S_IMODE(os.stat(shared).st_mode) == 0o700  # 自己的目录:收紧权限后使用
+
+    link = tmp_path / 'link'
+    link.symlink_to(shared)
+    assert ConversionCache(str(link), 1 << 20, 1 << 20).disk_bytes == 0
+
+    monkeypatch.setattr(os, 'getuid', lambda: os.stat(shared).st_uid + 1)  # 目录属于他人
+    cache = ConversionCache(str(shared), 1 << 20, 1 << 20)
+    assert cache.disk_bytes == 0
+    cache.put('k' * 64, b'data')
+    assert not any(files for _, _, files in os.walk(shared))
@@ -0,0 +1,42 @@
+"""预览样式表:按内容哈希只拼装一次,预览响应链接样式表而非内联,样式表可长期缓存。"""
+from flask import Flask
+
+import modules.conversion_cache as conversion_cache
+import modules.markdown_tools  # noqa: F401  注册 markdown-tools 样式包
+from modules.conversion_cache import ConversionCache
+from modules.data_conversion import data_conversion_bp
+from modules.data_conversion_styles import get_bundle, get_preview_css
+
+
+def _client(tmp_path, monkeypatch):
+    monkeypatch.setattr(conversion_cache, '_cache', ConversionCache(str(tmp_path), 1 << 20, 0))
+    app = Flask(__name__)
+    app.register_blueprint(data_conversion_bp, url_prefix='/api/data-conversion')
+    return app.test_client()
+
+
+def test_preview_links_hashed_stylesheet(tmp_path, monkeypatch):
+    client = _client(tmp_path, monkeypatch)
+    bundle = get_bundle('preview')
+    assert bundle is get_bundle('preview') and bundle.css == get_preview_css()
+
+    linked = client.post('/api/data-conversion/preview-md', json={'markdown_text': '# Hi'}).get_json()
+    assert linked['stylesheet'] == bundle.url
+    assert f'<link rel="stylesheet" href="{bundle.url}">' in linked['html'] and '<style>' not in linked['html']
+
+    inline = client.post('/api/data-conversion/preview-md',
+                         json={'markdown_text': '# Hi', 'inline_css': True}).get_json()
+    assert bundle.css in inline['html']
+    assert len(linked['html']) < len(inline['html']) - len(bundle.css) // 2
+
+
+def test_stylesheet_is_served_with_immutable_caching(tmp_path, monkeypatch):
+    client = _client(tmp_path, monkeypatch)
+    bundle = get_bundle('markdown-tools')
+    r = client.get(bundle.url)
+    assert r.status_code == 200 and r.mimetype == 'text/css'
+    assert r.data.decode('utf-8') == bundle.css
+    assert 'immutable' in r.headers['Cache-Control']
+
+    assert client.get(bundle.url, headers={'If-None-Match': r.headers['ETag']}).status_code == 304
+    assert client.get('/api/data-conversion/styles/0000000000000000.css').status_code == 404
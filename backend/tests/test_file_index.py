@@ -0,0 +1,94 @@
+"""文件列表索引:分页 / 排序,以及对外部新增、删除文件的惰性对账。"""
+import hashlib
+import io
+import os
+from modules.file_index import get_file_index
+from modules.upload_store import blob_path
+
+
+def _upload(client, content, name):
+    client.post('/api/file-upload/upload',
+                data={'files': (io.BytesIO(content), name)},
+                content_type='multipart/form-data')
+
+
+def test_listing_paginates_and_sorts(tmp_path, make_upload_client):
+    client = make_upload_client(str(tmp_path))
+    for i, name in enumerate(['b.txt', 'a.txt', 'c.txt']):
+        _upload(client, b'x' * (i + 1), name)
+
+    data = client.get('/api/file-upload/files?sort=name&offset=1&limit=1').get_json()
+    assert data['total'] == 3
+    assert [f['name'] for f in data['files']] == ['b.txt']
+
+    data = client.get('/api/file-upload/files?sort=-size').get_json()
+    assert [f['name'] for f in data['files']] == ['c.txt', 'a.txt', 'b.txt']
+    assert all(f['digest'] for f in data['files'])
+
+    # 默认按上传时间倒序,且不传 limit 时返回全部
+    data = client.get('/api/file-upload/files').get_json()
+    assert [f['name'] for f in data['files']] == ['c.txt', 'a.txt', 'b.txt']
+    assert data['limit'] is None
+
+
+def test_listing_reconciles_external_changes(tmp_path, make_upload_client):
+    client = make_upload_client(str(tmp_path))
+    _upload(client, b'indexed', 'kept.txt')
+    _upload(client, b'gone', 'gone.txt')
+    client.get('/api/file-upload/files')
+
+    (tmp_path / 'external.txt').write_bytes(b'dropped in by hand')
+    os.remove(tmp_path / 'gone.txt')
+
+    data = client.get('/api/file-upload/files?sort=name').get_json()
+    assert [f['name'] for f in data['files']] == ['external.txt', 'kept.txt']
+    assert data['files'][0]['size'] == len(b'dropped in by hand')
+    assert get_file_index(str(tmp_path)).get('gone.txt') is None
+    # 被外部删除的文件对账时释放 blob 引用
+    assert not os.path.exists(blob_path(str(tmp_path), 'sha256', hashlib.sha256(b'gone').hexdigest()))
+
+
+def test_ebook_title_extracted_once_and_cached(tmp_path, monkeypatch, make_upload_client):
+    import zipfile
+    import modules.file_upload as fu
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as z:
+        z.writestr('META-INF/container.xml',
+                   '<container xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+                   '<rootfiles><rootfile full-path="content.opf"/></rootfiles></container>')
+        z.writestr('content.opf',
+                   '<package xmlns="http://www.idpf.org/2007/opf"><metadata '
+                   'xmlns:dc="http://purl.org/dc/elements/1.1/"><dc:title>索引之书</dc:title>'
+                   '</metadata><manifest/></package>')
+    from modules.media_jobs import get_media_jobs
+    calls = []
+    real = fu.get_ebook_metadata
+    monkeypatch.setattr(fu, 'get_ebook_metadata', lambda *a: calls.append(a) or real(*a))
+
+    client = make_upload_client(str(tmp_path))
+    _upload(client, buf.getvalue(), 'book.epub')
+    # 上传后封面在后台提取,完成后列表直接读索引
+    assert get_media_jobs().wait_idle(timeout=10)
+    for _ in range(2):
+        entry = client.get('/api/file-upload/files').get_json()['files'][0]
+        assert entry['title'] == '索引之书'
+        assert 'coverUrl' not in entry and 'coverStatus' not in entry
+    assert len(calls) == 1
+
+
+def test_old_index_gains_scan_columns(tmp_path):
+    import sqlite3
+    from modules.file_index import FileIndex, INDEX_RELPATH
+    os.makedirs(tmp_path / '_meta')
+    conn = sqlite3.connect(tmp_path / INDEX_RELPATH)
+    conn.execute('CREATE TABLE files (name TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime REAL NOT NULL, '
+                 'title TEXT, cover INTEGER, digest TEXT, digest_algorithm TEXT, '
+                 'original_name TEXT, uploaded_at REAL)')
+    conn.execute("INSERT INTO files (name, size, mtime) VALUES ('old.txt', 1, 1.0)")
+    conn.commit()
+    conn.close()
+
+    index = FileIndex(str(tmp_path))
+    index.update('old.txt', scan_status='clean')
+    assert index.get('old.txt')['scan_status'] == 'clean'
+    index.close()
@@ -3,6 +3,7 @@
 守护用户的核心硬要求:文件内容绝对不能被损坏或篡改。
 """
 import io
+import os
 import hashlib
 from flask import Flask
 from modules.file_upload import file_upload_bp
@@ -59,3 +60,20 @@ def test_duplicate_upload_keeps_extension_and_integrity(tmp_path):
     assert r2.get_json()['files'][0]['unique_name'] == '重复文件_1.dat'
     downloaded = client.get('/api/file-upload/files/重复文件_1.dat').data
     assert _sha(downloaded) == _sha(original)
+
+
+def test_upload_digest_computed_in_single_pass(tmp_path):
+    """上传响应与元数据中的摘要必须等于原始内容的 sha256,且不残留临时分片。"""
+    from modules.upload_store import INCOMING_DIRNAME
+    from modules.file_index import get_file_index
+    client = _client(str(tmp_path))
+    original = bytes(range(256)) * 4096  # 1MB,超过 werkzeug 内存缓冲阈值
+    r = client.post('/api/file-upload/upload',
+                    data={'files': (io.BytesIO(original), '摘要.bin')},
+                    content_type='multipart/form-data')
+    entry = r.get_json()['files'][0]
+    assert entry['digest'] == _sha(original)
+    assert entry['size'] == len(original)
+    meta = get_file_index(str(tmp_path)).get('摘要.bin')
+    assert meta['digest'] == _sha(original) and meta['digest_algorithm'] == 'sha256'
+    assert not os.listdir(tmp_path / INCOMING_DIRNAME)
@@ -0,0 +1,89 @@
+"""下载路径:摘要强 ETag、304 条件请求、Range/206 与缓存策略。"""
+import hashlib
+import os
+import io
+from flask import Flask
+
+
+def test_etag_is_content_digest_and_revalidates(tmp_path, make_upload_client):
+    client = make_upload_client(str(tmp_path))
+    content = b'0123456789' * 1000
+    client.post('/api/file-upload/upload',
+                data={'files': (io.BytesIO(content), 'clip.bin')},
+                content_type='multipart/form-data')
+
+    r = client.get('/api/file-upload/files/clip.bin')
+    assert r.status_code == 200 and r.data == content
+    assert r.headers['ETag'] == f'"{hashlib.sha256(content).hexdigest()}"'
+    assert 'no-cache' in r.headers['Cache-Control']
+    assert r.headers['Accept-Ranges'] == 'bytes'
+
+    first = r
+    r = client.get('/api/file-upload/files/clip.bin', headers={'If-None-Match': first.headers['ETag']})
+    assert r.status_code == 304 and not r.data
+    r = client.get('/api/file-upload/files/clip.bin',
+                   headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert r.status_code == 304
+
+
+def test_range_requests_return_partial_content(tmp_path, make_upload_client):
+    client = make_upload_client(str(tmp_path))
+    content = bytes(range(256)) * 40
+    client.post('/api/file-upload/upload',
+                data={'files': (io.BytesIO(content), 'video.mp4')},
+                content_type='multipart/form-data')
+
+    r = client.get('/api/file-upload/files/video.mp4', headers={'Range': 'bytes=100-199'})
+    assert r.status_code == 206
+    assert r.data == content[100:200]
+    assert r.headers['Content-Range'] == f'bytes 100-199/{len(content)}'
+
+    r = client.get('/api/file-upload/files/video.mp4', headers={'Range': f'bytes={len(content) + 10}-'})
+    assert r.status_code == 416
+
+
+def test_im_files_are_immutable_with_digest_etag(tmp_path, monkeypatch):
+    import modules.im as im
+    monkeypatch.setattr(im, '_get_upload_dir', lambda: str(tmp_path / 'im'))
+    (tmp_path / 'im').mkdir()
+    app = Flask(__name__)
+    app.register_blueprint(im.im_bp, url_prefix='/api/im')
+    client = app.test_client()
+    content = b'voice memo' * 100
+    url = client.post('/api/im/upload',
+                      data={'file': (io.BytesIO(content), 'memo.ogg', 'audio/ogg')},
+                      content_type='multipart/form-data').get_json()['url']
+
+    r = client.get(url)
+    assert r.data == content
+    assert r.headers['ETag'] == f'"{hashlib.sha256(content).hexdigest()}"'
+    assert 'immutable' in r.headers['Cache-Control']
+    assert client.get('/api/im/files/_meta/index.sqlite3').status_code == 404
+
+
+def test_sendfile_path_under_dev_server(tmp_path, monkeypatch, make_upload_client):
+    """内置 werkzeug 服务器下走 socket.sendfile;完整下载与 Range 内容都必须一致。"""
+    import threading
+    import urllib.request
+    from werkzeug.serving import make_server
+    import modules.file_serving as fs
+    bodies = []
+    real_init = fs._SendfileBody.__init__
+    monkeypatch.setattr(fs._SendfileBody, '__init__',
+                        lambda self, *a: bodies.append(a[2:]) or real_init(self, *a))
+    content = os.urandom(3 * 1024 * 1024 + 17)
+    (tmp_path / 'big.bin').write_bytes(content)
+    app = make_upload_client(str(tmp_path)).application
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}/api/file-upload/files/big.bin'
+    try:
+        with urllib.request.urlopen(base) as r:
+            assert r.read() == content
+        req = urllib.request.Request(base, headers={'Range': 'bytes=1000000-2999999'})
+        with urllib.request.urlopen(req) as r:
+            assert r.status == 206
+            assert r.read() == content[1000000:3000000]
+        assert bodies == [(0, len(content)), (1000000, 2000000)]
+    finally:
+        server.shutdown()
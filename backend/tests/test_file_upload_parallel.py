@@ -0,0 +1,60 @@
+"""多文件上传:逐文件落盘/扫描/建索引并行执行,超时的文件单独报告并清理。"""
+import io
+import os
+import threading
+import time
+
+import modules.file_upload as file_upload
+
+
+def _upload(client, *files):
+    return client.post('/api/file-upload/upload',
+                       data={'files': [(io.BytesIO(content), name) for name, content in files]},
+                       content_type='multipart/form-data').get_json()
+
+
+def test_slow_scans_run_in_parallel(tmp_path, monkeypatch, make_upload_client):
+    # 4 个扫描都进入后才一起放行:串行执行时屏障等不齐,超时后扫描失败
+    barrier = threading.Barrier(4, timeout=10)
+
+    def slow_scan(filepath):
+        barrier.wait()
+        return {'safe': True, 'warning': None}
+    monkeypatch.setattr(file_upload, 'scan_file', slow_scan)
+
+    client = make_upload_client(str(tmp_path))
+    result = _upload(client, *[(f'f{i}.bin', bytes([i]) * 100) for i in range(4)])
+
+    assert [f['unique_name'] for f in result['files']] == ['f0.bin', 'f1.bin', 'f2.bin', 'f3.bin']
+    assert not barrier.broken
+
+
+def test_same_name_in_one_request_gets_distinct_names(tmp_path, make_upload_client):
+    result = _upload(make_upload_client(str(tmp_path)), ('a.txt', b'one'), ('a.txt', b'two'), ('a.txt', b'three'))
+    names = [f['unique_name'] for f in result['files']]
+    assert names == ['a.txt', 'a_1.txt', 'a_2.txt']
+    assert [(tmp_path / n).read_bytes() for n in names] == [b'one', b'two', b'three']
+
+
+def test_timed_out_file_is_reported_and_removed(tmp_path, monkeypatch, make_upload_client):
+    release = threading.Event()
+
+    def scan(filepath):
+        if filepath.endswith('stuck.bin'):
+            release.wait(5)
+        return {'safe': True, 'warning': None}
+    monkeypatch.setattr(file_upload, 'scan_file', scan)
+    monkeypatch.setattr(file_upload, 'UPLOAD_FILE_TIMEOUT', 0.2)
+    client = make_upload_client(str(tmp_path))
+
+    result = _upload(client, ('ok.bin', b'fine'), ('stuck.bin', b'slow'))
+    assert [f['unique_name'] for f in result['files']] == ['ok.bin']
+    assert result['warnings'] == ['stuck.bin: processing timed out']
+
+    release.set()  # 扫描结束后由工作线程删除已放弃的文件
+    deadline = time.time() + 2
+    while os.path.exists(tmp_path / 'stuck.bin') and time.time() < deadline:
+        time.sleep(0.01)
+    assert not os.path.exists(tmp_path / 'stuck.bin')
+    names = [f['name'] for f in client.get('/api/file-upload/files').get_json()['files']]
+    assert names == ['ok.bin']
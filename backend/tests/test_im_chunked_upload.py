@@ -0,0 +1,105 @@
+"""IM 分片可续传上传:init / 乱序追加 / 分片摘要 / 断点续传 / complete"""
+import hashlib
+import os
+
+import pytest
+from flask import Flask
+
+import modules.im as im
+from modules.chunked_upload import ChunkedUploads, ChunkedUploadError
+
+
+def _client(tmp_path, monkeypatch, max_bytes=1024 * 1024):
+    monkeypatch.setattr(im, '_get_upload_dir', lambda: str(tmp_path / 'im'))
+    monkeypatch.setitem(im._im_settings, 'max_bytes', max_bytes)
+    monkeypatch.setitem(im._im_settings, 'max_chunked_bytes', 4 * max_bytes)
+    (tmp_path / 'im').mkdir()
+    app = Flask(__name__)
+    app.register_blueprint(im.im_bp, url_prefix='/api/im')
+    return app.test_client()
+
+
+def _sha256(data):
+    return 'sha256:' + hashlib.sha256(data).hexdigest()
+
+
+def test_out_of_order_chunks_resume_and_complete(tmp_path, monkeypatch):
+    client = _client(tmp_path, monkeypatch)
+    content = os.urandom(2500)
+    init = client.post('/api/im/upload/init', json={
+        'filename': 'clip.bin', 'size': len(content), 'mime': 'application/octet-stream',
+        'chunkSize': 1000, 'digest': _sha256(content),
+    }).get_json()
+    upload_id = init['uploadId']
+    assert (init['offset'], init['chunkSize']) == (0, 1000)
+    assert os.path.getsize(tmp_path / '_incoming' / f'{upload_id}.part') == len(content)  # 预分配
+
+    r = client.put(f'/api/im/upload/{upload_id}?offset=1000', data=content[1000:2000],
+                   headers={'X-Chunk-Digest': _sha256(content[1000:2000])})
+    assert r.get_json()['offset'] == 0  # 只确认从 0 开始的连续前缀
+    assert client.post(f'/api/im/upload/{upload_id}/complete').status_code == 409
+
+    client.put(f'/api/im/upload/{upload_id}?offset=0', data=content[:1000])
+    status = client.get(f'/api/im/upload/{upload_id}').get_json()
+    assert (status['offset'], status['ranges']) == (2000, [[0, 2000]])
+
+    client.put(f'/api/im/upload/{upload_id}?offset=2000', data=content[2000:])
+    done = client.post(f'/api/im/upload/{upload_id}/complete').get_json()
+    assert (done['filename'], done['size']) == ('clip.bin', len(content))
+    r = client.get(done['url'])
+    assert r.data == content
+    assert r.headers['ETag'] == f'"{hashlib.sha256(content).hexdigest()}"'
+    assert os.listdir(tmp_path / '_incoming') == []
+    assert client.get(f'/api/im/upload/{upload_id}').status_code == 404
+
+
+def test_corrupt_or_oversized_chunks_are_rejected(tmp_path, monkeypatch):
+    client = _client(tmp_path, monkeypatch, max_bytes=1024 * 1024)
+    upload_id = client.post('/api/im/upload/init', json={
+        'filename': 'a.bin', 'size': 3 * 1024 * 1024,
+    }).get_json()['uploadId']
+
+    r = client.put(f'/api/im/upload/{upload_id}?offset=0', data=b'x' * 10,
+                   headers={'X-Chunk-Digest': _sha256(b'y' * 10)})
+    assert r.status_code == 422
+    assert client.put(f'/api/im/upload/{upload_id}?offset=0',
+                      data=b'x' * (1024 * 1024 + 1)).status_code == 413  # 分片上限跟随单次上传上限
+    assert client.put(f'/api/im/upload/{upload_id}?offset={3 * 1024 * 1024 - 1}',
+                      data=b'xx').status_code == 416
+    assert client.get(f'/api/im/upload/{upload_id}').get_json()['offset'] == 0
+
+    assert client.post('/api/im/upload/init', json={
+        'filename': 'huge.bin', 'size': 5 * 1024 * 1024}).status_code == 413
+    assert client.get('/api/im/upload/../../etc').status_code == 404
+    assert client.delete(f'/api/im/upload/{upload_id}').get_json()['success']
+    assert os.listdir(tmp_path / '_incoming') == []
+
+
+def test_session_survives_restart_and_checks_full_digest(tmp_path):
+    store = ChunkedUploads(str(tmp_path))
+    content = b'hello chunked world'
+    upload_id = store.init('note.txt', len(content), max_size=1024, algorithm='sha256',
+                           digest=_sha256(b'something else'))['uploadId']
+    store.append(upload_id, 0, content[:5])
+
+    restarted = ChunkedUploads(str(tmp_path))  # 新进程:状态从磁盘恢复
+    assert restarted.get(upload_id)['offset'] == 5
+    restarted.append(upload_id, 5, content[5:])
+    with pytest.raises(ChunkedUploadError) as excinfo:
+        restarted.complete(upload_id)
+    assert excinfo.value.status == 422
+    assert os.listdir(tmp_path / '_incoming') == []
+
+
+def test_rewritten_chunk_invalidates_incremental_digest(tmp_path):
+    store = ChunkedUploads(str(tmp_path))
+    first, final = b'A' * 8 + b'tail', b'B' * 8 + b'tail'
+    upload_id = store.init('x.bin', len(first), max_size=1024, algorithm='sha256')['uploadId']
+    store.append(upload_id, 0, first[:8])
+    store.append(upload_id, 8, first[8:])
+    store.append(upload_id, 0, final[:8])  # 已计入摘要的分片被不同内容覆盖
+
+    part, _ = store.complete(upload_id)
+    assert part.hexdigest() == hashlib.sha256(final).hexdigest()
+    with open(part.path, 'rb') as f:
+        assert f.read() == final
@@ -0,0 +1,127 @@
+"""IM 在线状态后端与跨进程 Socket.IO 消息队列"""
+import threading
+
+import pytest
+
+from modules.im_presence import (InProcessPresence, PresenceBackend, SQLitePresence,
+                                 SQLiteQueueManager, create_im_backend)
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def presence(request, tmp_path):
+    if request.param == 'memory':
+        return InProcessPresence()
+    return SQLitePresence(str(tmp_path / 'im.sqlite3'), reset=True)
+
+
+def _kinds(*deltas):
+    return [(d['seq'], d['type']) if d else None for d in deltas]
+
+
+def test_incomplete_backend_fails_on_creation():
+    class Partial(PresenceBackend):
+        def join(self, sid, node_id, name, ip):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_presence_tracks_devices_and_sessions(presence):
+    assert _kinds(presence.join('s1', 'node-a', 'Laptop', '10.0.0.2'),
+                  presence.join('s2', 'node-a', 'Laptop', '10.0.0.2'),  # 同设备第二个标签页
+                  presence.join('s3', 'node-b', 'Phone', '10.0.0.9')) == \
+        [(1, 'peer-added'), None, (2, 'peer-added')]
+
+    assert presence.node_of('s2') == 'node-a'
+    assert presence.device_sids('node-a') == ['s1', 's2']
+    assert presence.all_sids() == ['s1', 's2', 's3']
+    assert presence.peers() == [{'nodeId': 'node-a', 'name': 'Laptop', 'ip': '10.0.0.2'},
+                                {'nodeId': 'node-b', 'name': 'Phone', 'ip': '10.0.0.9'}]
+
+    assert presence.rename('s3', 'node-a', 'Hijack') is None  # 只能改自己的设备名
+    renamed = presence.rename('s1', 'node-a', 'Desk')
+    assert renamed['type'] == 'peer-updated' and renamed['peer']['name'] == 'Desk'
+    assert presence.device_name('node-a') == 'Desk'
+
+    assert presence.leave('s1') is None  # 还有另一个标签页,对外不可见
+    removed = presence.leave('s2')
+    assert (removed['seq'], removed['type'], removed['peer']) == (4, 'peer-removed', {'nodeId': 'node-a'})
+    assert presence.leave('s2') is None
+    assert presence.devices() == [{'nodeId': 'node-b', 'name': 'Phone', 'sessions': 1}]
+
+
+def test_sync_returns_changes_or_snapshot(presence):
+    first = presence.sync()
+    assert first == {'epoch': first['epoch'], 'seq': 0, 'peers': []}
+    epoch = first['epoch']
+    presence.join('s1', 'node-a', 'Laptop', '10.0.0.2')
+    presence.join('s2', 'node-b', 'Phone', '10.0.0.9')
+    presence.leave('s1')
+
+    caught_up = presence.sync(epoch, 1)
+    assert caught_up['seq'] == 3
+    assert [(d['seq'], d['type']) for d in caught_up['changes']] == [(2, 'peer-added'),
+                                                                      (3, 'peer-removed')]
+    assert presence.sync(epoch, 3)['changes'] == []
+    # 未知 epoch(服务端重启)或来自"未来"的 seq:回退全量快照
+    assert presence.sync('other-run', 1)['peers'] == [{'nodeId': 'node-b', 'name': 'Phone',
+                                                        'ip': '10.0.0.9'}]
+    assert 'peers' in presence.sync(epoch, 99)
+
+
+def test_sync_falls_back_to_snapshot_beyond_history(presence, monkeypatch):
+    import modules.im_presence as imp
+    monkeypatch.setattr(imp, 'DELTA_HISTORY', 2)
+    if isinstance(presence, InProcessPresence):
+        presence = InProcessPresence()
+    epoch = presence.sync()['epoch']
+    for i in range(4):
+        presence.join(f's{i}', f'node-{i}', f'D{i}', '')
+    assert 'peers' in presence.sync(epoch, 1)
+    assert [d['seq'] for d in presence.sync(epoch, 2)['changes']] == [3, 4]
+
+
+def test_sqlite_presence_is_shared_and_purges_dead_workers(tmp_path):
+    path = str(tmp_path / 'im.sqlite3')
+    worker_a = SQLitePresence(path, reset=True)
+    worker_b = SQLitePresence(path)
+    worker_a.join('s1', 'node-a', 'Laptop', '10.0.0.2')
+    assert worker_b.peers() == [{'nodeId': 'node-a', 'name': 'Laptop', 'ip': '10.0.0.2'}]
+
+    # 模拟崩溃的 worker 留下的会话:owner pid 已不存在
+    with worker_a._db.write() as conn:
+        conn.execute("INSERT INTO devices (node_id, name) VALUES ('ghost', 'Ghost')")
+        conn.execute("INSERT INTO sessions (sid, node_id, ip, owner, seq) "
+                     "VALUES ('sx', 'ghost', '', 2147483646, 99)")
+    worker_b.join('s2', 'node-b', 'Phone', '10.0.0.9')
+    assert [p['nodeId'] for p in worker_a.peers()] == ['node-a', 'node-b']
+
+
+def test_sqlite_queue_relays_between_managers(tmp_path):
+    path = str(tmp_path / 'im.sqlite3')
+    sender = SQLiteQueueManager(path)
+    receiver = SQLiteQueueManager(path)
+    sender.host_id, receiver.host_id = 'worker-1', 'worker-2'
+    listen = receiver._listen()
+
+    message = {'method': 'emit', 'event': 'recv-msg', 'data': {'id': 'm1'},
+               'namespace': '/', 'room': 'sid-on-other-worker', 'host_id': sender.host_id}
+    # 监听从启动时的最新消息之后开始,发布晚于首次轮询
+    threading.Timer(0.2, sender._publish, (message,)).start()
+    assert next(listen) == message
+
+    # 非 JSON 行(例如旧版本写入的 pickle)被丢弃,不会被反序列化
+    with sender._db.write() as conn:
+        conn.execute("INSERT INTO bus (channel, payload, created) VALUES ('socketio', ?, 0)",
+                     (b'\x80\x04cos\nsystem\n.',))
+    sender._publish(dict(message, data={'id': 'm2'}))
+    assert next(listen)['data'] == {'id': 'm2'}
+
+
+def test_auto_backend_follows_process_count(tmp_path):
+    config = {'network': {'im_db': str(tmp_path / 'im.sqlite3')}}
+    presence, manager = create_im_backend(config, processes=1)
+    assert isinstance(presence, InProcessPresence) and manager is None
+    presence, manager = create_im_backend(config, processes=4)
+    assert isinstance(presence, SQLitePresence) and isinstance(manager, SQLiteQueueManager)
@@ -0,0 +1,143 @@
+"""IM Socket.IO 转发:broadcast / node 房间的群发与私发、在线状态 delta、typing/read 合并"""
+import time
+
+from flask import Flask
+from flask_socketio import SocketIO
+
+import modules.im as im
+from modules.im import register_im_events
+from modules.im_presence import InProcessPresence
+
+
+def _clients(count):
+    app = Flask(__name__)
+    socketio = SocketIO(app, async_mode='threading')
+    register_im_events(socketio, InProcessPresence())
+    return [socketio.test_client(app) for _ in range(count)]
+
+
+def _events(client, name):
+    return [e['args'][0] for e in client.get_received() if e['name'] == name]
+
+
+def test_group_and_private_messages_use_rooms():
+    laptop_tab1, laptop_tab2, phone = _clients(3)
+    laptop_tab1.emit('join', {'nodeId': 'laptop', 'name': 'Laptop'})
+    laptop_tab2.emit('join', {'nodeId': 'laptop', 'name': 'Laptop'})
+    phone.emit('join', {'nodeId': 'phone', 'name': 'Phone'})
+    for c in (laptop_tab1, laptop_tab2, phone):
+        c.get_received()
+
+    laptop_tab1.emit('send-msg', {'id': 'g1', 'content': 'hi all'})
+    assert _events(laptop_tab1, 'recv-msg') == []  # 发送方会话本身不回显
+    assert [m['id'] for m in _events(laptop_tab2, 'recv-msg')] == ['g1']
+    assert [m['id'] for m in _events(phone, 'recv-msg')] == ['g1']
+
+    phone.emit('send-msg', {'id': 'p1', 'content': 'psst', 'targetId': 'laptop'})
+    assert [m['id'] for m in _events(laptop_tab1, 'recv-msg')] == ['p1']
+    assert [m['id'] for m in _events(laptop_tab2, 'recv-msg')] == ['p1']
+    assert _events(phone, 'recv-msg') == []
+
+
+def test_rejoin_with_new_identity_leaves_old_node_room():
+    first, other = _clients(2)
+    first.emit('join', {'nodeId': 'old', 'name': 'Old'})
+    first.emit('join', {'nodeId': 'new', 'name': 'New'})
+    other.emit('join', {'nodeId': 'peer', 'name': 'Peer'})
+    first.get_received()
+
+    other.emit('send-msg', {'id': 'x', 'content': 'to old', 'targetId': 'old'})
+    assert _events(first, 'recv-msg') == []
+
+
+def test_presence_deltas_instead_of_full_peer_lists():
+    laptop, phone, tablet = _clients(3)
+    laptop.emit('join', {'nodeId': 'laptop', 'name': 'Laptop'})
+    joined = _events(laptop, 'joined')[0]
+    assert [p['nodeId'] for p in joined['peers']] == ['laptop']
+
+    phone.emit('join', {'nodeId': 'phone', 'name': 'Phone'})
+    received = laptop.get_received()
+    assert [e['name'] for e in received] == ['peer-added']  # 不再广播完整 peers 列表
+    added = received[0]['args'][0]
+    assert (added['epoch'], added['seq'], added['peer']['nodeId']) == (joined['epoch'], 2, 'phone')
+
+    phone.emit('rename', {'nodeId': 'phone', 'name': 'Pocket'})
+    assert _events(laptop, 'peer-updated')[0]['peer']['name'] == 'Pocket'
+
+    # 断线重连带上已应用的 epoch/seq:只补发错过的变化
+    tablet.emit('join', {'nodeId': 'tablet', 'name': 'Tablet',
+                         'epoch': joined['epoch'], 'seq': joined['seq']})
+    resumed = _events(tablet, 'joined')[0]
+    assert 'peers' not in resumed
+    assert [(d['seq'], d['type']) for d in resumed['changes']] == \
+        [(2, 'peer-added'), (3, 'peer-updated'), (4, 'peer-added')]
+
+    phone.disconnect()
+    assert _events(laptop, 'peer-removed')[0] == {'epoch': joined['epoch'], 'seq': 5,
+                                                  'peer': {'nodeId': 'phone'}}
+    laptop.emit('sync-since', {'epoch': joined['epoch'], 'seq': 3})
+    assert [d['seq'] for d in _events(laptop, 'peers-sync')[0]['changes']] == [4, 5]
+
+
+def test_typing_is_throttled_per_sender_and_target(monkeypatch):
+    monkeypatch.setitem(im._im_settings, 'typing_interval', 60)
+    writer, reader = _clients(2)
+    writer.emit('join', {'nodeId': 'w', 'name': 'Writer'})
+    reader.emit('join', {'nodeId': 'r', 'name': 'Reader'})
+    reader.get_received()
+    before = im._event_stats.snapshot().get('typing', {})
+
+    for _ in range(20):  # 每次按键一个事件
+        writer.emit('typing', {'from': 'w', 'to': 'r'})
+    writer.emit('typing', {'from': 'w', 'to': None})  # 群组输入提示单独节流
+    assert len(_events(reader, 'typing')) == 2
+
+    after = im._event_stats.snapshot()['typing']
+    assert after['received'] - before.get('received', 0) == 21
+    assert after['dropped'] - before.get('dropped', 0) == 19
+
+
+def test_read_acks_are_deduplicated_and_flushed_in_batches(monkeypatch):
+    monkeypatch.setitem(im._im_settings, 'read_flush_interval', 0.05)
+    sender, reader = _clients(2)
+    sender.emit('join', {'nodeId': 's', 'name': 'Sender'})
+    reader.emit('join', {'nodeId': 'r', 'name': 'Reader'})
+    sender.get_received()
+
+    for _ in range(10):
+        reader.emit('read', {'from': 's', 'to': 'r'})
+    assert _events(sender, 'read') == []  # 尚未到批量发送时间
+    deadline = time.time() + 2
+    acks = []
+    while not acks and time.time() < deadline:
+        time.sleep(0.02)
+        acks = _events(sender, 'read')
+    assert acks == [{'from': 'r', 'to': 's'}]
+    assert im._event_stats.snapshot()['read']['coalesced'] >= 9
+
+
+def test_read_flusher_restarts_after_a_crash(monkeypatch):
+    monkeypatch.setitem(im._im_settings, 'read_flush_interval', 0.05)
+    sender, reader = _clients(2)
+    sender.emit('join', {'nodeId': 's', 'name': 'Sender'})
+    reader.emit('join', {'nodeId': 'r', 'name': 'Reader'})
+    sender.get_received()
+
+    def broken_drain():
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(im._read_batcher, 'drain', broken_drain)
+    reader.emit('read', {'from': 's', 'to': 'r'})
+    deadline = time.time() + 2
+    while im._read_batcher._scheduled and time.time() < deadline:
+        time.sleep(0.02)
+    monkeypatch.undo()
+    monkeypatch.setitem(im._im_settings, 'read_flush_interval', 0.05)
+
+    reader.emit('read', {'from': 's', 'to': 'r'})  # 新的 flusher 被启动
+    acks = []
+    while not acks and time.time() < deadline:
+        time.sleep(0.02)
+        acks = _events(sender, 'read')
+    assert acks == [{'from': 'r', 'to': 's'}]
@@ -0,0 +1,67 @@
+"""JSON 批量接口:信封 / NDJSON 输入,逐项结果,orjson 可用与否结果一致。"""
+import json
+
+import pytest
+from flask import Flask
+
+import modules.json_codec as json_codec
+from modules.json_tools import json_tools_bp
+
+_DOCS = ['{"b": [1, 2.5, {"c": null}], "a": "中文 \\n"}', '[1, 2', '', 'NaN',
+         '{"big": 123456789012345678901234567890}', '"\\ud800"']
+
+
+@pytest.fixture(params=['orjson', 'json'])
+def client(request, monkeypatch):
+    if request.param == 'json':
+        monkeypatch.setattr(json_codec, 'orjson', None)
+    elif json_codec.orjson is None:
+        pytest.skip('orjson not installed')
+    app = Flask(__name__)
+    app.register_blueprint(json_tools_bp, url_prefix='/api/json-tools')
+    return app.test_client()
+
+
+def test_batch_matches_stdlib(client):
+    r = client.post('/api/json-tools/batch', json={
+        'documents': _DOCS + [{'already': ['parsed']}], 'operations': ['format', 'minify']})
+    body = r.get_json()
+    assert body['count'] == 7 and body['valid'] == 5 and body['invalid'] == 2
+    results = body['results']
+    for i, doc in enumerate(_DOCS):
+        if not results[i]['valid']:
+            continue
+        value = json.loads(doc)
+        assert results[i]['formatted_json'] == json.dumps(value, indent=2, ensure_ascii=False)
+        assert results[i]['minified_json'] == json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+    assert results[1]['position'] == 5 and results[1]['error'].startswith('JSON格式错误')
+    assert results[2]['error'] == 'JSON文本不能为空'
+    assert results[3]['minified_json'] == 'NaN'
+    assert results[4]['minified_json'] == '{"big":123456789012345678901234567890}'
+    assert results[6]['minified_json'] == '{"already":["parsed"]}'
+
+
+def test_ndjson_in_and_out(client):
+    body = b'{"z": 1, "a": 2}\n\n[true]\n{oops}\n'
+    r = client.post('/api/json-tools/batch?ops=minify&sort_keys=1&format=ndjson',
+                    data=body, content_type='application/x-ndjson')
+    assert r.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in r.data.decode('utf-8').splitlines()]
+    assert [(item['index'], item['valid']) for item in lines] == [(0, True), (1, True), (2, False)]
+    assert lines[0]['minified_json'] == '{"a":2,"z":1}'
+
+    assert client.post('/api/json-tools/batch?ops=explode', data=body,
+                       content_type='application/x-ndjson').status_code == 400
+    assert client.post('/api/json-tools/batch', json={'docs': []}).status_code == 400
+
+
+def test_parsed_values_keep_the_envelope_codec_and_lengths_are_characters(client):
+    r = client.post('/api/json-tools/batch', data='{"documents": [{"a": NaN}, "\\"中文\\""], "operations": ["minify"]}',
+                    content_type='application/json')
+    results = r.get_json()['results']
+    assert results[0]['minified_json'] == '{"a":NaN}'  # 标准库解析的值由标准库输出,NaN 不变成 null
+    assert results[1]['length'] == 4
+
+    r = client.post('/api/json-tools/batch?ops=validate&format=ndjson', data='"中文"\n'.encode('utf-8'),
+                    content_type='application/x-ndjson')
+    assert json.loads(r.data)['length'] == 4
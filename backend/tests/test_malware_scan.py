@@ -0,0 +1,161 @@
+"""后台杀毒扫描:pending → clean / quarantined,经 clamd 协议(本地 UNIX socket 替身)扫描。"""
+import io
+import os
+import socket
+import struct
+import threading
+
+import modules.malware_scan as malware_scan
+from modules.malware_scan import ClamdScanner, get_scan_jobs
+
+
+class _FakeSocketIO:
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event, payload):
+        self.events.append((event, payload))
+
+
+def _fake_clamd(path):
+    """clamd 替身:实现 zINSTREAM,内容含 EICAR 时报毒。"""
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(4)
+
+    def recv_exact(conn, n):
+        data = b''
+        while len(data) < n:
+            chunk = conn.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError
+            data += chunk
+        return data
+
+    def serve():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            with conn:
+                assert recv_exact(conn, len(b'zINSTREAM\0')) == b'zINSTREAM\0'
+                body = b''
+                while True:
+                    (size,) = struct.unpack('!I', recv_exact(conn, 4))
+                    if not size:
+                        break
+                    body += recv_exact(conn, size)
+                reply = b'stream: Eicar-Test-Signature FOUND\0' if b'EICAR' in body else b'stream: OK\0'
+                conn.sendall(reply)
+
+    threading.Thread(target=serve, daemon=True).start()
+    return server
+
+
+def _upload(client, name, content):
+    return client.post('/api/file-upload/upload', data={'files': (io.BytesIO(content), name)},
+                       content_type='multipart/form-data').get_json()['files'][0]
+
+
+def test_uploads_are_scanned_in_background_and_quarantined(tmp_path, monkeypatch, make_upload_client):
+    sock_path = str(tmp_path / 'clamd.sock')
+    server = _fake_clamd(sock_path)
+    monkeypatch.setitem(malware_scan._settings, 'scanner', ClamdScanner(sock_path))
+    socketio = _FakeSocketIO()
+    upload_dir = tmp_path / 'uploads'
+    upload_dir.mkdir()
+    client = make_upload_client(str(upload_dir), socketio)
+    try:
+        assert _upload(client, 'notes.txt', b'hello')['scanStatus'] == 'pending'
+        assert _upload(client, 'evil.txt', b'X5O!P%@AP EICAR test')['scanStatus'] == 'pending'
+        assert get_scan_jobs().wait_idle(5)
+    finally:
+        server.close()
+
+    assert sorted((p['name'], p['scanStatus']) for e, p in socketio.events if e == 'file-scan-status') == \
+        [('evil.txt', 'quarantined'), ('notes.txt', 'clean')]
+    files = {f['name']: f for f in client.get('/api/file-upload/files').get_json()['files']}
+    assert files['notes.txt']['scanStatus'] == 'clean'
+    assert files['evil.txt']['scanStatus'] == 'quarantined'
+    assert files['evil.txt']['scanDetail'] == 'Eicar-Test-Signature'
+    assert 'url' not in files['evil.txt']
+
+    assert client.get('/api/file-upload/files/notes.txt').data == b'hello'
+    assert client.get('/api/file-upload/files/evil.txt').status_code == 403
+    assert not os.path.exists(upload_dir / 'evil.txt')
+    assert os.path.exists(upload_dir / '_quarantine' / 'evil.txt')
+
+    # 同名新上传不会占用被隔离的文件名
+    assert _upload(client, 'evil.txt', b'fine now')['unique_name'] == 'evil_1.txt'
+    assert client.delete('/api/file-upload/files/evil.txt').status_code == 200
+    assert not os.path.exists(upload_dir / '_quarantine' / 'evil.txt')
+
+
+def test_scanner_failure_keeps_file_available(tmp_path, monkeypatch, make_upload_client):
+    monkeypatch.setitem(malware_scan._settings, 'scanner', ClamdScanner(str(tmp_path / 'missing.sock')))
+    client = make_upload_client(str(tmp_path))
+    _upload(client, 'a.bin', b'data')
+    assert get_scan_jobs().wait_idle(5)
+
+    entry = client.get('/api/file-upload/files').get_json()['files'][0]
+    assert entry['scanStatus'] == 'error'
+    assert client.get('/api/file-upload/files/a.bin').data == b'data'
+
+
+class _GatedScanner(malware_scan.Scanner):
+    """扫描器替身:放行前一直处于扫描中,内容含 EICAR 时报毒。"""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def scan(self, path):
+        assert self.release.wait(5)
+        with open(path, 'rb') as f:
+            return (True, 'Eicar-Test-Signature') if b'EICAR' in f.read() else (False, None)
+
+
+def test_pending_files_cannot_be_downloaded(tmp_path, monkeypatch, make_upload_client):
+    scanner = _GatedScanner()
+    monkeypatch.setitem(malware_scan._settings, 'scanner', scanner)
+    client = make_upload_client(str(tmp_path))
+    try:
+        entry = _upload(client, 'a.txt', b'hello')
+        assert entry['scanStatus'] == 'pending' and 'url' not in entry
+        listed = client.get('/api/file-upload/files').get_json()['files'][0]
+        assert listed['scanStatus'] == 'pending' and 'url' not in listed
+        r = client.get('/api/file-upload/files/a.txt')
+        assert r.status_code == 423 and r.get_json()['scanStatus'] == 'pending'
+    finally:
+        scanner.release.set()
+    assert get_scan_jobs().wait_idle(5)
+    assert client.get('/api/file-upload/files/a.txt').data == b'hello'
+
+
+def test_quarantine_covers_deduplicated_names(tmp_path, monkeypatch, make_upload_client):
+    import modules.im as im
+    evil = b'X5O!P%@AP EICAR test'
+    monkeypatch.setitem(malware_scan._settings, 'scanner', None)
+    monkeypatch.setattr(im, '_get_upload_dir', lambda: str(tmp_path / 'im'))
+    (tmp_path / 'im').mkdir()
+    client = make_upload_client(str(tmp_path))
+    client.application.register_blueprint(im.im_bp, url_prefix='/api/im')
+    im_url = client.post('/api/im/upload', data={'file': (io.BytesIO(evil), 'chat.txt')},
+                         content_type='multipart/form-data').get_json()['url']
+    _upload(client, 'first.txt', evil)  # 未配置扫描器时上传:unscanned,可下载
+    assert client.get('/api/file-upload/files/first.txt').data == evil
+
+    scanner = _GatedScanner()
+    scanner.release.set()
+    monkeypatch.setitem(malware_scan._settings, 'scanner', scanner)
+    assert _upload(client, 'second.txt', evil)['deduplicated']
+    assert get_scan_jobs().wait_idle(5)
+
+    files = {f['name']: f for f in client.get('/api/file-upload/files').get_json()['files']}
+    assert files['first.txt']['scanStatus'] == files['second.txt']['scanStatus'] == 'quarantined'
+    for name in ('first.txt', 'second.txt'):
+        assert client.get(f'/api/file-upload/files/{name}').status_code == 403
+        assert os.path.exists(tmp_path / '_quarantine' / name)
+    # 同一 blob 的 IM 附件(不在文件索引中)也一并隔离
+    assert client.get(im_url).status_code == 404
+    assert os.path.exists(tmp_path / '_quarantine' / 'im' / im_url.rsplit('/', 1)[1])
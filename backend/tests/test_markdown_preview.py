@@ -0,0 +1,70 @@
+"""增量预览:按 doc_id 保留顶层块,只重新渲染变化的块,并与全量渲染结果一致。"""
+import random
+
+from flask import Flask
+
+import modules.markdown_preview as markdown_preview
+from modules.data_conversion import data_conversion_bp
+from modules.markdown_preview import PreviewSession, PreviewSessions
+from modules.markdown_render import get_renderer
+
+_FRAGMENTS = ['# Head', 'para line', 'another line', '', '', '- item', '- item two', '  continued',
+              '```', 'code', '> quote', 'lazy', '1. one', '2. two', '| a | b |', '|---|---|',
+              '| 1 | 2 |', 'Setext', '===', '---', '    indented', '<div>', '</div>',
+              '[ref]: http://example.com', 'see [ref]']
+
+
+def _client(monkeypatch):
+    monkeypatch.setattr(markdown_preview, '_sessions', PreviewSessions(max_sessions=2))
+    app = Flask(__name__)
+    app.register_blueprint(data_conversion_bp, url_prefix='/api/data-conversion')
+    return app.test_client()
+
+
+def test_patches_match_full_render():
+    rng = random.Random(7)
+    md = get_renderer('preview')
+    for _ in range(300):
+        lines = [rng.choice(_FRAGMENTS) for _ in range(rng.randint(0, 20))]
+        session = PreviewSession('doc')
+        session.update(lines)
+        view = [b['html'] for b in session.snapshot()]
+        for _ in range(5):
+            start = rng.randint(0, len(lines))
+            end = rng.randint(start, min(len(lines), start + 3))
+            lines = lines[:start] + [rng.choice(_FRAGMENTS) for _ in range(rng.randint(0, 3))] + lines[end:]
+            patch = session.update(lines)
+            view[patch['start']:patch['start'] + patch['deleteCount']] = [b['html'] for b in patch['blocks']]
+            # 未闭合代码块、列表续行等跨块影响都必须与全量解析一致
+            assert ''.join(view) == md.render('\n'.join(lines))
+
+
+def test_incremental_preview_endpoint(monkeypatch):
+    client = _client(monkeypatch)
+    url = '/api/data-conversion/preview-md'
+    text = '\n\n'.join(f'Paragraph {i}' for i in range(100))
+    first = client.post(url, json={'doc_id': 'a', 'markdown_text': text}).get_json()
+    assert first['version'] == 1 and len(first['blocks']) == 100
+    assert '<p>Paragraph 99</p>' in first['html']
+
+    # 按行替换第 50 段:只返回这一块
+    r = client.post(url, json={'doc_id': 'a', 'base_version': 1,
+                               'changes': [{'start': 100, 'end': 101, 'lines': ['Paragraph *fifty*']}]}).get_json()
+    assert r['version'] == 2
+    assert r['patch'] == {'start': 50, 'deleteCount': 1,
+                          'blocks': [{'id': r['patch']['blocks'][0]['id'], 'html': '<p>Paragraph <em>fifty</em></p>\n'}]}
+    assert 'blocks' not in r
+
+    # 全文同步同样只产生变化块的补丁
+    text = text.replace('Paragraph 50', 'Paragraph *fifty*').replace('Paragraph 0', '# Title')
+    r = client.post(url, json={'doc_id': 'a', 'base_version': 2, 'markdown_text': text}).get_json()
+    assert r['patch']['start'] == 0 and r['patch']['deleteCount'] == 1
+    assert [b['html'] for b in r['patch']['blocks']] == ['<h1>Title</h1>\n']
+
+    stale = client.post(url, json={'doc_id': 'a', 'base_version': 1, 'changes': []})
+    assert stale.status_code == 409 and stale.get_json()['resync'] is True
+
+    # 会话数有上限:最早的会话被淘汰后需要重新同步全文
+    client.post(url, json={'doc_id': 'b', 'markdown_text': 'x'})
+    client.post(url, json={'doc_id': 'c', 'markdown_text': 'y'})
+    assert client.post(url, json={'doc_id': 'a', 'base_version': 3, 'changes': []}).status_code == 409
@@ -0,0 +1,33 @@
+"""共享 MarkdownIt 渲染器:按配置档预先构建,多线程并发渲染结果一致。"""
+import threading
+
+from markdown_it import MarkdownIt
+
+from modules.markdown_render import build_renderer, get_renderer, PROFILES
+
+_DOC = '# Title\n\nline one\nline two ~~gone~~\n\n| a | b |\n|---|---|\n| 1 | 2 |\n\n<b>raw</b>\n'
+
+
+def test_profiles_are_shared_and_match_per_request_output():
+    assert get_renderer('preview') is get_renderer('preview')
+    assert get_renderer('export') is not get_renderer('preview')
+    legacy = MarkdownIt("commonmark", {"breaks": True, "html": False, "linkify": True}).enable(
+        ['table', 'strikethrough', 'code', 'fence', 'emphasis', 'list'])
+    for profile in PROFILES:
+        html = get_renderer(profile).render(_DOC)
+        assert html == legacy.render(_DOC)
+    assert '<br />' in html and '<table>' in html and '<s>gone</s>' in html and '&lt;b&gt;' in html
+
+
+def test_concurrent_first_use_renders_consistently():
+    md = build_renderer(PROFILES['preview'])
+    expected = md.render(_DOC)
+    fresh = build_renderer(PROFILES['preview'])  # 规则缓存已在构建时编译
+    results = []
+    threads = [threading.Thread(target=lambda: results.extend(fresh.render(_DOC) for _ in range(20)))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [expected] * 160
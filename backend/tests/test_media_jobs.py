@@ -0,0 +1,82 @@
+"""后台封面/缩略图队列:进行中任务去重、队列上限,以及 IM 上传立即返回 pending。"""
+import io
+import threading
+from flask import Flask
+from modules.media_jobs import MediaJobQueue, QueueFull
+
+
+def test_inflight_jobs_are_deduplicated():
+    jobs = MediaJobQueue(max_workers=2)
+    release = threading.Event()
+    runs = []
+
+    def work(n):
+        runs.append(n)
+        release.wait(5)
+        return n
+
+    first = jobs.submit('k', work, 1)
+    second = jobs.submit('k', work, 2)
+    assert first is second and jobs.is_pending('k')
+    release.set()
+    assert first.result(timeout=5) == 1
+    assert jobs.wait_idle(timeout=5)
+    assert runs == [1] and not jobs.is_pending('k')
+
+
+def test_queue_full_raises():
+    jobs = MediaJobQueue(max_workers=1, max_pending=1)
+    release = threading.Event()
+    jobs.submit('a', release.wait, 5)
+    try:
+        jobs.submit('b', release.wait, 5)
+        raise AssertionError('expected QueueFull')
+    except QueueFull:
+        pass
+    finally:
+        release.set()
+    assert jobs.wait_idle(timeout=5)
+
+
+class _FakeSocketIO:
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event, payload, **kwargs):
+        self.events.append((event, payload, kwargs.get('room')))
+
+
+def test_im_upload_returns_pending_and_emits_when_ready(tmp_path, monkeypatch):
+    from PIL import Image
+    import modules.im as im
+    from modules.media_jobs import get_media_jobs
+    monkeypatch.setattr(im, '_get_upload_dir', lambda: str(tmp_path / 'im'))
+    (tmp_path / 'im').mkdir()
+
+    app = Flask(__name__)
+    app.config['SOCKETIO'] = sio = _FakeSocketIO()
+    app.register_blueprint(im.im_bp, url_prefix='/api/im')
+    buf = io.BytesIO()
+    Image.new('RGB', (640, 480), 'red').save(buf, 'PNG')
+
+    def upload(query=''):
+        r = app.test_client().post(f'/api/im/upload{query}',
+                                   data={'file': (io.BytesIO(buf.getvalue()), 'pic.png', 'image/png')},
+                                   content_type='multipart/form-data')
+        data = r.get_json()
+        assert data['success'] and data['thumbnail'] is None
+        assert data['thumbnailStatus'] == 'pending'
+        assert get_media_jobs().wait_idle(timeout=10)
+        return data
+
+    data = upload()
+    assert sio.events == [('thumbnail-ready', {
+        'url': data['url'], 'thumbnail': data['url'].replace('/files/', '/thumbs/')}, im.BROADCAST_ROOM)]
+
+    # 私聊附件只通知会话双方,URL 不会发给其它设备
+    private = upload('?to=peer-b&from=peer-a')
+    assert sio.events[-1] == ('thumbnail-ready', {
+        'url': private['url'], 'thumbnail': private['url'].replace('/files/', '/thumbs/')},
+        ['node:peer-b', 'node:peer-a'])
+    thumb = app.test_client().get(data['url'].replace('/files/', '/thumbs/'))
+    assert thumb.status_code == 200 and thumb.mimetype == 'image/webp'
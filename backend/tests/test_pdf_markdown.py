@@ -0,0 +1,76 @@
+"""PDF 转 Markdown:按字号识别标题,按页段并行转换并逐页流式输出。"""
+import io
+import json
+
+import fitz
+from flask import Flask
+
+import modules.data_conversion as data_conversion
+import modules.pdf_markdown as pdf_markdown
+from modules.data_conversion import data_conversion_bp
+from modules.pdf_markdown import convert_pdf
+
+
+def _pdf_bytes(pages):
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f'Chapter {i + 1}', fontsize=24)
+        page.insert_text((72, 110), 'Background', fontsize=16)
+        y = 140
+        for j in range(8):
+            page.insert_text((72, y), f'Body line {j} of page {i + 1}, ending with a period.', fontsize=11)
+            y += 14
+        page.insert_text((72, y + 20), 'Short body line', fontsize=11)  # 短句不再被当成标题
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def _client(upload_dir, monkeypatch):
+    monkeypatch.setattr(data_conversion, '_get_upload_folder', lambda: upload_dir)
+    app = Flask(__name__)
+    app.register_blueprint(data_conversion_bp, url_prefix='/api/data-conversion')
+    return app.test_client()
+
+
+def test_headings_come_from_font_sizes(tmp_path):
+    path = tmp_path / 'manual.pdf'
+    path.write_bytes(_pdf_bytes(2))
+    markdown, pages = convert_pdf(str(path))
+    assert pages == 2
+    blocks = markdown.split('\n\n')
+    assert blocks[:2] == ['# Chapter 1', '## Background']
+    assert blocks[2].startswith('Body line 0 of page 1')
+    assert 'Short body line' in blocks and '## Short body line' not in markdown
+
+
+def test_stream_yields_pages_in_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_markdown, 'PDF_WORKERS', 2)  # 单核环境下也走进程池
+    client = _client(str(tmp_path), monkeypatch)
+    r = client.post('/api/data-conversion/pdf-to-md/stream',
+                    data={'file': (io.BytesIO(_pdf_bytes(20)), 'manual.pdf')},
+                    content_type='multipart/form-data')
+    assert r.mimetype == 'application/x-ndjson'
+    records = [json.loads(line) for line in r.data.decode('utf-8').splitlines()]
+
+    assert records[0] == {'type': 'meta', 'pages': 20}
+    pages = [rec for rec in records if rec['type'] == 'page']
+    assert [p['page'] for p in pages] == list(range(1, 21))
+    assert all(p['markdown'].startswith(f"# Chapter {p['page']}\n") for p in pages)
+    assert records[-1] == {'type': 'done', 'pages': 20,
+                           'characters': sum(len(p['markdown']) for p in pages)}
+
+
+def test_stream_as_sse_for_uploaded_file(tmp_path, monkeypatch):
+    client = _client(str(tmp_path), monkeypatch)
+    (tmp_path / 'doc.pdf').write_bytes(_pdf_bytes(1))
+    r = client.post('/api/data-conversion/pdf-to-md/stream?format=sse', json={'filename': 'doc.pdf'})
+    assert r.mimetype == 'text/event-stream'
+    events = [chunk.split('\n')[0] for chunk in r.data.decode('utf-8').strip().split('\n\n')]
+    assert events == ['event: meta', 'event: page', 'event: done']
+    assert not (tmp_path / 'doc.pdf').exists()
+
+    assert client.post('/api/data-conversion/pdf-to-md/stream',
+                       data={'file': (io.BytesIO(b'not a pdf'), 'x.pdf')},
+                       content_type='multipart/form-data').status_code == 400
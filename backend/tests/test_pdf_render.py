@@ -0,0 +1,69 @@
+"""PDF 渲染进程池:预热进程渲染、超时替换进程、队列满时 429。"""
+import threading
+import time
+
+from flask import Flask
+
+import modules.conversion_cache as conversion_cache
+import modules.pdf_render as pdf_render
+from modules.conversion_cache import ConversionCache
+from modules.data_conversion import data_conversion_bp
+from modules.pdf_render import PdfRenderPool, PdfRenderTimeout
+
+
+def _fake_engine(html, stylesheet, timeout):
+    if 'sleep' in html:
+        time.sleep(float(html.split('sleep ')[1].split('<')[0]))
+    return b'%PDF-fake ' + (stylesheet or '-').encode() + b' ' + str(len(html)).encode()
+
+
+def _pool(monkeypatch, **kwargs):
+    # 测试里显式用 fork 创建工作进程,让它们继承这里替换过的引擎与预热函数
+    monkeypatch.setattr(pdf_render, '_warm', lambda: None)
+    monkeypatch.setitem(pdf_render._ENGINES, 'weasyprint', _fake_engine)
+    return PdfRenderPool(start_method='fork', **kwargs)
+
+
+def test_render_and_timeout_replaces_worker(monkeypatch):
+    pool = _pool(monkeypatch, workers=1, queue_size=0, timeout=0.5)
+    try:
+        assert pool.render('weasyprint', '<p>hi</p>', stylesheet='full') == b'%PDF-fake full 9'
+        try:
+            pool.render('weasyprint', '<p>sleep 5</p>')
+            assert False, 'expected timeout'
+        except PdfRenderTimeout:
+            pass
+        assert pool.render('weasyprint', '<p>again</p>').startswith(b'%PDF-fake')
+        stats = pool.stats()
+        assert (stats['completed'], stats['timeouts'], stats['restarts']) == (2, 1, 1)
+        assert stats['idle'] == 1 and stats['render_ms_avg'] is not None
+    finally:
+        pool.close()
+
+
+def test_full_queue_answers_429(tmp_path, monkeypatch):
+    pool = _pool(monkeypatch, workers=1, queue_size=0, timeout=10)
+    monkeypatch.setattr(pdf_render, '_pool', pool)
+    monkeypatch.setattr(conversion_cache, '_cache', ConversionCache(str(tmp_path), 1 << 20, 0))
+    app = Flask(__name__)
+    app.register_blueprint(data_conversion_bp, url_prefix='/api/data-conversion')
+    url = '/api/data-conversion/html-to-pdf'
+    try:
+        slow = {}
+        t = threading.Thread(target=lambda: slow.update(
+            r=app.test_client().post(url, json={'html_text': '<p>sleep 1</p>'})))
+        t.start()
+        deadline = time.time() + 5
+        while pool.stats()['busy'] == 0 and time.time() < deadline:
+            time.sleep(0.01)
+
+        busy = app.test_client().post(url, json={'html_text': '<p>other</p>'})
+        assert busy.status_code == 429 and busy.headers['Retry-After']
+        assert busy.get_json()['error_type'] == 'pdf_queue_full'
+        t.join()
+        assert slow['r'].status_code == 200 and slow['r'].data.startswith(b'%PDF-fake full')
+
+        stats = app.test_client().get('/api/data-conversion/pdf/stats').get_json()['stats']
+        assert stats['rejected'] == 1 and stats['completed'] == 1
+    finally:
+        pool.close()
@@ -0,0 +1,79 @@
+"""原始请求体接口:JSON / YAML 文档直接作为请求体,结果作为原始响应体返回。"""
+import json
+
+import pytest
+import yaml
+from flask import Flask
+
+import modules.json_codec as json_codec
+from modules.json_tools import json_tools_bp
+from modules.yaml_tools import yaml_tools_bp
+
+
+@pytest.fixture(params=['orjson', 'json'])
+def client(request, monkeypatch):
+    if request.param == 'json':
+        monkeypatch.setattr(json_codec, 'orjson', None)
+    elif json_codec.orjson is None:
+        pytest.skip('orjson not installed')
+    monkeypatch.setattr(json_codec, 'STREAM_CHUNK_SIZE', 256)
+    app = Flask(__name__)
+    app.register_blueprint(json_tools_bp, url_prefix='/api/json-tools')
+    app.register_blueprint(yaml_tools_bp, url_prefix='/api/yaml-tools')
+    return app.test_client()
+
+
+def test_json_raw_matches_envelope_endpoints(client):
+    doc = json.dumps({'items': [{'id': i, 'name': f'名称{i}', 'v': i / 3} for i in range(50)],
+                      'nan': float('nan'), 'big': 2 ** 70, 'lone': '\ud800'})
+    value = json.loads(doc)
+
+    r = client.post('/api/json-tools/raw/format?indent=4&sort_keys=1', data=doc, content_type='text/plain')
+    assert r.status_code == 200 and r.mimetype == 'application/json'
+    assert r.get_data().decode('utf-8') == json.dumps(value, indent=4, sort_keys=True, ensure_ascii=False) \
+        .replace('\ud800', '\\ud800')
+
+    r = client.post('/api/json-tools/raw/minify', data=doc, content_type='application/json')
+    assert r.get_data().decode('utf-8') == json.dumps(value, separators=(',', ':'), ensure_ascii=False) \
+        .replace('\ud800', '\\ud800')
+
+    plain = {'b': [1, 2.5, None], 'a': '中文 \n', 'items': value['items']}
+    r = client.post('/api/json-tools/raw/format', data=json.dumps(plain), content_type='application/json')
+    assert r.get_data().decode('utf-8') == json.dumps(plain, indent=2, ensure_ascii=False)
+
+    r = client.post('/api/json-tools/raw/format', data='{"a": 1', content_type='text/plain')
+    assert r.status_code == 400 and r.get_json()['position'] == 7
+    assert client.post('/api/json-tools/raw/format', data='  ').get_json()['error'] == 'JSON文本不能为空'
+    assert client.post('/api/json-tools/raw/format?indent=9', data='1').status_code == 400
+
+    r = client.post('/api/json-tools/raw/validate', data=doc.encode('utf-8')).get_json()
+    assert r['valid'] is True and r['length'] == len(doc)
+    assert client.post('/api/json-tools/raw/validate', data='[1,').get_json()['valid'] is False
+
+
+def test_yaml_raw_endpoints(client):
+    text = 'name: 示例\nwhen: 2024-01-02\ntags: [a, b]\nnested:\n  k: 1\n'
+    parsed = yaml.safe_load(text)
+
+    r = client.post('/api/yaml-tools/raw/format?indent=4', data=text.encode('utf-8'), content_type='text/plain')
+    assert r.status_code == 200
+    assert r.get_data().decode('utf-8') == yaml.dump(parsed, default_flow_style=False, allow_unicode=True, indent=4)
+
+    r = client.post('/api/yaml-tools/raw/minify', data=text.encode('utf-8'))
+    assert yaml.safe_load(r.get_data()) == parsed
+
+    r = client.post('/api/yaml-tools/raw/to-json?indent=0', data=text.encode('utf-8'))
+    assert r.mimetype == 'application/json'
+    assert json.loads(r.get_data()) == dict(parsed, when='2024-01-02')
+
+    r = client.post('/api/yaml-tools/raw/from-json', data=json.dumps(parsed, default=str), content_type='application/json')
+    assert yaml.safe_load(r.get_data()) == dict(parsed, when='2024-01-02')
+
+    r = client.post('/api/yaml-tools/raw/to-json', data='2020-01-01: a\n1: b\n')
+    assert r.status_code == 200 and json.loads(r.get_data()) == {'2020-01-01': 'a', '1': 'b'}
+    r = client.post('/api/yaml-tools/raw/validate', data=text.encode('utf-8')).get_json()
+    assert r['valid'] is True and r['length'] == len(text)
+
+    assert client.post('/api/yaml-tools/raw/format', data='a: [1').status_code == 400
+    assert client.post('/api/yaml-tools/raw/validate', data='a: [1').get_json()['valid'] is False
+    assert client.post('/api/yaml-tools/raw/from-json', data='{').get_json()['position'] == 1
@@ -0,0 +1,131 @@
+"""服务引擎:配置校验、缺失依赖回退,以及优雅关闭时等待进行中的请求。"""
+import os
+import signal
+import socket
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+import urllib.request
+
+import pytest
+from flask import Flask
+
+from utils import server as srv
+
+
+def test_server_settings_validation():
+    settings = srv.get_server_settings({'network': {'server': 'bogus', 'workers': -3,
+                                                    'keepalive_timeout': 'x'}})
+    assert settings == {'server': 'werkzeug', 'workers': srv.DEFAULT_WORKERS,
+                        'keepalive_timeout': srv.DEFAULT_KEEPALIVE_TIMEOUT,
+                        'shutdown_timeout': srv.DEFAULT_SHUTDOWN_TIMEOUT,
+                        'processes': srv.DEFAULT_PROCESSES}
+
+
+def test_missing_engine_falls_back_to_werkzeug(monkeypatch):
+    monkeypatch.setattr(srv, 'engine_available', lambda engine: engine == 'werkzeug')
+    assert srv.prepare_engine('eventlet') == 'werkzeug'
+    assert srv.socketio_async_mode() == 'threading'
+
+
+@pytest.mark.parametrize('engine', ['werkzeug', 'waitress'])
+def test_graceful_shutdown_waits_for_inflight_request(engine):
+    if not srv.engine_available(engine):
+        pytest.skip(f'{engine} not installed')
+    app = Flask(__name__)
+
+    @app.route('/slow')
+    def slow():
+        time.sleep(0.5)
+        return 'done'
+
+    settings = srv.get_server_settings({'network': {'server': engine, 'workers': 2}})
+    handle = srv.make_server(app, '127.0.0.1', 0, settings)
+    assert handle.engine == engine
+    threading.Thread(target=handle.serve_forever, daemon=True).start()
+
+    result = {}
+
+    def fetch():
+        with urllib.request.urlopen(f'http://127.0.0.1:{handle.port}/slow', timeout=5) as r:
+            result['body'] = r.read()
+
+    client = threading.Thread(target=fetch)
+    client.start()
+    time.sleep(0.2)
+    handle.shutdown(timeout=5)
+    client.join(5)
+    assert result.get('body') == b'done'
+
+
+_SIGTERM_SCRIPT = textwrap.dedent('''
+    import functools, sys, time
+    sys.path.insert(0, {backend!r})
+    from flask import Flask
+    from utils import server as srv
+
+    app = Flask(__name__)
+
+    @app.route('/slow')
+    def slow():
+        time.sleep(1)
+        return 'done'
+
+    @app.route('/ping')
+    def ping():
+        return 'pong'
+
+    srv.get_server_settings = functools.partial(srv.get_server_settings, {{'network': {{
+        'server': {engine!r}, 'workers': 2, 'shutdown_timeout': 5}}}})
+    srv.run_server(app, '127.0.0.1', {port})
+    print('run_server returned', flush=True)
+''')
+
+
+@pytest.mark.skipif(not hasattr(signal, 'SIGTERM') or os.name != 'posix', reason='POSIX signals')
+@pytest.mark.parametrize('engine', ['werkzeug', 'waitress'])
+def test_sigterm_drains_inflight_request(engine):
+    if not srv.engine_available(engine):
+        pytest.skip(f'{engine} not installed')
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = _SIGTERM_SCRIPT.format(backend=backend, engine=engine, port=port)
+    proc = subprocess.Popen([sys.executable, '-c', script], stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, text=True)
+    try:
+        deadline = time.monotonic() + 15
+        while True:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/ping', timeout=1) as r:
+                    assert r.read() == b'pong'
+                break
+            except OSError:
+                assert proc.poll() is None and time.monotonic() < deadline, proc.stderr.read()
+                time.sleep(0.1)
+
+        result = {}
+
+        def fetch():
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/slow', timeout=10) as r:
+                    result['body'] = r.read()
+            except OSError as e:
+                result['error'] = e
+
+        client = threading.Thread(target=fetch)
+        client.start()
+        time.sleep(0.3)
+        proc.send_signal(signal.SIGTERM)
+        client.join(10)
+        out, err = proc.communicate(timeout=15)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+    assert result.get('body') == b'done', result
+    assert proc.returncode == 0 and 'run_server returned' in out
+    assert 'Traceback' not in err, err
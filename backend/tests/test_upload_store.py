@@ -0,0 +1,104 @@
+"""内容寻址去重:相同内容只存一份 blob,删除按引用计数回收。"""
+import io
+import json
+import multiprocessing
+import os
+import pytest
+from modules.upload_store import (blob_path, BLOBS_DIRNAME, HashingFileWriter, incoming_dir,
+                                  store_blob, release_blob)
+import hashlib
+
+
+def _upload(client, content, name):
+    r = client.post('/api/file-upload/upload',
+                    data={'files': (io.BytesIO(content), name)},
+                    content_type='multipart/form-data')
+    return r.get_json()['files'][0]
+
+
+def test_identical_uploads_share_one_blob(tmp_path, make_upload_client):
+    client = make_upload_client(str(tmp_path))
+    content = b'build artifact ' * 1000
+    first = _upload(client, content, 'a.zip')
+    second = _upload(client, content, 'b.zip')
+    assert first['deduplicated'] is False
+    assert second['deduplicated'] is True
+    assert os.path.samefile(tmp_path / 'a.zip', tmp_path / 'b.zip')
+    blob = blob_path(str(tmp_path), 'sha256', hashlib.sha256(content).hexdigest())
+    assert os.path.isfile(blob)
+    assert client.get('/api/file-upload/files/b.zip').data == content
+
+
+def test_delete_releases_blob_on_last_reference(tmp_path, make_upload_client):
+    client = make_upload_client(str(tmp_path))
+    content = b'shared bytes'
+    _upload(client, content, 'a.bin')
+    _upload(client, content, 'b.bin')
+    blob = blob_path(str(tmp_path), 'sha256', hashlib.sha256(content).hexdigest())
+
+    assert client.delete('/api/file-upload/files/a.bin').status_code == 200
+    assert os.path.isfile(blob)  # b.bin 仍引用
+    assert client.get('/api/file-upload/files/b.bin').data == content
+
+    assert client.delete('/api/file-upload/files/b.bin').status_code == 200
+    assert not os.path.exists(blob)
+    assert not os.path.exists(blob + '.refs')
+    assert os.path.isdir(tmp_path / BLOBS_DIRNAME)
+
+
+def test_delete_uses_the_normalised_name(tmp_path, make_upload_client):
+    client = make_upload_client(str(tmp_path))
+    content = b'fullwidth'
+    _upload(client, content, 'a.txt')
+    # 全角 ａ 经 NFKC 规范化后与 a.txt 是同一个文件
+    assert client.delete('/api/file-upload/files/\uff41.txt').status_code == 200
+    assert not os.path.exists(tmp_path / 'a.txt')
+    assert client.get('/api/file-upload/files').get_json()['files'] == []
+    assert not os.path.exists(blob_path(str(tmp_path), 'sha256', hashlib.sha256(content).hexdigest()))
+
+
+def _churn_refs(upload_dir, worker, content, rounds):
+    # 每个进程:保留一个名字,反复增删另一个名字
+    for i in range(rounds + 1):
+        name = f'keep-{worker}' if i == rounds else f'tmp-{worker}'
+        writer = HashingFileWriter(os.path.join(incoming_dir(upload_dir), f'{worker}-{i}.part'), 'sha256')
+        writer.write(content)
+        store_blob(upload_dir, writer, os.path.join(upload_dir, f'{name}-{i}'), name)
+        if i < rounds:
+            os.remove(os.path.join(upload_dir, f'{name}-{i}'))
+            release_blob(upload_dir, 'sha256', writer.hexdigest(), name)
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='needs fork')
+def test_refs_survive_concurrent_worker_processes(tmp_path):
+    content = b'shared by every worker'
+    ctx = multiprocessing.get_context('fork')
+    procs = [ctx.Process(target=_churn_refs, args=(str(tmp_path), w, content, 40)) for w in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(30)
+        assert p.exitcode == 0
+    blob = blob_path(str(tmp_path), 'sha256', hashlib.sha256(content).hexdigest())
+    assert os.path.isfile(blob)
+    with open(blob + '.refs', encoding='utf-8') as f:
+        assert sorted(json.load(f)) == [f'keep-{w}' for w in range(4)]
+
+
+def test_failure_after_store_releases_blob(tmp_path, monkeypatch, make_upload_client):
+    import modules.file_upload as file_upload
+    from modules.file_index import get_file_index
+    client = make_upload_client(str(tmp_path))
+    content = b'never indexed'
+
+    def broken_scan(path):
+        raise RuntimeError('scanner crashed')
+
+    monkeypatch.setattr(file_upload, 'scan_file', broken_scan)
+    r = client.post('/api/file-upload/upload', data={'files': (io.BytesIO(content), 'x.bin')},
+                    content_type='multipart/form-data')
+    assert r.get_json()['files'] == []
+    blob = blob_path(str(tmp_path), 'sha256', hashlib.sha256(content).hexdigest())
+    assert not os.path.exists(tmp_path / 'x.bin')
+    assert not os.path.exists(blob) and not os.path.exists(blob + '.refs')
+    assert get_file_index(str(tmp_path)).get('x.bin') is None
@@ -0,0 +1,99 @@
+"""
+Access-token verification for DevToolBox.
+
+The HTTP before_request hook and the Socket.IO connect handler both run on
+every request/connection. Instead of copying the whole config and scanning
+temp_tokens linearly each time, they consult an immutable TokenSnapshot
+that is rebuilt only when config_manager reports a new config version.
+"""
+
+import hashlib
+import hmac
+import threading
+import time
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional
+
+from .config_manager import load_config, get_config_version
+
+# 免认证路径:静态资源(含按内容哈希寻址的预览样式表) / Socket.IO(在 Socket.IO 层单独鉴权) / 前端日志桥
+EXEMPT_PATHS = frozenset(('/favicon.ico', '/robots.txt', '/api/frontend-log'))
+EXEMPT_PREFIXES = ('/socket.io/', '/assets/', '/api/data-conversion/styles/')
+
+
+def is_exempt_path(path: str) -> bool:
+    """Return True if *path* never requires a token (checked before any config access)."""
+    return path in EXEMPT_PATHS or path.startswith(EXEMPT_PREFIXES)
+
+
+def _token_key(token: str) -> bytes:
+    # 以 sha256 摘要作为字典键:查找时比较的是摘要而非明文 token,不泄露时序信息
+    return hashlib.sha256(token.encode('utf-8')).digest()
+
+
+class TokenSnapshot(NamedTuple):
+    """Read-only view of the token-related config at a given config version."""
+    version: int
+    token_enabled: bool
+    temp_tokens: Mapping[bytes, float]  # {sha256(token): expires_at}
+    language: str
+
+    def check_temp_token(self, provided: str, now: Optional[float] = None) -> bool:
+        if not provided:
+            return False
+        expires_at = self.temp_tokens.get(_token_key(provided))
+        if expires_at is None:
+            return False
+        return expires_at > (time.time() if now is None else now)
+
+
+def _build_snapshot(version: int, config: dict) -> TokenSnapshot:
+    security = config.get('security', {})
+    index = {}
+    for t in security.get('temp_tokens', []):
+        token = t.get('token')
+        exp = t.get('expires_at', 0)
+        if token and isinstance(exp, (int, float)):
+            index[_token_key(token)] = exp
+    return TokenSnapshot(
+        version=version,
+        token_enabled=bool(security.get('token_enabled', True)),
+        temp_tokens=MappingProxyType(index),
+        language=config.get('ui', {}).get('language', 'zh'),
+    )
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_token_snapshot() -> TokenSnapshot:
+    """Return the current TokenSnapshot, rebuilding it only if the config changed."""
+    global _snapshot
+    version = get_config_version()
+    snap = _snapshot
+    if snap is not None and snap.version == version:
+        return snap
+    with _snapshot_lock:
+        snap = _snapshot
+        if snap is None or snap.version != version:
+            # 先取版本再读配置:配置只可能比版本新,最坏情况下一次请求再重建一次
+            snap = _build_snapshot(version, load_config())
+            _snapshot = snap
+    return snap
+
+
+def verify_token(provided: Optional[str], access_token: str,
+                 snapshot: Optional[TokenSnapshot] = None) -> Optional[str]:
+    """Check *provided* against the access token and unexpired temp tokens.
+
+    Returns 'access' or 'temp' on success, None if the token is rejected.
+    """
+    provided = provided or ''
+    if hmac.compare_digest(provided, access_token):
+        return 'access'
+    if snapshot is None:
+        snapshot = get_token_snapshot()
+    if snapshot.check_temp_token(provided):
+        return 'temp'
+    return None
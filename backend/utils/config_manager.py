@@ -8,7 +8,14 @@ import sys
 import json
 import copy
 import time
+import struct
+import logging
+import threading
+from collections.abc import Mapping
 from pathlib import Path
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
 
 CONFIG_FILENAME = 'devtoolbox_config.json'
 
@@ -21,11 +28,32 @@ DEFAULT_CONFIG = {
     "storage": {
         "upload_dir": "uploads",
         "auto_cleanup_days": 0,
-        "max_file_size_mb": 50
+        "max_file_size_mb": 50,
+        "upload_digest": "sha256",
+        "scanner": "auto",
+        "clamd_address": ""
     },
     "network": {
         "port": 5000,
-        "host": "0.0.0.0"
+        "host": "0.0.0.0",
+        "server": "werkzeug",
+        "workers": 16,
+        "keepalive_timeout": 5,
+        "shutdown_timeout": 10,
+        "processes": 1,
+        "im_backend": "auto"
+    },
+    "im": {
+        "typing_interval_ms": 1000,
+        "read_flush_ms": 500,
+        "max_chunked_upload_mb": 4096
+    },
+    "conversion": {
+        "cache_memory_mb": 32,
+        "cache_disk_mb": 256,
+        "pdf_workers": 2,
+        "pdf_queue_size": 8,
+        "pdf_timeout": 60
     },
     "ui": {
         "language": "zh"
@@ -55,44 +83,138 @@ def _deep_merge(default, actual):
     return result
 
 
+def _freeze(obj):
+    """Return a read-only view: dict -> MappingProxyType, list -> tuple (recursive)."""
+    if isinstance(obj, Mapping):
+        return MappingProxyType({k: _freeze(v) for k, v in obj.items()})
+    if isinstance(obj, (list, tuple)):
+        return tuple(_freeze(v) for v in obj)
+    return obj
+
+
+def thaw(obj):
+    """Return a mutable deep copy (plain dict/list) of a config view or sub-view.
+
+    用于需要修改或 JSON 序列化(jsonify 不支持 MappingProxyType)的场景。
+    """
+    if isinstance(obj, Mapping):
+        return {k: thaw(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [thaw(v) for v in obj]
+    return obj
+
+
 # 配置缓存:基于文件 mtime 失效,避免每个 /api 请求都读盘(before_request 高频调用)
+# 缓存本身是只读视图,load_config() 直接返回它,不再每次 deepcopy
 _config_cache = None
 _config_mtime = None
+# 缓存每次重新填充(读盘或 save_config)都 +1,派生数据(如 auth 的 token 快照)据此判断是否过期
+_config_version = 0
+_subscribers = []
+# 监视线程检测到配置文件变化时 +1;_cache_generation 记录当前缓存对应的 generation
+_config_generation = 0
+_cache_generation = -1
+_watching = False
 
 
-def load_config():
-    """Load config from disk, merging with defaults for missing keys.
+def subscribe(callback):
+    """Register ``callback(config_view)`` to run whenever the config changes.
 
-    使用基于 mtime 的缓存:文件未改动时直接返回缓存副本,避免高频请求读盘。
+    Lets modules keep derived values (upload dir, size limits...) instead of
+    re-reading the config per request. Returns *callback* so it can be used
+    as a decorator.
     """
-    global _config_cache, _config_mtime
-    config_path = get_config_path()
+    if callback not in _subscribers:
+        _subscribers.append(callback)
+    return callback
+
+
+def unsubscribe(callback):
+    try:
+        _subscribers.remove(callback)
+    except ValueError:
+        pass
+
+
+def _notify(view):
+    for callback in list(_subscribers):
+        try:
+            callback(view)
+        except Exception:
+            logger.warning('config subscriber %r failed', callback, exc_info=True)
+
+
+def _stat_mtime(config_path):
     try:
-        mtime = config_path.stat().st_mtime
+        return config_path.stat().st_mtime
     except OSError:
-        mtime = None
+        return None
 
-    # 缓存命中(文件未改动)
-    if _config_cache is not None and mtime is not None and _config_mtime == mtime:
-        return copy.deepcopy(_config_cache)
 
+def _refresh_cache():
+    """Ensure _config_cache is current and return the read-only view.
+
+    监视线程运行时只比较 generation 整数;未运行(测试/监视失败)时退回逐次 stat 比较 mtime。
+    """
+    global _config_cache, _config_mtime, _config_version, _cache_generation
+    generation = _config_generation
+    if _watching and _config_cache is not None and _cache_generation == generation:
+        return _config_cache
+
+    config_path = get_config_path()
+    mtime = _stat_mtime(config_path)
+    # 缓存命中(文件未改动;文件不存在时 mtime 均为 None,同样复用默认配置)。
+    # 监视模式下这通常是自己 save_config 写盘触发的通知,无需重读
+    if _config_cache is not None and _config_mtime == mtime:
+        _cache_generation = generation
+        return _config_cache
+
+    cache = None
     if config_path.exists():
         try:
             with open(config_path, 'r', encoding='utf-8') as f:
                 saved = json.load(f)
-            _config_cache = _deep_merge(DEFAULT_CONFIG, saved)
-            _config_mtime = mtime
-            return copy.deepcopy(_config_cache)
+            cache = _deep_merge(DEFAULT_CONFIG, saved)
         except (json.JSONDecodeError, IOError):
             pass
-    _config_cache = copy.deepcopy(DEFAULT_CONFIG)
+    if cache is None:
+        cache = DEFAULT_CONFIG
+    view = _freeze(cache)
+    _config_cache = view
     _config_mtime = mtime
-    return copy.deepcopy(_config_cache)
+    _cache_generation = generation
+    _config_version += 1
+    _notify(view)
+    return view
+
+
+def load_config():
+    """Load config from disk, merging with defaults for missing keys.
+
+    返回只读视图(嵌套 MappingProxyType / tuple),文件未改动时直接复用缓存,零拷贝。
+    需要修改时用 edit_config() 取可变副本,再 save_config() 写回。
+    """
+    return _refresh_cache()
+
+
+def edit_config():
+    """Return a mutable deep copy of the current config, to be passed to save_config()."""
+    return thaw(_refresh_cache())
+
+
+def get_config_version():
+    """Return a counter that changes whenever the cached config is reloaded or saved.
+
+    供按请求调用的热路径判断派生缓存是否失效;监视线程运行时仅为一次整数比较。
+    """
+    _refresh_cache()
+    return _config_version
 
 
 def save_config(config):
     """Save config to disk atomically (temp file + os.replace) and refresh cache."""
-    global _config_cache, _config_mtime
+    global _config_cache, _config_mtime, _config_version
+    config = thaw(config)
     config_path = get_config_path()
     tmp_path = config_path.with_suffix(config_path.suffix + '.tmp')
     try:
@@ -104,11 +226,11 @@ def save_config(config):
         except OSError:
             pass
         # 写盘成功后刷新缓存
-        _config_cache = copy.deepcopy(config)
-        try:
-            _config_mtime = config_path.stat().st_mtime
-        except OSError:
-            _config_mtime = None
+        view = _freeze(config)
+        _config_cache = view
+        _config_version += 1
+        _config_mtime = _stat_mtime(config_path)
+        _notify(view)
         return True
     except (IOError, OSError):
         # Clean up temp file on failure
@@ -120,6 +242,164 @@ def save_config(config):
         return False
 
 
+# ---------------------------------------------------------------------------
+# 配置文件监视:Linux 用 inotify,其它平台/失败时轮询。检测到外部改动只递增
+# _config_generation,下一次 load_config() 再读盘,热路径不再每次 stat()
+# ---------------------------------------------------------------------------
+
+DEFAULT_POLL_INTERVAL = 2.0  # 秒,可用环境变量 DEVTOOLBOX_CONFIG_POLL_INTERVAL 覆盖
+
+# <sys/inotify.h>
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_IGNORED = 0x00008000
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+_watcher = None
+
+
+def _invalidate_if_changed():
+    """Bump the generation if the config file differs from what is cached."""
+    global _config_generation
+    if _stat_mtime(get_config_path()) != _config_mtime or _config_cache is None:
+        _config_generation += 1
+
+
+class _ConfigWatcher(threading.Thread):
+    """Daemon thread invalidating the config cache when the file changes."""
+
+    def __init__(self, config_path, poll_interval, use_inotify):
+        super().__init__(name='config-watcher', daemon=True)
+        self.config_path = config_path
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.mode = None
+        self.ready = threading.Event()
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _activate(self, mode):
+        global _watching
+        self.mode = mode
+        _watching = True
+        # 监视建立之前发生的改动也要算上
+        _invalidate_if_changed()
+        self.ready.set()
+
+    def run(self):
+        global _watching
+        try:
+            if self.use_inotify and sys.platform.startswith('linux'):
+                try:
+                    self._run_inotify()
+                    return
+                except OSError as e:
+                    _watching = False
+                    logger.info('config watcher: inotify unavailable (%s), falling back to polling', e)
+            self._run_polling()
+        except Exception:
+            logger.warning('config watcher stopped unexpectedly', exc_info=True)
+        finally:
+            _watching = False
+            self.ready.set()
+
+    def _run_polling(self):
+        self._activate('poll')
+        while not self._stop_event.wait(self.poll_interval):
+            _invalidate_if_changed()
+
+    def _run_inotify(self):
+        import ctypes
+        import ctypes.util
+        import select
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        try:
+            # 监视所在目录而非文件本身:save_config 用 os.replace 原子替换,文件 inode 会变
+            mask = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM
+                    | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE)
+            wd = libc.inotify_add_watch(fd, os.fsencode(str(self.config_path.parent)), mask)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), 'inotify_add_watch failed')
+            self._activate('inotify')
+            name = os.fsencode(self.config_path.name)
+            while not self._stop_event.is_set():
+                readable, _, _ = select.select([fd], [], [], self.poll_interval)
+                if not readable:
+                    continue
+                try:
+                    buf = os.read(fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                changed = False
+                offset = 0
+                while offset + _INOTIFY_EVENT.size <= len(buf):
+                    _, ev_mask, _, length = _INOTIFY_EVENT.unpack_from(buf, offset)
+                    start = offset + _INOTIFY_EVENT.size
+                    if buf[start:start + length].rstrip(b'\0') == name:
+                        changed = True
+                    if ev_mask & _IN_IGNORED:
+                        raise OSError('config directory watch removed')
+                    offset = start + length
+                if changed:
+                    _invalidate_if_changed()
+        finally:
+            os.close(fd)
+
+
+def start_config_watcher(poll_interval=None, use_inotify=True):
+    """Start the background config watcher (idempotent) and return it.
+
+    poll_interval: 轮询间隔(秒),默认取 DEVTOOLBOX_CONFIG_POLL_INTERVAL 或 2 秒;
+    inotify 模式下也用它作为检查停止信号的周期。
+    """
+    global _watcher
+    if _watcher is not None and _watcher.is_alive():
+        return _watcher
+    if poll_interval is None:
+        try:
+            poll_interval = float(os.environ.get('DEVTOOLBOX_CONFIG_POLL_INTERVAL', DEFAULT_POLL_INTERVAL))
+        except ValueError:
+            poll_interval = DEFAULT_POLL_INTERVAL
+    _watcher = _ConfigWatcher(get_config_path(), max(0.05, poll_interval), use_inotify)
+    _watcher.start()
+    _watcher.ready.wait(1.0)
+    logger.info('config watcher started (%s)', _watcher.mode)
+    return _watcher
+
+
+def _reset_after_fork():
+    # 监视线程不会进入 fork 出的子进程;先退回逐次 mtime 检查,由调用方按需重启
+    global _watcher, _watching
+    _watcher = None
+    _watching = False
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def stop_config_watcher():
+    """Stop the watcher; load_config() falls back to per-call mtime checks."""
+    global _watcher, _watching
+    watcher = _watcher
+    _watcher = None
+    if watcher is not None:
+        watcher.stop()
+        watcher.join(timeout=max(1.0, watcher.poll_interval * 2))
+    _watching = False
+
+
 def get_upload_dir(config):
     """Return the absolute upload directory path."""
     upload_dir = config.get('storage', {}).get('upload_dir', 'uploads')
@@ -149,7 +429,7 @@ def get_max_upload_bytes(config=None):
 
 
 def cleanup_expired_tokens(config):
-    """Remove expired temp tokens from config."""
+    """Remove expired temp tokens from a mutable config (see edit_config())."""
     now = time.time()
     tokens = config.get('security', {}).get('temp_tokens', [])
     config['security']['temp_tokens'] = [
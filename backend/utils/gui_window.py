@@ -13,12 +13,17 @@ import threading
 import webview
 from collections import deque
 
+try:
+    from .server import run_server, shutdown_server
+except ImportError:
+    from server import run_server, shutdown_server
+
 
 def _import_config_manager():
     """Import config_manager with 3-tier fallback (same pattern as app.py)."""
     for prefix in ('utils.', 'backend.utils.', ''):
         try:
-            mod = __import__(prefix + 'config_manager', fromlist=['load_config', 'save_config', 'get_upload_dir'])
+            mod = __import__(prefix + 'config_manager', fromlist=['load_config', 'edit_config', 'save_config', 'get_upload_dir'])
             return mod
         except ImportError:
             continue
@@ -84,11 +89,7 @@ def wait_for_server(host, port, timeout=15):
 
 def start_flask_thread(app, host, port):
     def run():
-        socketio = app.config.get('SOCKETIO')
-        if socketio:
-            socketio.run(app, host=host, port=port, debug=False, allow_unsafe_werkzeug=True)
-        else:
-            app.run(host=host, port=port, debug=False, use_reloader=False)
+        run_server(app, host, port)
     thread = threading.Thread(target=run, daemon=True)
     thread.start()
     return thread
@@ -278,7 +279,7 @@ class Api:
             masked['security'] = {
                 'token_enabled': config['security'].get('token_enabled', True),
                 'has_token': bool(self._access_token),
-                'temp_tokens': config['security'].get('temp_tokens', []),
+                'temp_tokens': _cm.thaw(config['security'].get('temp_tokens', [])),
             }
         if 'storage' in config:
             masked['storage'] = dict(config['storage'])
@@ -289,7 +290,7 @@ class Api:
     def save_config(self, params):
         try:
             _cm = _import_config_manager()
-            config = _cm.load_config()
+            config = _cm.edit_config()
             for section, values in params.items():
                 if section in config and isinstance(values, dict):
                     config[section].update(values)
@@ -306,7 +307,7 @@ class Api:
         self._app.config['ACCESS_TOKEN'] = new_token
 
         _cm = _import_config_manager()
-        config = _cm.load_config()
+        config = _cm.edit_config()
         config['security']['access_token'] = new_token
         _cm.save_config(config)
 
@@ -315,7 +316,7 @@ class Api:
     def toggle_token(self, params):
         enabled = params.get('enabled', True) if isinstance(params, dict) else params
         _cm = _import_config_manager()
-        config = _cm.load_config()
+        config = _cm.edit_config()
         config['security']['token_enabled'] = enabled
         _cm.save_config(config)
         return {'success': True, 'enabled': enabled}
@@ -328,7 +329,7 @@ class Api:
 
         _cm = _import_config_manager()
         import uuid as _uuid
-        config = _cm.load_config()
+        config = _cm.edit_config()
         token = _uuid.uuid4().hex[:16]
         expires_at = time.time() + minutes * 60
         config.setdefault('security', {}).setdefault('temp_tokens', []).append({
@@ -347,7 +348,7 @@ class Api:
 
     def delete_temp_token(self, token):
         _cm = _import_config_manager()
-        config = _cm.load_config()
+        config = _cm.edit_config()
         tokens = config.get('security', {}).get('temp_tokens', [])
         config['security']['temp_tokens'] = [t for t in tokens if t.get('token') != token]
         _cm.save_config(config)
@@ -432,7 +433,7 @@ class Api:
         lang = params if isinstance(params, str) else params.get('language', 'zh')
         try:
             _cm = _import_config_manager()
-            config = _cm.load_config()
+            config = _cm.edit_config()
             config.setdefault('ui', {})['language'] = lang
             _cm.save_config(config)
             return {'success': True}
@@ -461,6 +462,7 @@ class Api:
     def exit_app(self):
         if self._window:
             self._window.destroy()
+        shutdown_server()
         os._exit(0)
 
 
@@ -1959,4 +1961,5 @@ def run_gui_app(app, host, port, access_token, version='dev'):
     webview.start(debug=False)
 
     # Window closed
+    shutdown_server()
     os._exit(0)
@@ -0,0 +1,480 @@
+"""
+Serving engines for DevToolBox.
+
+Every entry point (``app.py __main__``, tray, GUI window) used to call
+``socketio.run(..., allow_unsafe_werkzeug=True)``: the Werkzeug development
+server, one unbounded thread per connection and no keep-alive. The engine is
+now chosen by ``config['network']['server']``:
+
+- ``werkzeug``  — previous behaviour (default; no extra dependency);
+- ``waitress``  — threaded production server, keep-alive, ``workers``
+  threads. No WebSocket upgrade: Socket.IO falls back to long-polling;
+- ``gevent``    — gevent pywsgi, keep-alive + WebSocket, at most
+  ``workers`` concurrent greenlets;
+- ``eventlet``  — eventlet.wsgi, keep-alive + WebSocket, ``workers``
+  greenlet pool.
+
+An engine whose package is missing falls back to werkzeug with a warning.
+gevent / eventlet also need Socket.IO's matching ``async_mode`` and a
+monkey-patched stdlib, so callers resolve the engine once with
+``prepare_engine()`` *before* ``create_app()`` builds the SocketIO server.
+
+``run_server()`` serves until SIGINT/SIGTERM (or ``ServerHandle.shutdown()``),
+then stops accepting connections and waits up to ``shutdown_timeout``
+seconds for in-flight requests to finish.
+
+``network.processes`` > 1 (POSIX, console entry point only) pre-forks that
+many worker processes sharing one listening socket. IM presence and
+Socket.IO emits then go through the shared SQLite backend in
+``modules/im_presence.py``; long-polling sessions cannot hop between
+workers, so the IM client switches to the WebSocket transport and waitress
+(no WebSocket) stays single-process.
+"""
+
+import importlib.util
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SERVER_ENGINES = ('werkzeug', 'waitress', 'gevent', 'eventlet')
+DEFAULT_ENGINE = 'werkzeug'
+DEFAULT_WORKERS = 16
+DEFAULT_KEEPALIVE_TIMEOUT = 5
+DEFAULT_SHUTDOWN_TIMEOUT = 10
+DEFAULT_PROCESSES = 1
+
+_ASYNC_MODES = {'gevent': 'gevent', 'eventlet': 'eventlet'}
+_REQUIRED_MODULE = {'waitress': 'waitress', 'gevent': 'gevent', 'eventlet': 'eventlet'}
+
+_engine = None  # 由 prepare_engine() 决定;gevent / eventlet 选定后不可再切换
+_active_handle = None
+
+
+def get_server_settings(config=None):
+    """Return the validated ``network`` serving options."""
+    if config is None:
+        try:
+            from .config_manager import load_config
+        except ImportError:
+            from utils.config_manager import load_config
+        config = load_config()
+    network = config.get('network', {})
+
+    def _positive(key, default):
+        try:
+            value = int(network.get(key, default))
+        except (TypeError, ValueError):
+            return default
+        return value if value > 0 else default
+
+    engine = str(network.get('server', DEFAULT_ENGINE)).lower()
+    if engine not in SERVER_ENGINES:
+        logger.warning('Unknown network.server %r, using %s', engine, DEFAULT_ENGINE)
+        engine = DEFAULT_ENGINE
+    return {
+        'server': engine,
+        'workers': _positive('workers', DEFAULT_WORKERS),
+        'keepalive_timeout': _positive('keepalive_timeout', DEFAULT_KEEPALIVE_TIMEOUT),
+        'shutdown_timeout': _positive('shutdown_timeout', DEFAULT_SHUTDOWN_TIMEOUT),
+        'processes': _positive('processes', DEFAULT_PROCESSES),
+    }
+
+
+def effective_processes(settings=None):
+    """Worker process count that will actually be used for *settings*."""
+    settings = settings or get_server_settings()
+    processes = settings['processes']
+    if processes <= 1:
+        return 1
+    if not hasattr(os, 'fork'):
+        logger.warning('network.processes=%d needs fork(); serving with one process', processes)
+        return 1
+    if settings['server'] == 'waitress' and engine_available('waitress'):
+        logger.warning('network.processes=%d: waitress has no WebSocket support, which the IM '
+                       'relay needs across processes; serving with one process', processes)
+        return 1
+    return processes
+
+
+def engine_available(engine):
+    module = _REQUIRED_MODULE.get(engine)
+    return module is None or importlib.util.find_spec(module) is not None
+
+
+def prepare_engine(engine=None):
+    """Pick the serving engine and monkey-patch if it needs it (gevent/eventlet stick).
+
+    Call as early as possible — before ``create_app()`` — so Socket.IO is
+    created with the matching async_mode. Returns the engine actually used.
+    """
+    global _engine
+    if _engine in _ASYNC_MODES:
+        return _engine  # 已 monkey-patch,进程内不能再切换
+    if engine is None:
+        engine = get_server_settings()['server']
+    if not engine_available(engine):
+        logger.warning('network.server=%s but %s is not installed, falling back to %s',
+                       engine, _REQUIRED_MODULE[engine], DEFAULT_ENGINE)
+        engine = DEFAULT_ENGINE
+    if engine == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+    elif engine == 'eventlet':
+        import eventlet
+        eventlet.monkey_patch()
+    _engine = engine
+    return engine
+
+
+def socketio_async_mode():
+    """async_mode for flask_socketio.SocketIO matching the prepared engine."""
+    return _ASYNC_MODES.get(_engine or DEFAULT_ENGINE, 'threading')
+
+
+class _InflightCounter:
+    """WSGI middleware counting requests whose response is still being sent."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _done(self):
+        with self._lock:
+            self.count -= 1
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO', '').startswith('/socket.io/'):
+            # 长连接(WebSocket / 长轮询)不计入,否则关闭时总要等满超时
+            return self.wsgi_app(environ, start_response)
+        with self._lock:
+            self.count += 1
+        try:
+            body = self.wsgi_app(environ, start_response)
+        except BaseException:
+            self._done()
+            raise
+        wrapper = environ.get('wsgi.file_wrapper')
+        if wrapper is not None and isinstance(wrapper, type) and type(body) is wrapper:
+            # 服务器只对原样返回的 file_wrapper 走零拷贝,不能再包一层;视为已完成
+            self._done()
+            return body
+        return _ClosingBody(body, self._done)
+
+    def wait_idle(self, timeout):
+        deadline = time.monotonic() + timeout
+        while self.count > 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return self.count <= 0
+
+
+class _ClosingBody:
+    def __init__(self, body, on_close):
+        self._body = body
+        self._on_close = on_close
+
+    def __iter__(self):
+        return iter(self._body)
+
+    def close(self):
+        try:
+            if hasattr(self._body, 'close'):
+                self._body.close()
+        finally:
+            self._on_close()
+
+
+class ServerHandle:
+    """A bound server: ``serve_forever()`` blocks, ``shutdown()`` drains and stops."""
+
+    def __init__(self, engine, settings, serve, stop, inflight, port):
+        self.engine = engine
+        self.settings = settings
+        self.port = port
+        self._serve = serve
+        self._stop = stop
+        self._inflight = inflight
+        self._stopping = threading.Event()
+        self._stopped = threading.Event()
+
+    def serve_forever(self):
+        self._serve()
+
+    def shutdown(self, timeout=None):
+        """Stop accepting connections, wait for in-flight requests, then close."""
+        if timeout is None:
+            timeout = self.settings['shutdown_timeout']
+        self._stopping.set()
+        logger.info('Server (%s) shutting down, waiting up to %ss for %d in-flight request(s)',
+                    self.engine, timeout, self._inflight.count)
+        try:
+            self._stop(timeout)
+            if not self._inflight.wait_idle(timeout):
+                logger.warning('Shutdown timeout: %d request(s) still running', self._inflight.count)
+        finally:
+            self._stopped.set()
+
+    def wait_drained(self, timeout=None):
+        """Call once serve_forever() has returned, before the process exits.
+
+        serve_forever() returns as soon as the accept loop stops, while
+        requests may still be running on daemon threads; this waits for a
+        pending shutdown() to finish draining them (or, without one, for the
+        in-flight count to reach zero), at most *timeout* seconds.
+        """
+        if timeout is None:
+            timeout = self.settings['shutdown_timeout']
+        if self._stopping.is_set():
+            if not self._stopped.wait(timeout + 1):
+                logger.warning('Shutdown did not finish within %ss', timeout)
+        elif not self._inflight.wait_idle(timeout):
+            logger.warning('Exiting with %d request(s) still running', self._inflight.count)
+
+
+def bind_socket(host, port, backlog=1024):
+    """Create the listening socket shared by pre-forked workers."""
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+def make_server(app, host, port, settings=None, sock=None):
+    """Bind *app* (Flask app, Socket.IO middleware included) with the prepared engine.
+
+    *sock* is an already listening socket (pre-fork workers); host/port are
+    then only used for logging.
+    """
+    settings = dict(settings or get_server_settings())
+    engine = prepare_engine(settings['server'])
+    settings['server'] = engine
+    inflight = _InflightCounter(app.wsgi_app)
+    app.wsgi_app = inflight
+    workers = settings['workers']
+
+    if engine == 'waitress':
+        from waitress.server import create_server
+        where = {'sockets': [sock]} if sock is not None else {'host': host, 'port': port}
+        server = create_server(
+            app, threads=workers, **where,
+            channel_timeout=settings['keepalive_timeout'],
+            # 空闲 keep-alive 连接按 channel_timeout 回收;超出 backlog 的连接排队而非新开线程
+            connection_limit=max(100, workers * 8), ident='DevToolBox',
+        )
+
+        def close_in_loop():
+            for channel in list(server._map.values()):
+                if hasattr(channel, 'close_when_flushed'):
+                    channel.close_when_flushed = True  # 发完剩余输出后断开 keep-alive 连接
+            server.close()
+
+        def stop(timeout):
+            # 先停止接受连接并等工作线程做完手头的请求,最后才关闭服务器:
+            # 任务写回响应时要唤醒 trigger,提前关闭会抛 EBADF 并丢掉响应。
+            # 关闭交给事件循环线程执行,避免在它 select() 期间关掉其中的 fd
+            server.accepting = False
+            server.task_dispatcher.shutdown(cancel_pending=False, timeout=timeout)
+            server.trigger.pull_trigger(close_in_loop)
+        return ServerHandle(engine, settings, server.run, stop, inflight, server.effective_port)
+
+    if engine == 'gevent':
+        import socket
+        from gevent.pool import Pool
+        from gevent.pywsgi import WSGIServer
+
+        class _NoDelayServer(WSGIServer):
+            def handle(self, sock, address):
+                # pywsgi 分两次写响应头与正文:Nagle + 客户端延迟 ACK 会让每个
+                # keep-alive 请求多等约 40ms
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                return super().handle(sock, address)
+
+        server = _NoDelayServer(sock if sock is not None else (host, port), app,
+                                spawn=Pool(workers), log=None)
+        server.init_socket()
+
+        def stop(timeout):
+            server.stop(timeout=timeout)
+        return ServerHandle(engine, settings, server.serve_forever, stop, inflight,
+                            server.server_port)
+
+    if engine == 'eventlet':
+        import eventlet
+        import eventlet.wsgi
+        listener = sock if sock is not None else eventlet.listen((host, port))
+        stopping = threading.Event()
+
+        def serve():
+            try:
+                eventlet.wsgi.server(listener, app, max_size=workers, log_output=False,
+                                     keepalive=settings['keepalive_timeout'])
+            except OSError:
+                if not stopping.is_set():
+                    raise
+
+        def stop(timeout):
+            stopping.set()
+            listener.close()
+        return ServerHandle(engine, settings, serve, stop, inflight, listener.getsockname()[1])
+
+    from werkzeug.serving import make_server as _werkzeug_server
+    server = _werkzeug_server(host, port, app, threaded=True,
+                              fd=sock.fileno() if sock is not None else None)
+
+    def stop(timeout):
+        server.shutdown()
+        server.server_close()
+    return ServerHandle(engine, settings, server.serve_forever, stop, inflight, server.port)
+
+
+def _install_graceful(handle):
+    def _graceful(signum, frame):
+        # 另起执行流关闭:serve_forever 所在线程需要继续运行才能退出循环
+        if handle.engine == 'gevent':
+            import gevent
+            gevent.spawn(handle.shutdown)
+        elif handle.engine == 'eventlet':
+            import eventlet
+            eventlet.spawn(handle.shutdown)
+        else:
+            threading.Thread(target=handle.shutdown, daemon=True).start()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            signal.signal(sig, _graceful)
+        except (ValueError, OSError):
+            pass
+
+
+def run_server(app, host, port, debug=False):
+    """Serve *app* until interrupted, using the engine from config['network'].
+
+    ``debug`` keeps the old ``socketio.run`` / reloader path for development.
+    """
+    socketio = app.config.get('SOCKETIO')
+    if debug:
+        if socketio:
+            socketio.run(app, host=host, port=port, debug=True, allow_unsafe_werkzeug=True)
+        else:
+            app.run(host=host, port=port, debug=True)
+        return
+
+    settings = get_server_settings()
+    main_thread = threading.current_thread() is threading.main_thread()
+    processes = effective_processes(settings)
+    if processes > 1:
+        if main_thread:
+            _run_prefork(app, host, port, settings, processes)
+            return
+        logger.warning('network.processes=%d ignored: server not started from the main thread',
+                       processes)
+
+    global _active_handle
+    handle = make_server(app, host, port, settings)
+    _active_handle = handle
+    logger.info('Serving on %s:%s with %s (workers=%d, keepalive=%ss)', host, handle.port,
+                handle.engine, handle.settings['workers'], handle.settings['keepalive_timeout'])
+    if main_thread:
+        _install_graceful(handle)
+    handle.serve_forever()
+    handle.wait_drained()
+
+
+def _serve_worker(app, host, port, settings, sock, restart_watcher):
+    """Body of one pre-forked worker; never returns."""
+    global _active_handle
+    code = 0
+    try:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, signal.SIG_DFL)
+        if restart_watcher:
+            try:
+                from .config_manager import start_config_watcher
+            except ImportError:
+                from utils.config_manager import start_config_watcher
+            start_config_watcher()
+        handle = make_server(app, host, port, settings, sock=sock)
+        _active_handle = handle
+        _install_graceful(handle)
+        handle.serve_forever()
+        handle.wait_drained()
+    except BaseException:
+        logger.exception('Worker %d crashed', os.getpid())
+        code = 1
+    finally:
+        os._exit(code)
+
+
+def _run_prefork(app, host, port, settings, processes):
+    """Fork *processes* workers on one listening socket and supervise them."""
+    try:
+        from .config_manager import _watching as restart_watcher
+    except ImportError:
+        from utils.config_manager import _watching as restart_watcher
+    engine = prepare_engine(settings['server'])
+    settings = dict(settings, server=engine)
+    sock = bind_socket(host, port)
+    children = {}  # {pid: 启动时间}
+    stopping = threading.Event()
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            _serve_worker(app, host, port, settings, sock, restart_watcher)
+        children[pid] = time.monotonic()
+
+    def _stop(signum, frame):
+        stopping.set()
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, _stop)
+
+    for _ in range(processes):
+        spawn()
+    logger.info('Serving on %s:%s with %s x %d processes (workers=%d each)', host,
+                sock.getsockname()[1], engine, processes, settings['workers'])
+
+    deadline = None
+    while children:
+        if stopping.is_set() and deadline is None:
+            deadline = time.monotonic() + settings['shutdown_timeout'] + 5
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            if deadline is not None and time.monotonic() > deadline:
+                for child in children:
+                    try:
+                        os.kill(child, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+                deadline = float('inf')
+            time.sleep(0.1)
+            continue
+        if pid not in children:
+            continue  # 不是 worker(如 create_app 期间的子进程)
+        started = children.pop(pid)
+        if not stopping.is_set():
+            logger.warning('Worker %d exited (status %d), restarting', pid, status)
+            if time.monotonic() - started < 1:
+                time.sleep(1)  # 启动即崩溃时避免 fork 风暴
+            spawn()
+    sock.close()
+
+
+def shutdown_server(timeout=None):
+    """Gracefully stop the server started by run_server(), if any."""
+    handle = _active_handle
+    if handle is not None:
+        handle.shutdown(timeout)
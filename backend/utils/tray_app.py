@@ -11,6 +11,11 @@ import threading
 import webbrowser
 import logging
 
+try:
+    from .server import run_server, shutdown_server
+except ImportError:
+    from server import run_server, shutdown_server
+
 logger = logging.getLogger(__name__)
 
 
@@ -62,11 +67,7 @@ def wait_for_server(host, port, timeout=15):
 def start_flask_thread(app, host, port):
     """Start Flask (or SocketIO) in a daemon thread."""
     def run():
-        socketio = app.config.get('SOCKETIO')
-        if socketio:
-            socketio.run(app, host=host, port=port, debug=False, allow_unsafe_werkzeug=True)
-        else:
-            app.run(host=host, port=port, debug=False, use_reloader=False)
+        run_server(app, host, port)
 
     thread = threading.Thread(target=run, daemon=True)
     thread.start()
@@ -159,6 +160,7 @@ def run_tray_app(app, host, port, access_token, version='dev'):
     icon.title = f"DevToolBox v{version}"
 
     def on_icon_stopped(icon):
+        shutdown_server()
         os._exit(0)
 
     icon.on_exit = on_icon_stopped
@@ -197,8 +199,4 @@ def run_console_app(app, host, port, access_token, version='dev'):
     except Exception:
         pass
 
-    socketio = app.config.get('SOCKETIO')
-    if socketio:
-        socketio.run(app, host=host, port=port, debug=False, allow_unsafe_werkzeug=True)
-    else:
-        app.run(host=host, port=port, debug=False, use_reloader=False)
+    run_server(app, host, port)
@@ -7,6 +7,9 @@ const IDENTITY_KEY = 'im_identity'
 const MESSAGES_KEY = 'im_messages'
 const PRIVATE_LIMIT = 200
 const GROUP_LIMIT = 1200
+const UPLOADS_KEY = 'im_chunked_uploads'
+const CHUNKED_THRESHOLD = 8 * 1024 * 1024 // 超过此大小走分片可续传上传
+const CHUNK_RETRIES = 5
 
 function logToBackend(level, message) {
   try {
@@ -52,6 +55,14 @@ const typingPeers = ref({})
 let socket = null
 let _refCount = 0
 
+// Presence versioning: the server sends the peer list once, then numbered
+// peer-added / peer-updated / peer-removed deltas. A gap in seq (or a new
+// epoch after a server restart) triggers a 'sync-since' catch-up.
+let presenceEpoch = null
+let presenceSeq = 0
+let presenceSyncing = false
+let pendingDeltas = []
+
 // ---------------------------------------------------------------------------
 // P2P (WebRTC) integration — singleton instance
 // ---------------------------------------------------------------------------
@@ -123,6 +134,81 @@ p2p.setOnRead((fromId) => {
   // Read receipt received via P2P — no UI for now
 })
 
+function applyPeerDelta(type, peer) {
+  if (!peer || peer.nodeId === myId.value) return
+  if (type === 'peer-removed') {
+    const leftPeer = peers.value.find(p => p.nodeId === peer.nodeId)
+    peers.value = peers.value.filter(p => p.nodeId !== peer.nodeId)
+    if (activePeer.value?.nodeId === peer.nodeId) {
+      activePeer.value = null
+    }
+    // Close P2P connection to departed peer
+    p2p.closePeerConnection(peer.nodeId)
+    logToBackend('info', `[IM] peer left: ${leftPeer?.name || peer.nodeId}`)
+    return
+  }
+  const idx = peers.value.findIndex(p => p.nodeId === peer.nodeId)
+  if (idx === -1) {
+    peers.value = [...peers.value, peer]
+    p2p.connectToPeers(myId.value, [peer.nodeId])
+  } else {
+    peers.value = peers.value.map((p, i) => (i === idx ? { ...p, ...peer } : p))
+  }
+}
+
+// Apply a 'joined' / 'peers-sync' payload: a full snapshot or the missed deltas
+function applyPresenceState(data) {
+  if (Array.isArray(data.peers)) {
+    const existingIds = new Set(peers.value.map(p => p.nodeId))
+    peers.value = data.peers.filter(p => p.nodeId !== myId.value)
+    const freshIds = peers.value.filter(p => !existingIds.has(p.nodeId)).map(p => p.nodeId)
+    if (freshIds.length > 0) {
+      p2p.connectToPeers(myId.value, freshIds)
+    }
+  } else {
+    for (const d of data.changes || []) applyPeerDelta(d.type, d.peer)
+  }
+  presenceEpoch = data.epoch
+  presenceSeq = data.seq
+  presenceSyncing = false
+  const queued = pendingDeltas
+  pendingDeltas = []
+  for (const [type, d] of queued) onPresenceDelta(type, d)
+}
+
+function requestPresenceSync(fromScratch = false) {
+  presenceSyncing = true
+  socket?.emit('sync-since', fromScratch ? {} : { epoch: presenceEpoch, seq: presenceSeq })
+}
+
+function onPresenceDelta(type, data) {
+  if (presenceEpoch === null || presenceSyncing) {
+    pendingDeltas.push([type, data])
+    return
+  }
+  if (data.epoch !== presenceEpoch) {
+    requestPresenceSync(true)
+    return
+  }
+  if (data.seq <= presenceSeq) return
+  if (data.seq !== presenceSeq + 1) {
+    pendingDeltas.push([type, data])
+    requestPresenceSync()
+    return
+  }
+  applyPeerDelta(type, data.peer)
+  presenceSeq = data.seq
+}
+
+function emitJoin() {
+  presenceSyncing = true
+  socket.emit('join', {
+    nodeId: myId.value,
+    name: myName.value,
+    ...(presenceEpoch ? { epoch: presenceEpoch, seq: presenceSeq } : {}),
+  })
+}
+
 function getPeerName(nodeId) {
   const peer = peers.value.find(p => p.nodeId === nodeId)
   return peer?.name || nodeId
@@ -232,8 +318,23 @@ function connect() {
     reconnectionAttempts: Infinity,
     reconnectionDelay: 1000,
     query: token ? { token } : {},
+    autoConnect: false,
   })
 
+  // Multi-process servers cannot keep a long-polling session on one worker:
+  // /api/im/status tells us to go straight to WebSocket in that case.
+  const pending = socket
+  fetch('/api/im/status')
+    .then(r => (r.ok ? r.json() : null))
+    .catch(() => null)
+    .then((status) => {
+      if (socket !== pending) return
+      if (Array.isArray(status?.transports) && status.transports.length) {
+        pending.io.opts.transports = status.transports
+      }
+      pending.connect()
+    })
+
   logToBackend('info', `[IM] socket.io client created — attempting connection to ${window.location.origin}/socket.io`)
 
   // Wire P2P signaling through Socket.IO
@@ -246,7 +347,7 @@ function connect() {
   socket.on('connect', () => {
     connected.value = true
     logToBackend('info', `[IM] ✓ SocketIO CONNECTED (sid=${socket.id}, transport=${socket.io.engine?.transport?.name})`)
-    socket.emit('join', { nodeId: myId.value, name: myName.value })
+    emitJoin()
   })
 
   socket.on('joined', (data) => {
@@ -254,9 +355,8 @@ function connect() {
     myName.value = data.name
     if (data.serverIp) serverIp.value = data.serverIp
     saveIdentity()
-    const rawPeers = data.peers || []
-    peers.value = rawPeers.filter(p => p.nodeId !== myId.value)
-    logToBackend('info', `[IM] ✓ JOINED as "${data.name}" (nodeId=${data.nodeId.slice(0,8)}) — server returned ${rawPeers.length} peers, ${peers.value.length} others: [${rawPeers.map(p => p.nodeId.slice(0,8)).join(',')}]`)
+    applyPresenceState(data)
+    logToBackend('info', `[IM] ✓ JOINED as "${data.name}" (nodeId=${data.nodeId.slice(0,8)}) — presence seq ${data.seq}, ${data.peers ? `snapshot of ${data.peers.length}` : `${data.changes.length} missed changes`}, ${peers.value.length} others`)
 
     // Safety net: if no peers after joining, retry after a short delay.
     // This handles the race where the server hasn't yet processed other
@@ -265,7 +365,7 @@ function connect() {
       setTimeout(() => {
         if (socket?.connected && peers.value.length === 0) {
           logToBackend('info', `[IM] Retrying join — still 0 peers after 2s`)
-          socket.emit('join', { nodeId: myId.value, name: myName.value })
+          emitJoin()
         }
       }, 2000)
     }
@@ -277,28 +377,13 @@ function connect() {
     )
   })
 
-  socket.on('peers', (data) => {
-    const newPeers = (data.list || []).filter(p => p.nodeId !== myId.value)
-    // Find newly appeared peers and connect P2P
-    const existingIds = new Set(peers.value.map(p => p.nodeId))
-    const freshIds = newPeers.filter(p => !existingIds.has(p.nodeId)).map(p => p.nodeId)
-    peers.value = newPeers
-    logToBackend('info', `[IM] "peers" event received — ${newPeers.length} peers: [${newPeers.map(p => p.name).join(',')}]`)
-    if (freshIds.length > 0) {
-      p2p.connectToPeers(myId.value, freshIds)
-    }
-  })
+  for (const type of ['peer-added', 'peer-updated', 'peer-removed']) {
+    socket.on(type, data => onPresenceDelta(type, data))
+  }
 
-  socket.on('leave', (data) => {
-    const leftPeer = peers.value.find(p => p.nodeId === data.nodeId)
-    const leftName = leftPeer?.name || data.nodeId
-    peers.value = peers.value.filter(p => p.nodeId !== data.nodeId)
-    if (activePeer.value?.nodeId === data.nodeId) {
-      activePeer.value = null
-    }
-    // Close P2P connection to departed peer
-    p2p.closePeerConnection(data.nodeId)
-    logToBackend('info', `[IM] peer left: ${leftName}`)
+  socket.on('peers-sync', (data) => {
+    applyPresenceState(data)
+    logToBackend('info', `[IM] presence re-synced to seq ${data.seq}`)
   })
 
   socket.on('recv-msg', (data) => {
@@ -347,6 +432,21 @@ function connect() {
     saveMessagesToStorage()
   })
 
+  socket.on('thumbnail-ready', (data) => {
+    // Thumbnails are generated in the background after upload
+    if (!data?.url || !data.thumbnail) return
+    let changed = false
+    for (const arr of Object.values(messages.value)) {
+      for (const m of arr) {
+        if (m.attachment?.url === data.url && !m.attachment.thumbnail) {
+          m.attachment.thumbnail = data.thumbnail
+          changed = true
+        }
+      }
+    }
+    if (changed) saveMessagesToStorage()
+  })
+
   socket.on('typing', (data) => {
     const peerId = data.from
     if (peerId) {
@@ -462,15 +562,7 @@ function sendMsg(content, msgType = 'text', targetPeer = null, attachment = null
 // File upload & transfer — P2P preferred, HTTP fallback
 // ---------------------------------------------------------------------------
 
-async function uploadFile(file) {
-  const formData = new FormData()
-  formData.append('file', file)
-
-  const resp = await fetch('/api/im/upload', {
-    method: 'POST',
-    body: formData,
-  })
-
+async function readUploadResult(resp) {
   if (!resp.ok) {
     const text = await resp.text().catch(() => '')
     throw new Error(text || `Upload failed (HTTP ${resp.status})`)
@@ -490,6 +582,115 @@ async function uploadFile(file) {
   }
 }
 
+// 私聊附件:告诉服务端会话双方,thumbnail-ready 只发给这两个设备
+function uploadQuery(targetPeer) {
+  if (!targetPeer?.nodeId) return ''
+  return '?' + new URLSearchParams({ to: targetPeer.nodeId, from: myId.value }).toString()
+}
+
+async function uploadFile(file, targetPeer = null) {
+  if (file.size > CHUNKED_THRESHOLD) {
+    return uploadFileChunked(file, targetPeer)
+  }
+
+  const formData = new FormData()
+  formData.append('file', file)
+
+  const resp = await fetch(`/api/im/upload${uploadQuery(targetPeer)}`, {
+    method: 'POST',
+    body: formData,
+  })
+  return readUploadResult(resp)
+}
+
+// 分片上传:会话 ID 按 文件名/大小/修改时间 记在 localStorage,刷新或断网后
+// 从服务端确认的 offset 继续;每个分片带 SHA-256 摘要(需安全上下文)
+function uploadKey(file) {
+  return `${file.name}:${file.size}:${file.lastModified}`
+}
+
+function rememberUpload(file, uploadId) {
+  try {
+    const saved = JSON.parse(localStorage.getItem(UPLOADS_KEY) || '{}')
+    if (uploadId) saved[uploadKey(file)] = uploadId
+    else delete saved[uploadKey(file)]
+    localStorage.setItem(UPLOADS_KEY, JSON.stringify(saved))
+  } catch {}
+}
+
+function recalledUpload(file) {
+  try {
+    return JSON.parse(localStorage.getItem(UPLOADS_KEY) || '{}')[uploadKey(file)] || null
+  } catch {
+    return null
+  }
+}
+
+async function chunkDigest(buffer) {
+  if (!globalThis.crypto?.subtle) return null
+  const hash = new Uint8Array(await crypto.subtle.digest('SHA-256', buffer))
+  return 'sha256:' + Array.from(hash, b => b.toString(16).padStart(2, '0')).join('')
+}
+
+async function chunkedJson(url, options) {
+  const resp = await fetch(url, options)
+  const data = await resp.json().catch(() => ({}))
+  if (!resp.ok || !data.success) {
+    const err = new Error(data.error || `Upload failed (HTTP ${resp.status})`)
+    err.status = resp.status
+    throw err
+  }
+  return data
+}
+
+async function uploadFileChunked(file, targetPeer = null) {
+  let status = null
+  const saved = recalledUpload(file)
+  if (saved) {
+    status = await chunkedJson(`/api/im/upload/${saved}`).catch(() => null)
+  }
+  if (!status) {
+    status = await chunkedJson('/api/im/upload/init', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ filename: file.name, size: file.size, mime: file.type || null }),
+    })
+    rememberUpload(file, status.uploadId)
+  }
+
+  const { uploadId, chunkSize } = status
+  let offset = status.offset
+  let failures = 0
+  while (offset < file.size) {
+    const buffer = await file.slice(offset, offset + chunkSize).arrayBuffer()
+    const headers = { 'Content-Type': 'application/octet-stream' }
+    const digest = await chunkDigest(buffer)
+    if (digest) headers['X-Chunk-Digest'] = digest
+    try {
+      const result = await chunkedJson(`/api/im/upload/${uploadId}?offset=${offset}`, {
+        method: 'PUT',
+        headers,
+        body: buffer,
+      })
+      offset = result.offset
+      failures = 0
+    } catch (err) {
+      if (err.status === 404 || err.status === 413 || ++failures > CHUNK_RETRIES) {
+        if (err.status === 404) rememberUpload(file, null)
+        throw err
+      }
+      await new Promise(resolve => setTimeout(resolve, 500 * 2 ** failures))
+      // 以服务端确认的位置为准,已写入的分片不会重传
+      const current = await chunkedJson(`/api/im/upload/${uploadId}`).catch(() => null)
+      if (current) offset = current.offset
+    }
+  }
+
+  const resp = await fetch(`/api/im/upload/${uploadId}/complete${uploadQuery(targetPeer)}`, { method: 'POST' })
+  if (resp.status !== 409) rememberUpload(file, null)
+  return readUploadResult(resp)
+}
+
 async function sendImage(file, targetPeer = null) {
   const peerId = targetPeer?.nodeId
 
@@ -514,7 +715,7 @@ async function sendImage(file, targetPeer = null) {
   }
 
   // HTTP upload fallback
-  const attachment = await uploadFile(file)
+  const attachment = await uploadFile(file, targetPeer)
   sendMsg('', 'image', targetPeer, attachment)
 }
 
@@ -543,7 +744,7 @@ async function sendFile(file, targetPeer = null) {
   }
 
   // HTTP upload fallback
-  const attachment = await uploadFile(file)
+  const attachment = await uploadFile(file, targetPeer)
   sendMsg(file.name, isVideo ? 'video' : 'file', targetPeer, attachment)
 }
 